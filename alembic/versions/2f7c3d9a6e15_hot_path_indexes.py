@@ -0,0 +1,40 @@
+"""hot path indexes
+
+Revision ID: 2f7c3d9a6e15
+Revises: 8e4f1a6b2d90
+Create Date: 2026-10-19 12:26:05.331870
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2f7c3d9a6e15'
+down_revision: Union[str, None] = '8e4f1a6b2d90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # built CONCURRENTLY, outside the migration transaction, so the tables
+    # stay writable while the indexes are built
+    with op.get_context().autocommit_block():
+        op.create_index('ix_application_limit_userid', 'application_limit', ['userid'], unique=False, postgresql_concurrently=True)
+        op.create_index('ix_user_web_search_history_user_id_created_at', 'user_web_search_history', ['user_id', 'created_at'], unique=False, postgresql_concurrently=True)
+        op.create_index('ix_folder_userid_created_at_id', 'folder', ['userid', 'created_at', 'id'], unique=False, postgresql_where=sa.text('NOT is_deleted'), postgresql_concurrently=True)
+        op.create_index('ix_rfp_run_folder_id_created_at_id', 'rfp_run', ['folder_id', 'created_at', 'id'], unique=False, postgresql_concurrently=True)
+        op.drop_index('ix_rfp_run_folder_id', table_name='rfp_run', postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.create_index('ix_rfp_run_folder_id', 'rfp_run', ['folder_id'], unique=False, postgresql_concurrently=True)
+        op.drop_index('ix_rfp_run_folder_id_created_at_id', table_name='rfp_run', postgresql_concurrently=True)
+        op.drop_index('ix_folder_userid_created_at_id', table_name='folder', postgresql_where=sa.text('NOT is_deleted'), postgresql_concurrently=True)
+        op.drop_index('ix_user_web_search_history_user_id_created_at', table_name='user_web_search_history', postgresql_concurrently=True)
+        op.drop_index('ix_application_limit_userid', table_name='application_limit', postgresql_concurrently=True)
@@ -0,0 +1,45 @@
+"""keyset created_at not null
+
+Revision ID: c41e7b2a9f03
+Revises: 2f7c3d9a6e15
+Create Date: 2026-10-19 16:02:41.530114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c41e7b2a9f03'
+down_revision: Union[str, None] = '2f7c3d9a6e15'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# created_at is the keyset pagination key of these tables
+TABLES = ['folder', 'rfp_run']
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("UPDATE folder SET created_at = COALESCE(updated_at, now()) WHERE created_at IS NULL")
+    op.execute("UPDATE rfp_run SET created_at = now() WHERE created_at IS NULL")
+    # each statement in its own transaction: the constraint is added under a
+    # brief exclusive lock, released before validating, which only needs a
+    # lock that lets writes through; SET NOT NULL then skips its full scan,
+    # since the validated check constraint already proves it
+    with op.get_context().autocommit_block():
+        for table in TABLES:
+            # left by a run that failed half way
+            op.execute(f"ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {table}_created_at_not_null")
+            op.execute(f"ALTER TABLE {table} ADD CONSTRAINT {table}_created_at_not_null CHECK (created_at IS NOT NULL) NOT VALID")
+            op.execute(f"ALTER TABLE {table} VALIDATE CONSTRAINT {table}_created_at_not_null")
+            op.alter_column(table, 'created_at', existing_type=sa.DateTime(), nullable=False)
+            op.drop_constraint(f'{table}_created_at_not_null', table, type_='check')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in reversed(TABLES):
+        op.alter_column(table, 'created_at', existing_type=sa.DateTime(), nullable=True)
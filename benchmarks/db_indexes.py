@@ -0,0 +1,162 @@
+"""
+Compares the plans and latency of the hot-path queries with and without
+their indexes.
+
+Fills the tables with synthetic users, limits, web search history, folders
+and runs inside a transaction that is rolled back at the end, then runs
+EXPLAIN ANALYZE on each query twice: as planned, and with index scans
+disabled, which is the plan the tables had before migration 2f7c3d9a6e15.
+Needs a database migrated to head.
+
+    python benchmarks/db_indexes.py --users 2000 --folders 20 --runs 50
+"""
+
+import argparse
+import statistics
+
+from sqlalchemy import Connection, select, text
+
+from app.database import sessionmanager
+from app.database.folders import FolderStore
+from app.database.limits import limits_cache
+from app.database.models import RfpRun, UserWebSearchHistory
+from app.database.pagination import keyset
+
+POPULATE = [
+    """
+INSERT INTO users (id, name, premium_plan, is_deleted)
+SELECT gen_random_uuid(), 'bench-' || g, 'BASIC', false
+FROM generate_series(1, :users) AS g
+""",
+    """
+INSERT INTO application_limit (id, userid, max_folder, max_file, max_agent, max_tokens)
+SELECT gen_random_uuid(), u.id, 3, 3, 3, 10000
+FROM users AS u WHERE u.name LIKE 'bench-%'
+""",
+    """
+INSERT INTO user_web_search_history (id, user_id, max_limit, current_count, created_at)
+SELECT gen_random_uuid(), u.id, 50, g, now() - g * interval '1 day'
+FROM users AS u, generate_series(1, 12) AS g
+WHERE u.name LIKE 'bench-%'
+""",
+    """
+INSERT INTO folder (id, name, userid, created_at, updated_at, is_deleted)
+SELECT gen_random_uuid(), 'bench-' || u.id || '-' || g, u.id,
+    now() - g * interval '1 hour', now(), g % 5 = 0
+FROM users AS u, generate_series(1, :folders) AS g
+WHERE u.name LIKE 'bench-%'
+""",
+    """
+INSERT INTO rfp_run (id, user_id, folder_id, file_name, file_hash, results, created_at)
+SELECT gen_random_uuid(), f.userid, f.id, 'rfp-' || g || '.pdf',
+    md5(f.id::text || g), '{}'::jsonb, now() - g * interval '1 minute'
+FROM folder AS f, generate_series(1, :runs) AS g
+WHERE f.name LIKE 'bench-%'
+""",
+]
+
+DISABLE_INDEXES = (
+    "SET LOCAL enable_indexscan = off",
+    "SET LOCAL enable_indexonlyscan = off",
+    "SET LOCAL enable_bitmapscan = off",
+)
+
+
+def queries(connection: Connection) -> dict:
+    user_id, folder_id = connection.execute(
+        text(
+            "SELECT f.userid, f.id FROM folder AS f "
+            "WHERE f.name LIKE 'bench-%' ORDER BY random() LIMIT 1"
+        )
+    ).one()
+    folders = FolderStore()
+    return {
+        "limits": limits_cache._query(user_id),
+        "web search quota": select(UserWebSearchHistory.id)
+        .where(UserWebSearchHistory.user_id == user_id)
+        .order_by(UserWebSearchHistory.created_at.desc())
+        .limit(1),
+        "list folders": folders.list_query(user_id, 10),
+        "count folders": folders.count_query(user_id),
+        "list folder runs": keyset(
+            select(RfpRun).where(RfpRun.folder_id == folder_id),
+            RfpRun.created_at,
+            RfpRun.id,
+            None,
+            20,
+        ),
+    }
+
+
+def explain(connection: Connection, query, repeat: int) -> tuple[str, list[float]]:
+    compiled = query.compile(dialect=connection.dialect)
+    statement = f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {compiled}"
+    timings = []
+    for _ in range(repeat):
+        plan = connection.exec_driver_sql(statement, compiled.params).scalar()[0]
+        timings.append(plan["Execution Time"])
+    return describe(plan["Plan"]), timings
+
+
+def describe(node: dict) -> str:
+    """
+    Summarizes a plan as its scan nodes, e.g. "Index Scan (ix_folder_...)".
+    """
+    scans = []
+
+    def walk(node: dict) -> None:
+        if "Scan" in node["Node Type"]:
+            index = node.get("Index Name")
+            scans.append(f"{node['Node Type']}" + (f" ({index})" if index else ""))
+        for child in node.get("Plans", []):
+            walk(child)
+
+    walk(node)
+    return ", ".join(scans)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--folders", type=int, default=20)
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with sessionmanager.engine.connect() as connection:
+        transaction = connection.begin()
+        try:
+            sizes = {"users": args.users, "folders": args.folders, "runs": args.runs}
+            for statement in POPULATE:
+                connection.execute(text(statement), sizes)
+            connection.execute(
+                text(
+                    "ANALYZE users, application_limit, user_web_search_history, "
+                    "folder, rfp_run"
+                )
+            )
+
+            for name, query in queries(connection).items():
+                for label in ("indexed", "no index"):
+                    savepoint = connection.begin_nested()
+                    if label == "no index":
+                        for setting in DISABLE_INDEXES:
+                            connection.execute(text(setting))
+                    plan, timings = explain(connection, query, args.repeat)
+                    savepoint.rollback()
+                    print(
+                        f"{name:>17} {label:>9}: "
+                        f"median {statistics.median(timings):8.3f} ms  "
+                        f"max {max(timings):8.3f} ms  {plan}"
+                    )
+        finally:
+            transaction.rollback()
+
+    print(
+        f"{args.users} users, {args.folders} folders per user, "
+        f"{args.runs} runs per folder, {args.repeat} executions per query"
+    )
+
+
+if __name__ == "__main__":
+    main()
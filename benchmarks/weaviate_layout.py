@@ -0,0 +1,146 @@
+"""
+Compares hybrid query latency of the reference and flat chunk layouts.
+
+Creates two temporary folders with the same synthetic chunks, one per
+`ChunkLayout`, runs the same queries against both and prints latency
+percentiles. Embedding and reranking are left out so only the Weaviate query
+is measured.
+
+    python benchmarks/weaviate_layout.py --chunks 5000 --queries 200
+"""
+
+import argparse
+import random
+import statistics
+import time
+import uuid
+
+from weaviate.util import generate_uuid5
+
+from app.rfp.services.weaviate import ChunkLayout, WeaviateService
+
+WORDS = (
+    "security compliance retention encryption audit backup availability "
+    "incident response access control vendor policy data privacy training "
+    "network monitoring recovery certification contract support pricing"
+).split()
+
+
+def random_text(rng: random.Random, length: int = 120) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(length))
+
+
+def random_vector(rng: random.Random, dimensions: int) -> list[float]:
+    return [rng.uniform(-1, 1) for _ in range(dimensions)]
+
+
+def populate(
+    service: WeaviateService,
+    folder_id: uuid.UUID,
+    chunks: int,
+    dimensions: int,
+    seed: int,
+) -> None:
+    rng = random.Random(seed)
+    service.ensure_collection(folder_id)
+
+    objects, vectors, metadata = [], [], []
+    for index in range(chunks):
+        file_name = f"proposal_{index // 100}.pdf"
+        page_number = (index % 100) // 10 + 1
+        metadata_uuid = generate_uuid5(f"{file_name}:{page_number}")
+        if index % 10 == 0:
+            metadata.append(
+                {
+                    "uuid": metadata_uuid,
+                    "properties": {
+                        "filename": file_name,
+                        "page_number": page_number,
+                        "source": file_name,
+                    },
+                }
+            )
+        objects.append(
+            {
+                "uuid": generate_uuid5(f"{file_name}:{page_number}:{index}"),
+                "properties": {
+                    "text": random_text(rng),
+                    "filename": file_name,
+                    "page_number": page_number,
+                    "source": file_name,
+                },
+                "metadata_uuid": metadata_uuid,
+            }
+        )
+        vectors.append(random_vector(rng, dimensions))
+
+    failed = service.import_objects(folder_id, objects, vectors, metadata)
+    if failed:
+        raise Exception(f"{failed} objects failed to import")
+
+
+def measure(
+    service: WeaviateService,
+    folder_id: uuid.UUID,
+    queries: int,
+    k: int,
+    dimensions: int,
+    seed: int,
+) -> list[float]:
+    rng = random.Random(seed)
+    latencies = []
+    for _ in range(queries):
+        query = random_text(rng, 12)
+        vector = random_vector(rng, dimensions)
+        start_time = time.perf_counter()
+        service._hybrid_search(folder_id, query, vector, k)
+        latencies.append((time.perf_counter() - start_time) * 1000)
+    return latencies
+
+
+def report(name: str, latencies: list[float]) -> None:
+    latencies = sorted(latencies)
+    p50 = latencies[len(latencies) // 2]
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(
+        f"{name:>10}: mean {statistics.mean(latencies):7.2f} ms  "
+        f"p50 {p50:7.2f} ms  p95 {p95:7.2f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--chunks", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=25)
+    parser.add_argument("--dimensions", type=int, default=1536)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    results = {}
+    for layout in ChunkLayout:
+        service = WeaviateService(multi_tenancy=False, layout=layout)
+        folder_id = uuid.uuid4()
+        try:
+            populate(service, folder_id, args.chunks, args.dimensions, args.seed)
+            # warm up caches and connections before measuring
+            measure(service, folder_id, 10, args.k, args.dimensions, args.seed + 1)
+            results[layout.value] = measure(
+                service, folder_id, args.queries, args.k, args.dimensions, args.seed
+            )
+        finally:
+            service.client.collections.delete(
+                [
+                    service.get_collection(folder_id).name,
+                    service.get_collection(folder_id, metadata=True).name,
+                ]
+            )
+            service.client.close()
+
+    print(f"{args.queries} hybrid queries, k={args.k}, {args.chunks} chunks")
+    for name, latencies in results.items():
+        report(name, latencies)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import asyncio
+import concurrent.futures
+import logging
+import queue
+import threading
+import time
+from typing import Any, Callable, Coroutine, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class BackgroundLoop:
+    """
+    Event loop running forever in a daemon thread.
+
+    Synchronous code (Streamlit scripts) submits coroutines to it instead of
+    calling `asyncio.run`, which creates and closes a loop every time. Objects
+    bound to a loop, like the agent runtime and the registry's loop bound
+    services, are then built once and reused by every request.
+    """
+
+    def __init__(self, name: str = "background-loop"):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro: Coroutine[Any, Any, T]) -> concurrent.futures.Future[T]:
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(
+        self,
+        coro: Coroutine[Any, Any, T],
+        timeout: Optional[float] = None,
+        updates: Optional[queue.Queue] = None,
+        on_update: Optional[Callable[[Any], None]] = None,
+    ) -> T:
+        """
+        Runs the coroutine on the loop and waits for its result.
+
+        With `updates`, the coroutine can report progress by putting items in
+        that (thread-safe) queue: `on_update` is called with each of them from
+        the calling thread while waiting, for code that must not run on the
+        loop's thread, like Streamlit elements.
+
+        The coroutine is cancelled if waiting fails or times out.
+        """
+        future = self.submit(coro)
+        try:
+            if updates is None:
+                return future.result(timeout)
+
+            deadline = time.monotonic() + timeout if timeout is not None else None
+            while True:
+                try:
+                    on_update(updates.get(timeout=0.1))
+                    continue
+                except queue.Empty:
+                    pass
+                if future.done():
+                    # updates put right before finishing are already queued
+                    while not updates.empty():
+                        on_update(updates.get_nowait())
+                    return future.result()
+                if deadline is not None and time.monotonic() > deadline:
+                    raise TimeoutError(f"Timed out after {timeout}s")
+        except BaseException:
+            future.cancel()
+            raise
+
+    def stop(self) -> None:
+        if self.loop.is_closed():
+            return
+        # lets the registry close the loop bound services built on it
+        asyncio.run_coroutine_threadsafe(
+            self.loop.shutdown_asyncgens(), self.loop
+        ).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
+        logging.info("Background loop stopped")
@@ -6,11 +6,25 @@ from pydantic_settings import BaseSettings, SettingsConfigDict
 class Config(BaseSettings):
 
     DB_URL: str
+    DB_ECHO: bool = False
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_TIMEOUT: int = 15
+    # Statement timing, slow query capture and pool gauges
+    DB_METRICS: bool = True
+    DB_SLOW_QUERY_MS: float = 500
+    DB_SLOW_QUERY_LOG_SIZE: int = 100
 
     AWS_ACCESS_KEY_ID: str
     AWS_SECRET_ACCESS_KEY: str
     AWS_DEFAULT_REGION: str
     AWS_BUCKET_NAME: str
+    S3_PART_SIZE: int = 8 * 1024 * 1024
+    S3_UPLOAD_CONCURRENCY: int = 4
+    S3_CONTENT_PREFIX: str = "objects"
+    S3_KNOWN_OBJECTS_CACHE_SIZE: int = 100000
+    S3_ARCHIVE_RETRIES: int = 3
 
     BEDROCK_REGION: str
     BEDROCK_ACCESS_KEY: str
@@ -19,6 +33,21 @@ class Config(BaseSettings):
     WEAVIATE_URL: str
     WEAVIATE_API_KEY: str
     TOP_K: int
+    RETRIEVAL_CONCURRENCY: int = 8
+    RETRIEVAL_CACHE_SIZE: int = 1024
+    # Keep the retrieval caches of all processes in step through
+    # LISTEN/NOTIFY, needed whenever several processes change or query the
+    # same folders (app workers, the bulk loader)
+    RETRIEVAL_CACHE_NOTIFY: bool = True
+    WEAVIATE_CHUNK_LAYOUT: str = "reference"
+    WEAVIATE_MULTI_TENANCY: bool = False
+    WEAVIATE_TENANT_COLLECTION: str = "Chunks"
+    WEAVIATE_TENANT_IDLE_SECONDS: int = 3600
+    WEAVIATE_TENANT_IDLE_STATUS: str = "INACTIVE"
+    WEAVIATE_TENANT_OFFLOAD_INTERVAL: int = 300
+    WEAVIATE_OFFLINE: bool = False
+    LOCAL_INDEX_DIR: str = ".local_index"
+    LOCAL_INDEX_MAX_CHUNKS: int = 5000
 
     AZURE_API_KEY: str
     AZURE_OPENAI_DEPLOYMENT: str
@@ -26,6 +55,8 @@ class Config(BaseSettings):
     AZURE_OPENAI_EMBEDDINGS_API_KEY: str
     AZURE_OPENAI_API_VERSION: str
     AZURE_MODEL_NAME: str
+    EMBEDDING_MODEL: str = "text-embedding-3-small"
+    EMBEDDING_BATCH_SIZE: int = 256
 
     COHERE_MODEL_ID: str
     HUGGINGFACE_API_KEY: str
@@ -34,6 +65,33 @@ class Config(BaseSettings):
     OPENAI_API_KEY: str
 
     TAVILY: str
+    WEB_SEARCH_CACHE_SIZE: int = 1024
+    WEB_SEARCH_CACHE_TTL: int = 24 * 3600
+    WEB_SEARCH_CONCURRENCY: int = 5
+
+    USAGE_SPOOL_DIR: str = ".usage_spool"
+    USAGE_FLUSH_SIZE: int = 200
+    USAGE_FLUSH_INTERVAL: float = 10
+
+    LIMITS_CACHE_SIZE: int = 10000
+    LIMITS_CACHE_TTL: float = 300
+    # Invalidate other processes' limits caches through LISTEN/NOTIFY
+    LIMITS_NOTIFY: bool = False
+
+    # Seconds to wait for the results of a question file
+    RFP_TIMEOUT: float = 600
+    # Stream section generation output to the UI
+    LLM_STREAMING: bool = True
+
+    ANSWER_CONCURRENCY: int = 8
+    ANSWER_TIMEOUT: float = 120
+    QUESTION_DEDUP_THRESHOLD: float = 0.92
+    ANSWER_LIBRARY_COLLECTION: str = "AnswerLibrary"
+    ANSWER_REUSE_THRESHOLD: float = 0.97
+    ANSWER_DRAFT_THRESHOLD: float = 0.85
+    CONTEXT_TOKEN_BUDGET: int = 3000
+    CONTEXT_PASSAGE_TOKENS: int = 400
+    CONTEXT_MMR_LAMBDA: float = 0.7
 
     CHUNK_SIZE: int = 1000
     CHUNK_OVERLAP: int = 200
@@ -6,6 +6,12 @@ from typing import Any, Callable, Dict, Tuple
 from autogen_core import EVENT_LOGGER_NAME
 from autogen_core.logging import LLMCallEvent
 
+try:
+    # usage of streamed calls (create_stream)
+    from autogen_core.logging import LLMStreamEndEvent
+except ImportError:  # autogen-core without stream events
+    LLMStreamEndEvent = LLMCallEvent
+
 
 class LLMUsageTracker(logging.Handler):
     def __init__(self) -> None:
@@ -15,6 +21,16 @@ class LLMUsageTracker(logging.Handler):
         self._completion_tokens = 0
         self._model_calls = 0
         self._model_names = set()
+        self._listeners: list[Callable[[LLMCallEvent], None]] = []
+
+    def add_listener(self, listener: Callable[[LLMCallEvent], None]) -> None:
+        """Call `listener` with every LLM call event, e.g. to charge usage."""
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[LLMCallEvent], None]) -> None:
+        if listener in self._listeners:
+            self._listeners.remove(listener)
 
     @property
     def tokens(self) -> int:
@@ -42,17 +58,22 @@ class LLMUsageTracker(logging.Handler):
         self._model_calls = 0
         self._model_names = set()
 
+    def add(self, event: LLMCallEvent) -> None:
+        """Count one LLM call, e.g. forwarded from another tracker."""
+        self._prompt_tokens += event.prompt_tokens
+        self._completion_tokens += event.completion_tokens
+        self._model_calls += 1
+        if hasattr(event, "model") and event.model:
+            self._model_names.add(event.model)
+        for listener in self._listeners:
+            listener(event)
+
     def emit(self, record: logging.LogRecord) -> None:
         """Emit the log record. To be used by the logging module."""
         try:
             # Use the StructuredMessage if the message is an instance of it
-            if isinstance(record.msg, LLMCallEvent):
-                event = record.msg
-                self._prompt_tokens += event.prompt_tokens
-                self._completion_tokens += event.completion_tokens
-                self._model_calls += 1
-                if hasattr(event, "model") and event.model:
-                    self._model_names.add(event.model)
+            if isinstance(record.msg, (LLMCallEvent, LLMStreamEndEvent)):
+                self.add(record.msg)
         except Exception:
             self.handleError(record)
 
@@ -0,0 +1,395 @@
+import asyncio
+import inspect
+import logging
+import threading
+import time
+from enum import Enum
+from typing import Any, AsyncIterator, Callable, Optional
+
+from pydantic import BaseModel, Field
+
+
+class ServiceState(str, Enum):
+    NOT_STARTED = "NOT_STARTED"
+    READY = "READY"
+    FAILED = "FAILED"
+    CLOSED = "CLOSED"
+
+
+class ServiceStatus(BaseModel):
+    name: str
+    state: ServiceState = ServiceState.NOT_STARTED
+    critical: bool = True
+    init_seconds: float | None = Field(default=None)
+    error: str | None = Field(default=None)
+
+
+class _Service:
+    def __init__(
+        self,
+        name: str,
+        factory: Callable[[], Any],
+        close: Optional[Callable[[Any], Any]],
+        probe: Optional[Callable[[Any], Any]],
+        loop_bound: bool,
+        critical: bool,
+    ):
+        self.factory = factory
+        self.close = close
+        self.probe = probe
+        self.loop_bound = loop_bound
+        # instances by the event loop they were built on for loop bound
+        # services, under None otherwise
+        self.instances: dict[Optional[asyncio.AbstractEventLoop], Any] = {}
+        # async generators closing the instance of their loop when it shuts
+        # down, the loop only holds them weakly
+        self.watchers: dict[asyncio.AbstractEventLoop, AsyncIterator[None]] = {}
+        self.lock = threading.Lock()
+        self.status = ServiceStatus(name=name, critical=critical)
+
+
+class ServiceRegistry:
+    """
+    Process-wide registry building each service once, on first use or
+    during `warmup`.
+
+    Services holding async connections (aiohttp, httpx) only work on the
+    event loop that created them; they are registered with `loop_bound=True`
+    and get one instance per loop, closed on that loop when it shuts down
+    (`loop.shutdown_asyncgens`, which `asyncio.run` calls).
+
+    `factory` and `close` can be plain functions or coroutine functions;
+    services with an async factory must be fetched with `aget`.
+    """
+
+    def __init__(self):
+        self._services: dict[str, _Service] = {}
+        # creation order, services are shut down in reverse
+        self._order: list[str] = []
+
+    def register(
+        self,
+        name: str,
+        factory: Callable[[], Any],
+        close: Optional[Callable[[Any], Any]] = None,
+        probe: Optional[Callable[[Any], Any]] = None,
+        loop_bound: bool = False,
+        critical: bool = True,
+    ) -> None:
+        """
+        Registers a service. `probe` is called by `check` and should raise or
+        return False when the service is unhealthy. The registry is not
+        `ready` until every `critical` service is.
+        """
+        self._services[name] = _Service(
+            name, factory, close, probe, loop_bound, critical
+        )
+
+    def _service(self, name: str) -> _Service:
+        try:
+            return self._services[name]
+        except KeyError:
+            raise Exception(f"Service {name} is not registered")
+
+    def _key(self, service: _Service) -> Optional[asyncio.AbstractEventLoop]:
+        return _running_loop() if service.loop_bound else None
+
+    def _current(self, service: _Service) -> Any:
+        return service.instances.get(self._key(service))
+
+    def _built(self, name: str, service: _Service, instance: Any, start: float) -> None:
+        loop = self._key(service)
+        service.instances[loop] = instance
+        if loop is not None:
+            self._close_on_shutdown(name, service, loop)
+        service.status.state = ServiceState.READY
+        service.status.init_seconds = time.time() - start
+        service.status.error = None
+        if name in self._order:
+            self._order.remove(name)
+        self._order.append(name)
+        logging.info(
+            f"Service {name} initialized in {service.status.init_seconds:.2f}s"
+        )
+
+    def _close_on_shutdown(
+        self, name: str, service: _Service, loop: asyncio.AbstractEventLoop
+    ) -> None:
+        """
+        Closes the service's instance of `loop`, on it, when it shuts down.
+        """
+
+        async def watcher() -> AsyncIterator[None]:
+            try:
+                yield
+            finally:
+                service.watchers.pop(loop, None)
+                instance = service.instances.pop(loop, None)
+                if instance is not None:
+                    await self._close(name, service, instance)
+
+        generator = watcher()
+        service.watchers[loop] = generator
+        # started from the loop's thread, the loop finalizes the generator in
+        # shutdown_asyncgens. It yields right away, without awaiting anything
+        try:
+            generator.__anext__().send(None)
+        except StopIteration:
+            pass
+
+    def _failed(self, name: str, service: _Service, e: Exception) -> None:
+        service.status.state = ServiceState.FAILED
+        service.status.error = str(e)
+        logging.error(f"Error initializing service {name}: {str(e)}")
+
+    def get(self, name: str) -> Any:
+        """
+        Returns the service, building it on first use.
+        """
+        service = self._service(name)
+        instance = self._current(service)
+        if instance is not None:
+            return instance
+
+        if inspect.iscoroutinefunction(service.factory):
+            raise Exception(f"Service {name} has an async factory, use aget")
+
+        with service.lock:
+            instance = self._current(service)
+            if instance is not None:
+                return instance
+
+            start = time.time()
+            try:
+                instance = service.factory()
+            except Exception as e:
+                self._failed(name, service, e)
+                raise
+            self._built(name, service, instance, start)
+        return instance
+
+    async def aget(self, name: str) -> Any:
+        """
+        Returns the service, building it on first use without blocking the
+        event loop.
+        """
+        service = self._service(name)
+        instance = self._current(service)
+        if instance is not None:
+            return instance
+
+        if not inspect.iscoroutinefunction(service.factory):
+            if service.loop_bound:
+                # must be built from this loop's thread to be bound to it
+                return self.get(name)
+            return await asyncio.to_thread(self.get, name)
+
+        start = time.time()
+        try:
+            instance = await service.factory()
+        except Exception as e:
+            self._failed(name, service, e)
+            raise
+
+        with service.lock:
+            current = self._current(service)
+            if current is None:
+                self._built(name, service, instance, start)
+
+        if current is not None:
+            # built concurrently by another task
+            await self._close(name, service, instance)
+            return current
+        return instance
+
+    async def _close(self, name: str, service: _Service, instance: Any) -> None:
+        if service.close is None:
+            return
+        try:
+            result = service.close(instance)
+            if inspect.isawaitable(result):
+                await result
+            logging.info(f"Service {name} closed")
+        except Exception as e:
+            logging.error(f"Error closing service {name}: {str(e)}")
+
+    async def warmup(
+        self, names: Optional[list[str]] = None
+    ) -> dict[str, ServiceStatus]:
+        """
+        Builds the services concurrently, by default all of them. Failures
+        are recorded in the status instead of being raised.
+        """
+        names = names or list(self._services)
+        await asyncio.gather(
+            *[self.aget(name) for name in names], return_exceptions=True
+        )
+        return self.health()
+
+    def health(self) -> dict[str, ServiceStatus]:
+        return {
+            name: service.status.model_copy()
+            for name, service in self._services.items()
+        }
+
+    @property
+    def ready(self) -> bool:
+        return all(
+            service.status.state == ServiceState.READY
+            for service in self._services.values()
+            if service.status.critical
+        )
+
+    async def check(self) -> dict[str, ServiceStatus]:
+        """
+        Runs the probe of every built service and updates its status.
+        """
+
+        async def probe(name: str, service: _Service) -> None:
+            instance = self._current(service)
+            if instance is None or service.probe is None:
+                return
+            try:
+                if inspect.iscoroutinefunction(service.probe):
+                    healthy = await service.probe(instance)
+                else:
+                    healthy = await asyncio.to_thread(service.probe, instance)
+                if healthy is False:
+                    raise Exception("Probe failed")
+                service.status.state = ServiceState.READY
+                service.status.error = None
+            except Exception as e:
+                service.status.state = ServiceState.FAILED
+                service.status.error = str(e)
+                logging.error(f"Service {name} is unhealthy: {str(e)}")
+
+        await asyncio.gather(
+            *[probe(name, service) for name, service in self._services.items()]
+        )
+        return self.health()
+
+    async def shutdown(self) -> None:
+        """
+        Closes the built services in reverse creation order. Loop bound
+        services are only closed for this loop, their instances of other
+        loops are closed when those loops shut down.
+        """
+        for name in reversed(self._order):
+            service = self._services[name]
+            loop = self._key(service)
+            instance = service.instances.pop(loop, None)
+            if loop is not None:
+                service.watchers.pop(loop, None)
+            if instance is None:
+                continue
+            await self._close(name, service, instance)
+            service.status.state = ServiceState.CLOSED
+        self._order.clear()
+
+
+def _running_loop() -> Optional[asyncio.AbstractEventLoop]:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+def _s3():
+    from app.rfp.services.s3 import S3Service
+
+    return S3Service()
+
+
+def _s3_async():
+    from app.rfp.services.s3 import AsyncS3Service
+
+    return AsyncS3Service()
+
+
+def _weaviate():
+    from app.core.config import config
+    from app.rfp.services.retrieval_cache import retrieval_cache
+    from app.rfp.services.weaviate import WeaviateService
+
+    service = WeaviateService()
+    service.start_tenant_offloader()
+    if config.RETRIEVAL_CACHE_NOTIFY:
+        retrieval_cache.listen()
+    return service
+
+
+def _close_weaviate(service) -> None:
+    from app.rfp.services.retrieval_cache import retrieval_cache
+
+    retrieval_cache.stop()
+    service.close()
+
+
+def _weaviate_ready(service) -> bool:
+    return service.client is None or service.client.is_ready()
+
+
+async def _bedrock():
+    import aioboto3
+
+    from app.core.config import config
+
+    client = aioboto3.Session().client(
+        "bedrock-agent-runtime",
+        aws_access_key_id=config.BEDROCK_ACCESS_KEY,
+        aws_secret_access_key=config.BEDROCK_SECRET_KEY,
+        region_name=config.BEDROCK_REGION,
+    )
+    return await client.__aenter__()
+
+
+async def _close_bedrock(client) -> None:
+    await client.__aexit__(None, None, None)
+
+
+def _llm():
+    from app.core.llm import get_llm_client
+
+    return get_llm_client()
+
+
+async def _close_llm(client) -> None:
+    await client.close()
+
+
+def _file_processing():
+    from app.rfp.services.file import FileProcessing
+
+    return FileProcessing()
+
+
+def _tavily():
+    from app.rfp.services.tavily import TavilyService
+
+    return TavilyService()
+
+
+def _web_search():
+    from app.rfp.services.web_search import WebSearchService
+
+    return WebSearchService()
+
+
+# Process-wide registry of the application services
+registry = ServiceRegistry()
+registry.register(
+    "s3", _s3, probe=lambda service: service._validate_bucket_access(), critical=False
+)
+registry.register("s3_async", _s3_async, critical=False)
+registry.register(
+    "weaviate",
+    _weaviate,
+    close=_close_weaviate,
+    probe=_weaviate_ready,
+)
+registry.register("bedrock", _bedrock, close=_close_bedrock, loop_bound=True)
+registry.register("llm", _llm, close=_close_llm, loop_bound=True)
+registry.register("file_processing", _file_processing)
+registry.register("tavily", _tavily, critical=False)
+# keeps futures of the searches running on its loop
+registry.register("web_search", _web_search, critical=False, loop_bound=True)
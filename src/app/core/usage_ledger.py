@@ -0,0 +1,305 @@
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import socket
+import threading
+import uuid
+from pathlib import Path
+from typing import Iterator, Optional
+
+from autogen_core.logging import LLMCallEvent
+from sqlalchemy import bindparam, text
+from sqlalchemy.dialects.postgresql import JSONB
+
+from app.core.cache import LRUCache
+from app.core.config import config
+from app.core.llm_tracker import LLMUsageTracker
+from app.database import get_db
+
+# (user id, rfp id) LLM calls made in the current context are charged to
+_usage_owner: contextvars.ContextVar[Optional[tuple[str, str]]] = (
+    contextvars.ContextVar("usage_owner", default=None)
+)
+
+
+@contextlib.contextmanager
+def usage_scope(user_id=None, rfp_id=None) -> Iterator[None]:
+    """
+    Charges the LLM calls made inside the block to `user_id`. With only an
+    `rfp_id`, the user is the one the run was bound to, see
+    `UsageLedger.bind`.
+    """
+    token = _usage_owner.set(
+        (str(user_id) if user_id else "", str(rfp_id) if rfp_id else "")
+    )
+    try:
+        yield
+    finally:
+        _usage_owner.reset(token)
+
+
+def current_usage_owner() -> Optional[tuple[str, str]]:
+    """
+    (user id, rfp id) the LLM calls made in the current context are charged
+    to, either possibly empty, or None outside of any `usage_scope`.
+    """
+    return _usage_owner.get()
+
+
+class UsageLedger:
+    """
+    Write-behind ledger charging LLM token usage to users.
+
+    Every LLM call event is appended to a local spool file and added to
+    in-memory totals per (user, rfp, model). A background thread flushes the
+    totals when `flush_size` calls are pending or every `flush_interval`
+    seconds: one statement inserts the batch into usage_ledger and
+    decrements `ApplicationLimit.tokens_left`, instead of one write per call.
+
+    Crash safety: a batch is first moved to its own spool file named after
+    its batch id, and only deleted once committed. Leftover batch files are
+    replayed on start; ledger rows are unique per batch, so replaying a batch
+    that was committed just before a crash charges nothing twice. Calls of
+    users that do not exist (anymore) are dropped from their batch, instead
+    of failing it and every retry on the foreign key.
+
+    Processes sharing the spool directory each append to their own spool
+    file, named after their host and pid. On start, the spool files of dead
+    processes of the same host are turned into batches; the ones of other
+    hosts are left to those hosts, since whether their process is alive
+    cannot be told from here.
+    """
+
+    _insert_batch = text("""
+WITH inserted AS (
+    INSERT INTO usage_ledger (
+        id, batch_id, user_id, rfp_id, model,
+        prompt_tokens, completion_tokens, calls, created_at
+    )
+    SELECT gen_random_uuid(), CAST(:batch_id AS uuid), u.user_id, u.rfp_id,
+        u.model, u.prompt_tokens, u.completion_tokens, u.calls, now()
+    FROM jsonb_to_recordset(:rows) AS u(
+        user_id uuid, rfp_id text, model text,
+        prompt_tokens int, completion_tokens int, calls int
+    )
+    JOIN users ON users.id = u.user_id
+    ON CONFLICT ON CONSTRAINT uq_usage_ledger_batch DO NOTHING
+    RETURNING user_id, prompt_tokens + completion_tokens AS tokens
+)
+UPDATE application_limit AS l
+SET tokens_left = GREATEST(COALESCE(l.tokens_left, 0) - t.tokens, 0)
+FROM (SELECT user_id, sum(tokens) AS tokens FROM inserted GROUP BY user_id) AS t
+WHERE l.userid = t.user_id
+""").bindparams(bindparam("rows", type_=JSONB))
+
+    def __init__(
+        self,
+        spool_dir: str = config.USAGE_SPOOL_DIR,
+        flush_size: int = config.USAGE_FLUSH_SIZE,
+        flush_interval: float = config.USAGE_FLUSH_INTERVAL,
+    ):
+        self.spool_dir = Path(spool_dir)
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+
+        # user of each rfp run, for calls made with only an rfp id in scope
+        self._rfp_users: LRUCache[str] = LRUCache(10000)
+        self._totals: dict[tuple[str, str, str], list[int]] = {}
+        self._pending_calls = 0
+        self._spool = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.unattributed_calls = 0
+
+    @property
+    def spool_path(self) -> Path:
+        return self.spool_dir / f"usage-{socket.gethostname()}-{os.getpid()}.jsonl"
+
+    def bind(self, rfp_id, user_id) -> None:
+        self._rfp_users.set(str(rfp_id), str(user_id))
+
+    def record(self, event: LLMCallEvent) -> None:
+        """
+        Tracker listener: spools and aggregates one LLM call.
+        """
+        owner = current_usage_owner()
+        user_id, rfp_id = owner if owner else ("", "")
+        user_id = user_id or self._rfp_users.get(rfp_id) or ""
+        try:
+            uuid.UUID(user_id)
+        except ValueError:
+            self.unattributed_calls += 1
+            return
+
+        entry = {
+            "user_id": user_id,
+            "rfp_id": rfp_id,
+            "model": getattr(event, "model", None) or "",
+            "prompt_tokens": event.prompt_tokens,
+            "completion_tokens": event.completion_tokens,
+        }
+        with self._lock:
+            if self._spool is None:
+                self.spool_dir.mkdir(parents=True, exist_ok=True)
+                self._spool = open(self.spool_path, "a")
+            self._spool.write(json.dumps(entry) + "\n")
+            self._spool.flush()
+            self._add(self._totals, entry)
+            self._pending_calls += 1
+            if self._pending_calls >= self.flush_size:
+                self._wake.set()
+
+    def _add(self, totals: dict, entry: dict) -> None:
+        key = (entry["user_id"], entry["rfp_id"], entry["model"])
+        total = totals.setdefault(key, [0, 0, 0])
+        total[0] += entry["prompt_tokens"]
+        total[1] += entry["completion_tokens"]
+        total[2] += 1
+
+    def _rotate(self) -> Optional[tuple[str, dict]]:
+        """
+        Moves the pending calls to a batch file and returns its id and totals.
+        """
+        with self._lock:
+            if not self._totals:
+                return None
+            self._spool.close()
+            self._spool = None
+            batch_id = str(uuid.uuid4())
+            os.replace(self.spool_path, self.spool_dir / f"{batch_id}.batch")
+            totals, self._totals = self._totals, {}
+            self._pending_calls = 0
+            return batch_id, totals
+
+    def _write(self, batch_id: str, totals: dict) -> None:
+        rows = [
+            {
+                "user_id": user_id,
+                "rfp_id": rfp_id,
+                "model": model,
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "calls": calls,
+            }
+            for (user_id, rfp_id, model), (
+                prompt_tokens,
+                completion_tokens,
+                calls,
+            ) in totals.items()
+        ]
+        db = get_db()
+        try:
+            db.execute(self._insert_batch, {"batch_id": batch_id, "rows": rows})
+            db.commit()
+        finally:
+            db.close()
+        # another process may have replayed the same batch
+        (self.spool_dir / f"{batch_id}.batch").unlink(missing_ok=True)
+        print(f"Usage ledger: flushed {len(rows)} totals (batch {batch_id})")
+
+    def _read_batch(self, path: Path) -> dict:
+        totals: dict = {}
+        with open(path) as f:
+            for line in f:
+                try:
+                    self._add(totals, json.loads(line))
+                except (json.JSONDecodeError, KeyError):
+                    # last line of a file cut by a crash
+                    logging.warning(f"Skipping corrupt usage entry in {path}")
+        return totals
+
+    def flush(self) -> None:
+        """
+        Writes the pending calls, then retries batches left by failed
+        flushes or by a previous process.
+        """
+        with self._flush_lock:
+            batches = {}
+            rotated = self._rotate()
+            if rotated is not None:
+                batch_id, totals = rotated
+                batches[batch_id] = totals
+            for path in sorted(self.spool_dir.glob("*.batch")):
+                batches.setdefault(path.stem, None)
+
+            for batch_id, totals in batches.items():
+                try:
+                    if totals is None:
+                        totals = self._read_batch(self.spool_dir / f"{batch_id}.batch")
+                    self._write(batch_id, totals)
+                except Exception as e:
+                    logging.error(f"Error flushing usage batch {batch_id}: {str(e)}")
+
+    def _recover(self) -> None:
+        """
+        Turns the spool files left by dead processes of this host into batches.
+        """
+        hostname = socket.gethostname()
+        for path in self.spool_dir.glob("usage-*.jsonl"):
+            host, _, pid = path.stem[len("usage-") :].rpartition("-")
+            if host != hostname or not pid.isdigit():
+                continue
+            if path == self.spool_path and self._spool is not None:
+                continue
+            if path != self.spool_path and _process_alive(int(pid)):
+                continue
+            os.replace(path, self.spool_dir / f"{uuid.uuid4()}.batch")
+            logging.info(f"Recovered usage spool {path.name}")
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                # keep flushing, the calls stay spooled until a flush succeeds
+                logging.error(f"Error flushing usage ledger: {str(e)}")
+
+    def start(self, tracker: LLMUsageTracker) -> None:
+        """
+        Starts charging the calls seen by `tracker`, flushing from a
+        background thread.
+        """
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            self._recover()
+        tracker.add_listener(self.record)
+        self._thread = threading.Thread(
+            target=self._run, name="usage-ledger", daemon=True
+        )
+        self._thread.start()
+        logging.info("Usage ledger started")
+
+    def stop(self, tracker: Optional[LLMUsageTracker] = None) -> None:
+        if tracker is not None:
+            tracker.remove_listener(self.record)
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # exists, owned by another user
+        return True
+    return True
+
+
+# Process-wide ledger, started with `usage_ledger.start(get_global_tracker())`
+usage_ledger = UsageLedger()
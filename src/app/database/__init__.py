@@ -1,10 +1,22 @@
+import contextlib
 import logging
-from typing import Any, Iterator
+from typing import Any, AsyncIterator, Iterator, Optional
 
 from sqlalchemy import Connection, create_engine, event
+from sqlalchemy.ext.asyncio import (
+    AsyncConnection,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
 from sqlalchemy.orm import DeclarativeBase, Session, sessionmaker
 
 from app.core.config import config
+from app.database.metrics import (
+    DatabaseMetrics,
+    InstrumentedAsyncQueuePool,
+    InstrumentedQueuePool,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -26,13 +38,23 @@ class Base(DeclarativeBase):
 
 
 class DatabaseSessionManager:
-    def __init__(self, host: str, engine_kwargs: dict[str, Any] = {}):
+    def __init__(
+        self,
+        host: str,
+        engine_kwargs: dict[str, Any] = {},
+        metrics: Optional[DatabaseMetrics] = None,
+    ):
+        if metrics is not None:
+            engine_kwargs = {"poolclass": InstrumentedQueuePool, **engine_kwargs}
         self._engine = create_engine(host, **engine_kwargs)
         self._sessionmaker = sessionmaker(autocommit=False, bind=self._engine)
+        self.metrics = metrics
 
         event.listen(self._engine, "connect", on_connect)
         event.listen(self._engine.pool, "checkout", on_checkout)
         event.listen(self._engine.pool, "checkin", on_checkin)
+        if metrics is not None:
+            metrics.instrument(self._engine)
 
     def close(self):
         if self._engine is None:
@@ -71,18 +93,110 @@ class DatabaseSessionManager:
         return self._engine
 
 
+class AsyncDatabaseSessionManager:
+    """
+    Async counterpart of `DatabaseSessionManager`, for database access from
+    the event loop (agent handlers, async services) without blocking it.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        engine_kwargs: dict[str, Any] = {},
+        metrics: Optional[DatabaseMetrics] = None,
+    ):
+        if metrics is not None:
+            engine_kwargs = {"poolclass": InstrumentedAsyncQueuePool, **engine_kwargs}
+        self._engine = create_async_engine(host, **engine_kwargs)
+        self._sessionmaker = async_sessionmaker(
+            autocommit=False, bind=self._engine, expire_on_commit=False
+        )
+        self.metrics = metrics
+
+        event.listen(self._engine.sync_engine, "connect", on_connect)
+        event.listen(self._engine.sync_engine.pool, "checkout", on_checkout)
+        event.listen(self._engine.sync_engine.pool, "checkin", on_checkin)
+        if metrics is not None:
+            metrics.instrument(self._engine.sync_engine)
+
+    async def close(self):
+        if self._engine is None:
+            raise Exception("AsyncDatabaseSessionManager is not initialized")
+        await self._engine.dispose()
+
+        self._engine = None
+        self._sessionmaker = None
+
+    @contextlib.asynccontextmanager
+    async def connect(self) -> AsyncIterator[AsyncConnection]:
+        if self._engine is None:
+            raise Exception("AsyncDatabaseSessionManager is not initialized")
+
+        async with self._engine.begin() as connection:
+            try:
+                yield connection
+            except Exception:
+                await connection.rollback()
+                raise
+
+    @contextlib.asynccontextmanager
+    async def session(self) -> AsyncIterator[AsyncSession]:
+        if self._sessionmaker is None:
+            raise Exception("AsyncDatabaseSessionManager is not initialized")
+
+        session = self._sessionmaker()
+        try:
+            yield session
+        except Exception:
+            await session.rollback()
+            raise
+        finally:
+            await session.close()
+
+    @property
+    def engine(self):
+        return self._engine
+
+
 # https://docs.sqlalchemy.org/en/20/core/engines.html#sqlalchemy.create_engine
+engine_kwargs = dict(
+    echo=config.DB_ECHO,
+    pool_size=config.DB_POOL_SIZE,  # number of connections to keep open in the pool
+    max_overflow=config.DB_MAX_OVERFLOW,  # maximum number of connections allowed above the pool_size
+    pool_recycle=config.DB_POOL_RECYCLE,  # seconds after which a connection is replaced
+    pool_timeout=config.DB_POOL_TIMEOUT,  # seconds to wait before giving up on getting a connection
+    pool_pre_ping=True,  # check connections on checkout, they can live for a long time
+)
+
 sessionmanager = DatabaseSessionManager(
     config.DB_URL,
-    dict(
-        echo=True,
-        pool_size=10,  # number of connections to keep open in the pool
-        max_overflow=20,  # maximum number of connections allowed above the pool_size
-        pool_recycle=15,  # seconds to wait before releasing a connection back to the pool
-        pool_timeout=15,  # seconds to wait before giving up on getting a connection
-    ),
+    engine_kwargs,
+    DatabaseMetrics("sync") if config.DB_METRICS else None,
+)
+
+# DB_URL uses the psycopg (3) driver, which provides both sync and async
+async_sessionmanager = AsyncDatabaseSessionManager(
+    config.DB_URL,
+    engine_kwargs,
+    DatabaseMetrics("async") if config.DB_METRICS else None,
 )
 
 
+def database_metrics() -> list[dict[str, Any]]:
+    """
+    Snapshots of the sync and async engines' metrics, see `DatabaseMetrics`.
+    """
+    return [
+        manager.metrics.snapshot()
+        for manager in (sessionmanager, async_sessionmanager)
+        if manager.metrics is not None
+    ]
+
+
 def get_db():
     return next(sessionmanager.session())
+
+
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    async with async_sessionmanager.session() as session:
+        yield session
@@ -0,0 +1,60 @@
+import logging
+from typing import Optional
+from uuid import UUID
+
+from sqlalchemy import func, not_, select
+
+from app.database import async_sessionmanager
+from app.database.models import Folder
+from app.database.pagination import Page, keyset, page
+
+
+class FolderStore:
+    """
+    Queries on a user's live folders.
+
+    Every query filters on `NOT is_deleted` exactly as written in the
+    partial index ix_folder_userid_created_at_id (userid, created_at, id),
+    so the planner can use it: listing is an index range scan with no sort,
+    and counting only reads the user's range of the index.
+    """
+
+    def _live(self, user_id: UUID):
+        return (Folder.userid == user_id, not_(Folder.is_deleted))
+
+    def list_query(self, user_id: UUID, limit: int, cursor: Optional[str] = None):
+        return keyset(
+            select(Folder).where(*self._live(user_id)),
+            Folder.created_at,
+            Folder.id,
+            cursor,
+            limit,
+        )
+
+    def count_query(self, user_id: UUID):
+        return select(func.count()).select_from(Folder).where(*self._live(user_id))
+
+    async def list_folders(
+        self, user_id: UUID, limit: int = 50, cursor: Optional[str] = None
+    ) -> Page[Folder]:
+        """
+        Returns a page of the user's folders, newest first.
+        """
+        async with async_sessionmanager.session() as db:
+            try:
+                result = await db.execute(self.list_query(user_id, limit, cursor))
+                return page(list(result.scalars()), limit)
+            except Exception as e:
+                logging.error(f"Error listing folders: {str(e)}")
+                raise
+
+    async def count_folders(self, user_id: UUID) -> int:
+        """
+        Counts the user's folders, to check against `max_folder`.
+        """
+        async with async_sessionmanager.session() as db:
+            try:
+                return (await db.execute(self.count_query(user_id))).scalar_one()
+            except Exception as e:
+                logging.error(f"Error counting folders: {str(e)}")
+                raise
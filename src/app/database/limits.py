@@ -0,0 +1,165 @@
+from typing import Optional
+from uuid import UUID
+
+from pydantic import BaseModel
+from sqlalchemy import event, select, text
+from sqlalchemy.orm import Session, object_session
+
+from app.core.cache import TTLCache
+from app.core.config import config
+from app.database import async_sessionmanager, get_db
+from app.database.models import ApplicationLimit, User
+from app.database.models.user import PremiumPlanType
+from app.database.notify import NotifyListener, notify
+
+NOTIFY_CHANNEL = "user_limits"
+
+# limits of users without an application_limit row, the column defaults
+DEFAULT_LIMITS = {"max_folder": 3, "max_file": 3, "max_agent": 3, "max_tokens": 10000}
+
+
+class UserLimits(BaseModel):
+    user_id: UUID
+    premium_plan: PremiumPlanType
+    max_folder: int
+    max_file: int
+    max_agent: int
+    max_tokens: int
+
+
+class LimitsCache:
+    """
+    Read-through TTL cache of users' plan and `ApplicationLimit` row, for
+    authorisation checks on the hot path.
+
+    Entries are dropped when a `User` or `ApplicationLimit` changes through the
+    ORM in this process (after the commit) and expire after `ttl` seconds
+    otherwise. With `listen`, changes committed by other processes are picked
+    up through Postgres LISTEN/NOTIFY as well.
+
+    `tokens_left` is not cached, it changes with every charged LLM call.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = config.LIMITS_CACHE_SIZE,
+        ttl: float = config.LIMITS_CACHE_TTL,
+        notify: bool = config.LIMITS_NOTIFY,
+    ):
+        self._cache: TTLCache[UserLimits] = TTLCache(maxsize, ttl)
+        self.notify = notify
+        # anything may have changed while the listener wasn't listening
+        self._listener = NotifyListener(
+            NOTIFY_CHANNEL, self._cache.delete, self._cache.clear, "limits-listener"
+        )
+
+    def _query(self, user_id: UUID):
+        return (
+            select(
+                User.premium_plan,
+                ApplicationLimit.max_folder,
+                ApplicationLimit.max_file,
+                ApplicationLimit.max_agent,
+                ApplicationLimit.max_tokens,
+            )
+            .outerjoin(ApplicationLimit, ApplicationLimit.userid == User.id)
+            .where(User.id == user_id)
+            .limit(1)
+        )
+
+    def _limits(self, user_id: UUID, row) -> Optional[UserLimits]:
+        if row is None:
+            return None
+        return UserLimits(
+            user_id=user_id,
+            premium_plan=row.premium_plan,
+            **{
+                name: default if getattr(row, name) is None else getattr(row, name)
+                for name, default in DEFAULT_LIMITS.items()
+            },
+        )
+
+    def get(self, user_id: UUID) -> Optional[UserLimits]:
+        """
+        Returns the user's limits, or None for an unknown user.
+        """
+        limits = self._cache.get(str(user_id))
+        if limits is not None:
+            return limits
+
+        db = get_db()
+        try:
+            row = db.execute(self._query(user_id)).first()
+        finally:
+            db.close()
+        limits = self._limits(user_id, row)
+        if limits is not None:
+            self._cache.set(str(user_id), limits)
+        return limits
+
+    async def aget(self, user_id: UUID) -> Optional[UserLimits]:
+        limits = self._cache.get(str(user_id))
+        if limits is not None:
+            return limits
+
+        async with async_sessionmanager.session() as db:
+            row = (await db.execute(self._query(user_id))).first()
+        limits = self._limits(user_id, row)
+        if limits is not None:
+            self._cache.set(str(user_id), limits)
+        return limits
+
+    def invalidate(self, user_id, db: Optional[Session] = None) -> None:
+        """
+        Drops the user's cached limits. With `notify`, other processes are
+        told too, in `db`'s transaction when given.
+        """
+        self._cache.delete(str(user_id))
+        if self.notify:
+            notify(NOTIFY_CHANNEL, str(user_id), db)
+
+    def stats(self) -> dict[str, int]:
+        return self._cache.stats()
+
+    def listen(self) -> None:
+        """
+        Starts a background thread invalidating entries on notifications
+        from other processes.
+        """
+        self._listener.start()
+
+    def stop(self) -> None:
+        self._listener.stop()
+
+
+# Process-wide cache of user limits
+limits_cache = LimitsCache()
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(ApplicationLimit, "after_update")
+@event.listens_for(ApplicationLimit, "after_insert")
+@event.listens_for(ApplicationLimit, "after_delete")
+def _limits_changed(mapper, connection, target) -> None:
+    session = object_session(target)
+    if session is None:
+        return
+    user_id = target.id if isinstance(target, User) else target.userid
+    session.info.setdefault("limits_changed", set()).add(user_id)
+    if limits_cache.notify:
+        # delivered to the listeners when the transaction commits
+        connection.execute(
+            text("SELECT pg_notify(:channel, :user_id)"),
+            {"channel": NOTIFY_CHANNEL, "user_id": str(user_id)},
+        )
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_limits(session: Session) -> None:
+    for user_id in session.info.pop("limits_changed", ()):
+        limits_cache._cache.delete(str(user_id))
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changed_limits(session: Session) -> None:
+    session.info.pop("limits_changed", None)
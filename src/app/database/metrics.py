@@ -0,0 +1,232 @@
+import bisect
+import collections
+import logging
+import threading
+import time
+from typing import Any, Optional
+
+from pydantic import BaseModel
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from app.core.config import config
+
+logger = logging.getLogger(__name__)
+
+# upper bounds of the latency buckets, in milliseconds
+BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+STATEMENT_KINDS = ("select", "insert", "update", "delete", "with")
+
+
+class Histogram:
+    """
+    Fixed-bucket latency histogram. Observing is a bisect and three
+    increments, cheap enough for every statement.
+    """
+
+    def __init__(self, buckets: tuple[float, ...] = BUCKETS_MS):
+        self.buckets = buckets
+        # last count is for values above the last bucket
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total += value
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Upper bound of the bucket holding the `q` quantile.
+        """
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "count": self.count,
+            "mean_ms": self.total / self.count if self.count else None,
+            "p50_ms": self.quantile(0.5),
+            "p95_ms": self.quantile(0.95),
+            "p99_ms": self.quantile(0.99),
+            "buckets": dict(zip([*self.buckets, "inf"], self.counts)),
+        }
+
+
+class SlowQuery(BaseModel):
+    statement: str
+    # parameter names and types only, never values
+    parameters: Any
+    duration_ms: float
+    at: float
+
+
+def redact(parameters: Any) -> Any:
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        if parameters and isinstance(parameters[0], (dict, list, tuple)):
+            # executemany
+            return f"<{len(parameters)} parameter sets>"
+        return [type(value).__name__ for value in parameters]
+    return None
+
+
+class DatabaseMetrics:
+    """
+    Statement timing, slow query capture and connection pool gauges for an
+    engine.
+
+    - statement latencies go into one `Histogram` per statement kind, from
+      the before/after_cursor_execute events;
+    - statements slower than `slow_query_ms` are kept in a ring buffer of
+      the last `slow_query_log_size`, with redacted parameters;
+    - the time spent waiting for a pooled connection goes into `pool_wait`,
+      measured by the instrumented pool classes below, and pool timeouts are
+      counted;
+    - `snapshot` reads the pool's checked out, overflow and idle gauges.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        slow_query_ms: float = config.DB_SLOW_QUERY_MS,
+        slow_query_log_size: int = config.DB_SLOW_QUERY_LOG_SIZE,
+    ):
+        self.name = name
+        self.slow_query_ms = slow_query_ms
+        self.statements = {kind: Histogram() for kind in STATEMENT_KINDS + ("other",)}
+        self.pool_wait = Histogram()
+        self.pool_timeouts = 0
+        self.peak_checked_out = 0
+        self.slow_queries: collections.deque[SlowQuery] = collections.deque(
+            maxlen=slow_query_log_size
+        )
+        self._engine: Optional[Engine] = None
+
+    def instrument(self, engine: Engine) -> None:
+        """
+        Registers the listeners on a (sync) engine. Its pool should be one of
+        the instrumented pool classes for wait times to be recorded.
+        """
+        self._engine = engine
+        if hasattr(engine.pool, "metrics"):
+            engine.pool.metrics = self
+        event.listen(engine, "before_cursor_execute", self._before_execute)
+        event.listen(engine, "after_cursor_execute", self._after_execute)
+        event.listen(engine.pool, "checkout", self._checkout)
+
+    def _before_execute(
+        self, connection, cursor, statement, parameters, context, executemany
+    ) -> None:
+        # kept on the statement's execution context rather than the
+        # connection, so a statement that fails leaves nothing behind
+        if context is not None:
+            context._metrics_start = time.perf_counter()
+
+    def _after_execute(
+        self, connection, cursor, statement, parameters, context, executemany
+    ) -> None:
+        start = getattr(context, "_metrics_start", None)
+        if start is None:
+            return
+        duration_ms = (time.perf_counter() - start) * 1000
+        kind = (statement.lstrip()[:8].split() or ["other"])[0].lower()
+        self.statements.get(kind, self.statements["other"]).observe(duration_ms)
+
+        if duration_ms >= self.slow_query_ms:
+            self.slow_queries.append(
+                SlowQuery(
+                    statement=statement[:2000],
+                    parameters=redact(parameters),
+                    duration_ms=duration_ms,
+                    at=time.time(),
+                )
+            )
+            logger.warning(
+                f"Slow query on {self.name} ({duration_ms:.0f} ms): "
+                f"{' '.join(statement.split())[:200]}"
+            )
+
+    def _checkout(self, dbapi_con, connection_record, connection_proxy) -> None:
+        checked_out = self._engine.pool.checkedout()
+        if checked_out > self.peak_checked_out:
+            self.peak_checked_out = checked_out
+
+    def pool_gauges(self) -> dict[str, Any]:
+        pool = self._engine.pool if self._engine is not None else None
+        if not isinstance(pool, QueuePool):
+            return {}
+        capacity = pool.size() + pool._max_overflow
+        checked_out = pool.checkedout()
+        return {
+            "size": pool.size(),
+            "capacity": capacity,
+            "checked_out": checked_out,
+            "checked_in": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),
+            "saturation": checked_out / capacity if capacity > 0 else None,
+            "peak_checked_out": self.peak_checked_out,
+        }
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "name": self.name,
+            "statements": {
+                kind: histogram.snapshot()
+                for kind, histogram in self.statements.items()
+                if histogram.count
+            },
+            "pool_wait": self.pool_wait.snapshot(),
+            "pool_timeouts": self.pool_timeouts,
+            "pool": self.pool_gauges(),
+            "slow_queries": [query.model_dump() for query in self.slow_queries],
+        }
+
+
+class _TimedCheckout:
+    """
+    Times `_do_get`, where the pool hands out an idle connection, opens a
+    new one or waits up to `pool_timeout` for one to be returned.
+    """
+
+    metrics: Optional[DatabaseMetrics] = None
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            if self.metrics is not None:
+                self.metrics.pool_timeouts += 1
+            raise
+        finally:
+            if self.metrics is not None:
+                self.metrics.pool_wait.observe((time.perf_counter() - start) * 1000)
+
+    def recreate(self):
+        # engine.dispose() replaces the pool
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+
+class InstrumentedQueuePool(_TimedCheckout, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    pass
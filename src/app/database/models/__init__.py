@@ -2,5 +2,7 @@ from app.database import Base
 
 from .app_limit import ApplicationLimit
 from .folder import Folder
+from .rfp_run import RfpQuestion, RfpRun, RfpSection
+from .usage_ledger import UsageLedgerEntry
 from .user import User
 from .web_search_history import UserWebSearchHistory
@@ -1,7 +1,7 @@
 import uuid
 from datetime import datetime
 
-from sqlalchemy import Column, DateTime, ForeignKey, Integer
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 
@@ -22,3 +22,6 @@ class ApplicationLimit(Base):
 
     # Relationship with User
     user = relationship("User", back_populates="application_limit")
+
+    # limits are looked up by user on every authorisation check
+    __table_args__ = (Index("ix_application_limit_userid", "userid"),)
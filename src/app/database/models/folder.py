@@ -1,7 +1,7 @@
 import uuid
 
-from sqlalchemy import (Boolean, Column, DateTime, ForeignKey, String,
-                        UniqueConstraint)
+from sqlalchemy import (Boolean, Column, DateTime, ForeignKey, Index, String,
+                        UniqueConstraint, text)
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 
@@ -16,16 +16,24 @@ class Folder(Base):
     name = Column(String, index=True, nullable=False, unique=True)
     userid = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
     description = Column(String, nullable=True)
-    created_at = Column(DateTime, default=utc_now)
+    created_at = Column(DateTime, default=utc_now, nullable=False)
     updated_at = Column(DateTime, default=utc_now, onupdate=utc_now)
     is_deleted = Column(Boolean, default=False)
 
     # Relationship with User
     user = relationship("User", back_populates="folders")
 
-    # Relationship with other tables
-    files = relationship("File", back_populates="folder")
-    agents = relationship("Agent", back_populates="folder")
+    # Relationship with other tables, their models are not part of this app
+    # files = relationship("File", back_populates="folder")
+    # agents = relationship("Agent", back_populates="folder")
     __table_args__ = (
         UniqueConstraint("name", "userid", "is_deleted", name="uq_folder_name_user"),
+        # a user's live folders, newest first, see app.database.folders
+        Index(
+            "ix_folder_userid_created_at_id",
+            "userid",
+            "created_at",
+            "id",
+            postgresql_where=text("NOT is_deleted"),
+        ),
     )
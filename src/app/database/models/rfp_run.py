@@ -0,0 +1,80 @@
+import uuid
+
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, String, Text
+from sqlalchemy.dialects.postgresql import JSONB, UUID
+from sqlalchemy.orm import relationship
+
+from app.core.utils import utc_now
+from app.database import Base
+
+
+class RfpRun(Base):
+    __tablename__ = "rfp_run"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=True)
+    folder_id = Column(UUID(as_uuid=True), ForeignKey("folder.id"), nullable=True)
+    file_name = Column(String, nullable=False)
+    # sha256 of the question file, also its content-addressed S3 key
+    file_hash = Column(String(64), nullable=False)
+    s3_key = Column(String, nullable=True)
+    requirements = Column(Text, nullable=True)
+    expectations = Column(Text, nullable=True)
+    problem_statement = Column(Text, nullable=True)
+    # full `Results` of the run, for containment queries (@>)
+    results = Column(JSONB, nullable=False)
+    created_at = Column(DateTime, default=utc_now, nullable=False)
+
+    sections = relationship(
+        "RfpSection", back_populates="run", cascade="all, delete-orphan"
+    )
+
+    __table_args__ = (
+        Index("ix_rfp_run_user_id_created_at", "user_id", "created_at"),
+        Index("ix_rfp_run_folder_id_created_at_id", "folder_id", "created_at", "id"),
+        Index("ix_rfp_run_file_hash", "file_hash"),
+        Index("ix_rfp_run_results", "results", postgresql_using="gin"),
+    )
+
+
+class RfpSection(Base):
+    __tablename__ = "rfp_section"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    run_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("rfp_run.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
+    position = Column(Integer, nullable=False)
+    title = Column(String, nullable=False)
+
+    run = relationship("RfpRun", back_populates="sections")
+    questions = relationship(
+        "RfpQuestion", back_populates="section", cascade="all, delete-orphan"
+    )
+
+
+class RfpQuestion(Base):
+    __tablename__ = "rfp_question"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    run_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("rfp_run.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
+    section_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("rfp_section.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
+    position = Column(Integer, nullable=False)
+    question = Column(Text, nullable=False)
+    answer = Column(Text, nullable=True)
+    sources = Column(JSONB, nullable=True)
+
+    section = relationship("RfpSection", back_populates="questions")
@@ -0,0 +1,30 @@
+import uuid
+
+from sqlalchemy import (Column, DateTime, ForeignKey, Index, Integer, String,
+                        UniqueConstraint)
+from sqlalchemy.dialects.postgresql import UUID
+
+from app.core.utils import utc_now
+from app.database import Base
+
+
+class UsageLedgerEntry(Base):
+    __tablename__ = "usage_ledger"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    # flush batch the entry was written in, makes replayed batches no-ops
+    batch_id = Column(UUID(as_uuid=True), nullable=False)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
+    rfp_id = Column(String, nullable=False, default="")
+    model = Column(String, nullable=False, default="")
+    prompt_tokens = Column(Integer, nullable=False, default=0)
+    completion_tokens = Column(Integer, nullable=False, default=0)
+    calls = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=utc_now)
+
+    __table_args__ = (
+        UniqueConstraint(
+            "batch_id", "user_id", "rfp_id", "model", name="uq_usage_ledger_batch"
+        ),
+        Index("ix_usage_ledger_user_id_created_at", "user_id", "created_at"),
+    )
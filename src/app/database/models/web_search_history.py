@@ -1,7 +1,7 @@
 import uuid
 from datetime import datetime, timezone
 
-from sqlalchemy import Column, DateTime, ForeignKey, Integer
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 
@@ -24,3 +24,8 @@ class UserWebSearchHistory(Base):
     )
 
     user = relationship("User", back_populates="web_search_history")
+
+    # quota checks read the user's latest row
+    __table_args__ = (
+        Index("ix_user_web_search_history_user_id_created_at", "user_id", "created_at"),
+    )
@@ -0,0 +1,87 @@
+import logging
+import threading
+from typing import Callable, Optional
+
+import psycopg
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+
+from app.core.config import config
+from app.database import get_db
+
+
+def notify(channel: str, payload: str, db: Optional[Session] = None) -> None:
+    """
+    Sends a Postgres notification, in `db`'s transaction when given (it is
+    then delivered when that transaction commits).
+    """
+    statement = text("SELECT pg_notify(:channel, :payload)")
+    params = {"channel": channel, "payload": payload}
+    if db is not None:
+        db.execute(statement, params)
+        return
+
+    db = get_db()
+    try:
+        db.execute(statement, params)
+        db.commit()
+    finally:
+        db.close()
+
+
+class NotifyListener:
+    """
+    Background thread LISTENing on a Postgres channel and passing the payload
+    of every notification to `on_notify`. It reconnects after errors, and
+    calls `on_connect` once listening, since whatever was notified while it
+    was not listening is lost.
+    """
+
+    def __init__(
+        self,
+        channel: str,
+        on_notify: Callable[[str], None],
+        on_connect: Callable[[], None],
+        name: str,
+    ):
+        self.channel = channel
+        self.on_notify = on_notify
+        self.on_connect = on_connect
+        self.name = name
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def _listen(self) -> None:
+        url = make_url(config.DB_URL).set(drivername="postgresql")
+        delay = 1
+        while not self._stop.is_set():
+            try:
+                with psycopg.connect(
+                    url.render_as_string(hide_password=False), autocommit=True
+                ) as connection:
+                    connection.execute(f"LISTEN {self.channel}")
+                    self.on_connect()
+                    delay = 1
+                    while not self._stop.is_set():
+                        for notification in connection.notifies(timeout=5):
+                            self.on_notify(notification.payload)
+            except Exception as e:
+                logging.error(f"{self.name} error: {str(e)}, retrying in {delay}s")
+                self._stop.wait(delay)
+                delay = min(delay * 2, 60)
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._listen, name=self.name, daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
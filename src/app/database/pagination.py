@@ -0,0 +1,56 @@
+import base64
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Generic, Optional, TypeVar
+from uuid import UUID
+
+from sqlalchemy import Select, tuple_
+
+T = TypeVar("T")
+
+
+# a dataclass, pydantic cannot build a schema for ORM instances
+@dataclass
+class Page(Generic[T]):
+    items: list[T]
+    # pass back to fetch the next page, None on the last one
+    next_cursor: Optional[str] = None
+
+
+def encode_cursor(created_at: datetime, id: UUID) -> str:
+    payload = json.dumps([created_at.isoformat(), str(id)])
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, UUID]:
+    try:
+        created_at, id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(created_at), UUID(id)
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+
+def keyset(query: Select, created_at, id, cursor: Optional[str], limit: int) -> Select:
+    """
+    Orders `query` newest first on (`created_at`, `id`) and starts it after
+    `cursor`. Both columns must be NOT NULL: a NULL never compares lower
+    than the cursor, so its row would be skipped.
+
+    Unlike OFFSET, the position is a row value comparison the index seeks
+    to, so every page costs the same however deep it is. One extra row is
+    fetched to know whether there is a next page, see `page`.
+    """
+    if cursor is not None:
+        query = query.where(tuple_(created_at, id) < decode_cursor(cursor))
+    return query.order_by(created_at.desc(), id.desc()).limit(limit + 1)
+
+
+def page(rows: list, limit: int) -> Page:
+    """
+    Builds the page of rows fetched with `keyset`.
+    """
+    if len(rows) <= limit:
+        return Page(items=rows)
+    last = rows[limit - 1]
+    return Page(items=rows[:limit], next_cursor=encode_cursor(last.created_at, last.id))
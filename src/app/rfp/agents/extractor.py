@@ -2,9 +2,10 @@ import json
 
 from autogen_core import MessageContext, RoutedAgent, TopicId, message_handler
 from autogen_core.models import SystemMessage, UserMessage
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
-from app.core.llm import get_llm_client
+from app.core.registry import registry
+from app.core.usage_ledger import usage_scope
 from app.rfp.utils import Topics
 
 
@@ -13,9 +14,10 @@ class ExtractMessage(BaseModel):
 
 
 class ExtractedMessage(BaseModel):
-    requirements: str
-    problem_statement: str
-    expectations: str
+    # None when the document has none
+    requirements: str | None = Field(default=None)
+    problem_statement: str | None = Field(default=None)
+    expectations: str | None = Field(default=None)
 
 
 class ExtractorAgent(RoutedAgent):
@@ -23,7 +25,7 @@ class ExtractorAgent(RoutedAgent):
     def __init__(self, description: str):
         super().__init__(description)
 
-        self.llm_client = get_llm_client()
+        self.llm_client = registry.get("llm")
 
         self.system_prompt = f"""
       You are a specialized text classifier that categorizes statements into three categories: problem_statement, requirements, and expectations. You will process batches of text lists and provide clear classification with justification in JSON format.
@@ -124,12 +126,13 @@ class ExtractorAgent(RoutedAgent):
                 previous_response=previous_responses, chunks=i
             )
 
-            response = await self.llm_client.create(
-                [
-                    SystemMessage(content=self.system_prompt),
-                    UserMessage(content=prompt, source="User"),
-                ]
-            )
+            with usage_scope(rfp_id=ctx.topic_id.source):
+                response = await self.llm_client.create(
+                    [
+                        SystemMessage(content=self.system_prompt),
+                        UserMessage(content=prompt, source="User"),
+                    ]
+                )
 
             assert isinstance(response.content, str)
             previous_responses = response.content
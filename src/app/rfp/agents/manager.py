@@ -1,6 +1,8 @@
 import asyncio
+import logging
+import mimetypes
 import re
-import uuid
+from dataclasses import dataclass, field
 from datetime import datetime
 from typing import Optional
 from uuid import UUID
@@ -11,8 +13,14 @@ from pydantic import BaseModel, Field
 from app.rfp.agents.extractor import ExtractedMessage, ExtractMessage
 from app.rfp.agents.parser import ParsedMessage
 from app.rfp.agents.section_generator import (GeneratedMessage,
-                                              GenerateMessage, SectionData)
+                                              GenerateMessage, ProgressMessage,
+                                              SectionData, Stage)
+from app.core.config import config
+from app.core.registry import registry
+from app.core.usage_ledger import usage_ledger
 from app.rfp.services.file import FileProcessing
+from app.rfp.services.results_store import ResultsStore
+from app.rfp.services.s3 import AsyncS3Service, content_hash
 from app.rfp.utils import Topics
 
 file_pattern = re.compile(r"(.*/)?(.*)\.(.*)")
@@ -20,6 +28,11 @@ file_pattern = re.compile(r"(.*/)?(.*)\.(.*)")
 
 class StartMessage(BaseModel):
     question_file_path: str
+    user_id: UUID | None = Field(default=None)
+    folder_id: UUID | None = Field(default=None)
+    # id of the run, source of its topics; defaults to the receiving
+    # manager's key
+    rfp_id: str | None = Field(default=None)
 
 
 class Results(BaseModel):
@@ -29,20 +42,115 @@ class Results(BaseModel):
     sections: list[SectionData] | None = Field(default=None)
 
 
+@dataclass
+class RunState:
+    """
+    What the manager knows of a run in progress.
+    """
+
+    message: StartMessage
+    file_name: str
+    file_hash: str
+    results: Results = field(default_factory=Results)
+    # set once the extractor and the section generator are done, whatever
+    # they found: a document may well have no requirements
+    extracted: bool = False
+    generated: bool = False
+    archive_task: Optional[asyncio.Task] = None
+    # S3 key of the archived question file
+    archive_key: Optional[str] = None
+
+
 class ManagerAgent(RoutedAgent):
+    """
+    Drives the runs: a single instance handles every run, and keeps their
+    state in `runs` by rfp id. The map is handed in by the owner of the
+    runtime, which drops the state of a run once it is over, see
+    `RfpRuntime`.
+    """
 
-    def __init__(self, description: str):
+    def __init__(self, description: str, runs: Optional[dict[str, RunState]] = None):
         super().__init__(description)
 
-        self.file_service = FileProcessing()
-        self.extracted_results: ExtractedMessage | None = None
+        self.file_service: FileProcessing = registry.get("file_processing")
+        self.s3_service: AsyncS3Service = registry.get("s3_async")
+        self.results_store = ResultsStore()
+
+        self.runs: dict[str, RunState] = runs if runs is not None else {}
+        self._background_tasks: set[asyncio.Task] = set()
+
+    def run_in_background(self, coro) -> asyncio.Task:
+        task = asyncio.create_task(coro)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+        return task
+
+    def claim_results(self, rfp_id: str) -> Optional[RunState]:
+        """
+        Returns the run once both the extracted info and the sections are in,
+        to the first caller only. Handlers call it before awaiting anything,
+        so however their awaits interleave the results are published and
+        saved once.
+        """
+        run = self.runs.get(rfp_id)
+        if run is None or not (run.extracted and run.generated):
+            return None
+        return self.runs.pop(rfp_id)
+
+    async def publish_results(
+        self, rfp_id: str, run: RunState, ctx: MessageContext
+    ) -> None:
+        print("Publishing results")
+        await self.publish_message(
+            run.results,
+            TopicId(Topics.RESULTS.value, rfp_id),
+            cancellation_token=ctx.cancellation_token,
+        )
+        self.run_in_background(self.save_results(rfp_id, run))
 
-        self.bytes_content: bytes
-        self.text_content: str
-        self.file_name: str
-        self.file_extension: str
+    async def save_results(self, rfp_id: str, run: RunState) -> None:
+        """
+        Saves the results of a run, once its question file is archived.
+        Failures are logged and never reach the flow.
+        """
+        try:
+            if run.archive_task is not None:
+                await run.archive_task
+            await self.results_store.save_run(
+                UUID(hex=rfp_id),
+                run.file_name,
+                run.file_hash,
+                run.results,
+                user_id=run.message.user_id,
+                folder_id=run.message.folder_id,
+                s3_key=run.archive_key,
+            )
+        except Exception as e:
+            logging.error(f"Error saving results of {rfp_id}: {str(e)}")
 
-        self.results = Results()
+    async def archive(self, run: RunState, content: bytes) -> None:
+        """
+        Uploads the question file to S3, retrying with exponential backoff.
+        Failures are logged and never reach the flow.
+        """
+        content_type = mimetypes.guess_type(run.file_name)[0] or ""
+        for attempt in range(config.S3_ARCHIVE_RETRIES + 1):
+            try:
+                run.archive_key = await self.s3_service.content_upload(
+                    content, run.file_name, content_type
+                )
+                print(f"Archived {run.file_name} as {run.archive_key}")
+                return
+            except Exception as e:
+                if attempt == config.S3_ARCHIVE_RETRIES:
+                    logging.error(f"Error archiving {run.file_name}: {str(e)}")
+                    return
+                delay = 2**attempt
+                logging.warning(
+                    f"Archiving {run.file_name} failed ({str(e)}), "
+                    f"retrying in {delay}s"
+                )
+                await asyncio.sleep(delay)
 
     @message_handler
     async def start(self, message: StartMessage, ctx: MessageContext) -> None:
@@ -50,21 +158,42 @@ class ManagerAgent(RoutedAgent):
         Start the flow
         """
 
-        rfp_id = uuid.uuid4().hex
-
-        # TODO: Upload to S3
+        rfp_id = message.rfp_id or self.id.key
+        if message.user_id is not None:
+            usage_ledger.bind(rfp_id, message.user_id)
 
         match = file_pattern.match(message.question_file_path)
         if not match:
             raise Exception("Invalid file path")
 
-        self.file_name = match.group(2)
-        self.file_extention = match.group(3)
+        bytes_content = await asyncio.to_thread(
+            self.file_service.read_file, message.question_file_path
+        )
+        run = RunState(
+            message=message,
+            file_name=f"{match.group(2)}.{match.group(3)}",
+            file_hash=content_hash(bytes_content),
+        )
+        self.runs[rfp_id] = run
+
+        # archive in the background, off the critical path: the upload shares
+        # the bytes read above and overlaps with parsing and chunking, which
+        # run in threads so they don't hold up the event loop
+        run.archive_task = self.run_in_background(self.archive(run, bytes_content))
 
-        self.bytes_content = self.file_service.read_file(message.question_file_path)
-        self.text_content = self.file_service.bytesToText(self.bytes_content)
+        text_content = await asyncio.to_thread(
+            self.file_service.bytesToText, bytes_content
+        )
+
+        chunks = await asyncio.to_thread(
+            self.file_service.split_text_into_chunks, text_content
+        )
 
-        chunks = self.file_service.split_text_into_chunks(self.text_content)
+        await self.publish_message(
+            ProgressMessage(stage=Stage.STARTED),
+            TopicId(Topics.PROGRESS.value, rfp_id),
+            cancellation_token=ctx.cancellation_token,
+        )
 
         # start both the processes
         await self.publish_message(
@@ -74,7 +203,7 @@ class ManagerAgent(RoutedAgent):
         )
 
         await self.publish_message(
-            GenerateMessage(content=self.text_content),
+            GenerateMessage(content=text_content),
             TopicId(Topics.GENERATE.value, rfp_id),
             cancellation_token=ctx.cancellation_token,
         )
@@ -88,21 +217,32 @@ class ManagerAgent(RoutedAgent):
         """
 
         print("Info extracted")
-        self.extracted_results = message
-
-        self.results.requirements = message.requirements
-        self.results.expectations = message.expectations
-        self.results.problem_statement = message.problem_statement
-
-        if self.results.sections:
-            print("Publishing results")
-            await self.publish_message(
-                self.results,
-                TopicId("results", ctx.topic_id.source),
-                cancellation_token=ctx.cancellation_token,
+        run = self.runs.get(ctx.topic_id.source)
+        if run is None:
+            logging.warning(
+                f"Dropping extracted info of ended run {ctx.topic_id.source}"
             )
+            return
 
-        # TODO: save the results to db
+        run.results.requirements = message.requirements
+        run.results.expectations = message.expectations
+        run.results.problem_statement = message.problem_statement
+        run.extracted = True
+        claimed = self.claim_results(ctx.topic_id.source)
+
+        await self.publish_message(
+            ProgressMessage(
+                stage=Stage.EXTRACTED,
+                requirements=message.requirements,
+                expectations=message.expectations,
+                problem_statement=message.problem_statement,
+            ),
+            TopicId(Topics.PROGRESS.value, ctx.topic_id.source),
+            cancellation_token=ctx.cancellation_token,
+        )
+
+        if claimed is not None:
+            await self.publish_results(ctx.topic_id.source, claimed, ctx)
 
     @message_handler
     async def generated_handler(
@@ -112,13 +252,21 @@ class ManagerAgent(RoutedAgent):
         After generating sections
         """
 
-        self.results.sections = message.sections
         print("Sections generated")
+        run = self.runs.get(ctx.topic_id.source)
+        if run is None:
+            logging.warning(f"Dropping sections of ended run {ctx.topic_id.source}")
+            return
 
-        if self.results.requirements:
-            print("Publishing results")
-            await self.publish_message(
-                self.results,
-                TopicId("results", ctx.topic_id.source),
-                cancellation_token=ctx.cancellation_token,
-            )
+        run.results.sections = message.sections
+        run.generated = True
+        claimed = self.claim_results(ctx.topic_id.source)
+
+        await self.publish_message(
+            ProgressMessage(stage=Stage.GENERATED, sections=message.sections),
+            TopicId(Topics.PROGRESS.value, ctx.topic_id.source),
+            cancellation_token=ctx.cancellation_token,
+        )
+
+        if claimed is not None:
+            await self.publish_results(ctx.topic_id.source, claimed, ctx)
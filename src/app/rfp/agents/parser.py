@@ -1,6 +1,7 @@
 from autogen_core import MessageContext, RoutedAgent, TopicId, message_handler
 from pydantic import BaseModel
 
+from app.core.registry import registry
 from app.rfp.services.file import FileProcessing
 from app.rfp.utils import Topics
 
@@ -25,7 +26,7 @@ class ParserAgent(RoutedAgent):
         Handler to parse question file
         """
 
-        pdf_service = FileProcessing()
+        pdf_service: FileProcessing = registry.get("file_processing")
         with open(message.question_file_path, "rb") as f:
             content = f.read()
             content = pdf_service.bytesToText(content)
@@ -1,11 +1,15 @@
 import json
+import time
+from enum import Enum
 from pprint import pprint
 
 from autogen_core import MessageContext, RoutedAgent, TopicId, message_handler
-from autogen_core.models import SystemMessage, UserMessage
-from pydantic import BaseModel
+from autogen_core.models import CreateResult, SystemMessage, UserMessage
+from pydantic import BaseModel, Field, ValidationError
 
-from app.core.llm import get_llm_client
+from app.core.config import config
+from app.core.registry import registry
+from app.core.usage_ledger import usage_scope
 from app.rfp.utils import Topics
 
 
@@ -22,6 +26,62 @@ class GeneratedMessage(BaseModel):
     sections: list[SectionData]
 
 
+class Stage(str, Enum):
+    STARTED = "started"
+    EXTRACTED = "extracted"
+    GENERATING = "generating"
+    GENERATED = "generated"
+
+
+class ProgressMessage(BaseModel):
+    """
+    Progress of a run, published on the progress topic as its stages finish.
+    """
+
+    stage: Stage
+    # streamed section output since the previous message
+    text: str | None = Field(default=None)
+    # sections completed since the previous message, or all of them once
+    # generated
+    sections: list[SectionData] | None = Field(default=None)
+    requirements: str | None = Field(default=None)
+    expectations: str | None = Field(default=None)
+    problem_statement: str | None = Field(default=None)
+
+
+_decoder = json.JSONDecoder()
+
+
+def parse_sections(text: str, position: int = 0) -> tuple[list[SectionData], int]:
+    """
+    Parses the sections completed so far in a partial `{"sections": [...]}`
+    output, starting at `position`. Returns them with the position to resume
+    from once more output arrives.
+    """
+    if position == 0:
+        start = text.find("[", max(text.find('"sections"'), 0))
+        if start == -1 or '"sections"' not in text:
+            return [], 0
+        position = start + 1
+
+    sections = []
+    while True:
+        while position < len(text) and text[position] in " \t\r\n,":
+            position += 1
+        if position >= len(text) or text[position] != "{":
+            return sections, position
+        try:
+            section, end = _decoder.raw_decode(text, position)
+        except json.JSONDecodeError:
+            # still being streamed
+            return sections, position
+        try:
+            sections.append(SectionData(**section))
+        except (TypeError, ValidationError):
+            pass
+        position = end
+
+
 class SectionGeneratorAgent(RoutedAgent):
 
     def __init__(self, desc: str):
@@ -68,7 +128,51 @@ Input:
 
 """
 
-        self.llm_client = get_llm_client()
+        self.llm_client = registry.get("llm")
+        # seconds between progress messages while streaming
+        self.progress_interval = 0.25
+
+    async def complete(self, messages: list, rfp_id: str, ctx: MessageContext) -> str:
+        """
+        Gets the sections from the LLM. When streaming, the output and the
+        sections completed so far are published as progress of the run.
+        """
+        if not config.LLM_STREAMING:
+            response = await self.llm_client.create(messages, json_output=True)
+            return response.content
+
+        topic_id = TopicId(Topics.PROGRESS.value, rfp_id)
+        response = None
+        text = ""
+        pending = ""
+        position = 0
+        published = time.monotonic()
+        async for chunk in self.llm_client.create_stream(
+            messages,
+            json_output=True,
+            # usage of streamed calls is only reported when asked for
+            extra_create_args={"stream_options": {"include_usage": True}},
+        ):
+            if isinstance(chunk, CreateResult):
+                response = chunk
+                continue
+            text += chunk
+            pending += chunk
+            if time.monotonic() - published < self.progress_interval:
+                continue
+
+            sections, position = parse_sections(text, position)
+            await self.publish_message(
+                ProgressMessage(
+                    stage=Stage.GENERATING, text=pending, sections=sections or None
+                ),
+                topic_id,
+                cancellation_token=ctx.cancellation_token,
+            )
+            pending = ""
+            published = time.monotonic()
+
+        return response.content if response is not None else text
 
     @message_handler
     async def generate_sections(
@@ -79,24 +183,25 @@ Input:
         """
 
         print("Generating Sections")
+        assert ctx.topic_id is not None
 
         prompt = self.prompt.format(rfp_content=message.content)
-        response = await self.llm_client.create(
-            [
-                SystemMessage(content=prompt),
-                UserMessage(
-                    content="Format and categorize RFP questions into logical themed sections. Give output in JSON",
-                    source="User",
-                ),
-            ],
-            json_output=True,
-        )
-
-        assert isinstance(response.content, str), "LLM Output is not string"
-
-        data = json.loads(response.content)
-
-        assert ctx.topic_id is not None
+        with usage_scope(rfp_id=ctx.topic_id.source):
+            content = await self.complete(
+                [
+                    SystemMessage(content=prompt),
+                    UserMessage(
+                        content="Format and categorize RFP questions into logical themed sections. Give output in JSON",
+                        source="User",
+                    ),
+                ],
+                ctx.topic_id.source,
+                ctx,
+            )
+
+        assert isinstance(content, str), "LLM Output is not string"
+
+        data = json.loads(content)
 
         topic_id = TopicId(Topics.GENERATED.value, ctx.topic_id.source)
         await self.publish_message(
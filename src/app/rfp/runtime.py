@@ -0,0 +1,240 @@
+import asyncio
+import logging
+import uuid
+from typing import Callable, Optional
+from uuid import UUID
+
+from autogen_core import (
+    AgentId,
+    ClosureAgent,
+    ClosureContext,
+    MessageContext,
+    SingleThreadedAgentRuntime,
+    TopicId,
+    TypeSubscription,
+)
+from autogen_core.exceptions import CantHandleException
+from autogen_core.logging import LLMCallEvent
+
+from app.core.config import config
+from app.core.llm_tracker import LLMUsageTracker, get_global_tracker, setup_tracking
+from app.core.usage_ledger import current_usage_owner
+from app.rfp.agents.extractor import ExtractorAgent
+from app.rfp.agents.manager import ManagerAgent, Results, RunState, StartMessage
+from app.rfp.agents.section_generator import ProgressMessage, SectionGeneratorAgent
+from app.rfp.utils import Agents, Topics
+
+# closure agents collecting the results and progress of the runs
+RESULTS_AGENT = "closure"
+PROGRESS_AGENT = "progress"
+
+# key of the single instance of every agent type
+SHARED_KEY = "shared"
+
+
+class SharedSubscription(TypeSubscription):
+    """
+    Maps the topics of every run to the single instance of the agent type,
+    where `TypeSubscription` makes an instance per topic source, i.e. per
+    run, that the runtime would keep forever.
+    """
+
+    def map_to_agent(self, topic_id: TopicId) -> AgentId:
+        if not self.is_match(topic_id):
+            raise CantHandleException("TopicId does not match the subscription")
+        return AgentId(type=self.agent_type, key=SHARED_KEY)
+
+
+class RfpRuntime:
+    """
+    Agent runtime shared by concurrent runs.
+
+    Each run gets an id and a future. The id is the source of every topic the
+    run's messages go through, including the results topic, where a closure
+    agent resolves the future of that run only. Runs time out after
+    `timeout` seconds and their future is dropped whatever happens, so late
+    results of an abandoned run are discarded.
+
+    Progress messages of a run are routed the same way, to its `on_progress`
+    callback, and the LLM calls charged to the run (see `usage_scope`) are
+    counted by its own `usage` tracker, so concurrent runs don't mix their
+    token usage.
+
+    Every agent type has a single instance serving all the runs, see
+    `SharedSubscription`. The manager keeps the state of each run in `_runs`,
+    by run id, which is dropped when the run ends whatever happens, so only
+    the state of pending runs is held. Work still in flight for a run that
+    ended (saving results) finishes on its own, and messages of an abandoned
+    run arriving later are dropped.
+    """
+
+    def __init__(self, timeout: float = config.RFP_TIMEOUT):
+        self.timeout = timeout
+        self.runtime: Optional[SingleThreadedAgentRuntime] = None
+        self._pending: dict[str, asyncio.Future[Results]] = {}
+        self._progress: dict[str, Callable[[ProgressMessage], None]] = {}
+        self._usage: dict[str, LLMUsageTracker] = {}
+        self._runs: dict[str, RunState] = {}
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    @property
+    def runs(self) -> int:
+        """
+        Number of runs the manager holds the state of.
+        """
+        return len(self._runs)
+
+    async def start(self) -> None:
+        """
+        Registers the agents and starts the runtime.
+        """
+        if self.runtime is not None:
+            return
+        runtime = SingleThreadedAgentRuntime()
+        setup_tracking()
+        get_global_tracker().add_listener(self._record_usage)
+
+        manager_agent_type = await ManagerAgent.register(
+            runtime,
+            Agents.MANAGER.value,
+            lambda: ManagerAgent(Agents.MANAGER.value, self._runs),
+        )
+        for topic in (Topics.START, Topics.PARSED, Topics.EXTRACTED, Topics.GENERATED):
+            await runtime.add_subscription(
+                SharedSubscription(topic.value, manager_agent_type)
+            )
+
+        extractor_agent_type = await ExtractorAgent.register(
+            runtime,
+            Agents.EXTRACTOR.value,
+            lambda: ExtractorAgent(Agents.EXTRACTOR.value),
+        )
+        await runtime.add_subscription(
+            SharedSubscription(Topics.EXTRACT.value, extractor_agent_type)
+        )
+
+        section_generator_agent_type = await SectionGeneratorAgent.register(
+            runtime,
+            Agents.SECTION_GENERATOR.value,
+            lambda: SectionGeneratorAgent(Agents.SECTION_GENERATOR.value),
+        )
+        await runtime.add_subscription(
+            SharedSubscription(Topics.GENERATE.value, section_generator_agent_type)
+        )
+
+        runtime.start()
+
+        # closures must be plain functions of (agent, message, ctx), the
+        # runtime reads the message type from their signature
+        async def collect_result(
+            _agent: ClosureContext, message: Results, ctx: MessageContext
+        ) -> None:
+            self._collect_result(message, ctx)
+
+        async def collect_progress(
+            _agent: ClosureContext, message: ProgressMessage, ctx: MessageContext
+        ) -> None:
+            self._collect_progress(message, ctx)
+
+        await ClosureAgent.register_closure(
+            runtime,
+            RESULTS_AGENT,
+            collect_result,
+            subscriptions=lambda: [
+                SharedSubscription(
+                    topic_type=Topics.RESULTS.value, agent_type=RESULTS_AGENT
+                )
+            ],
+        )
+        await ClosureAgent.register_closure(
+            runtime,
+            PROGRESS_AGENT,
+            collect_progress,
+            subscriptions=lambda: [
+                SharedSubscription(
+                    topic_type=Topics.PROGRESS.value, agent_type=PROGRESS_AGENT
+                )
+            ],
+        )
+        self.runtime = runtime
+
+    def _collect_result(self, message: Results, ctx: MessageContext) -> None:
+        future = self._pending.get(ctx.topic_id.source)
+        if future is None or future.done():
+            logging.warning(f"Dropping results of unknown run {ctx.topic_id.source}")
+            return
+        future.set_result(message)
+
+    def _collect_progress(self, message: ProgressMessage, ctx: MessageContext) -> None:
+        on_progress = self._progress.get(ctx.topic_id.source)
+        if on_progress is None:
+            return
+        try:
+            on_progress(message)
+        except Exception as e:
+            logging.error(
+                f"Error reporting progress of {ctx.topic_id.source}: {str(e)}"
+            )
+
+    def _record_usage(self, event: LLMCallEvent) -> None:
+        owner = current_usage_owner()
+        usage = self._usage.get(owner[1]) if owner else None
+        if usage is not None:
+            usage.add(event)
+
+    async def run(
+        self,
+        question_file_path: str,
+        user_id: Optional[UUID] = None,
+        folder_id: Optional[UUID] = None,
+        timeout: Optional[float] = None,
+        on_progress: Optional[Callable[[ProgressMessage], None]] = None,
+        usage: Optional[LLMUsageTracker] = None,
+    ) -> Results:
+        """
+        Processes a question file and returns its results. `on_progress` is
+        called, from the runtime's loop, with the run's progress messages,
+        and `usage` counts the LLM calls of the run.
+        """
+        if self.runtime is None:
+            raise Exception("RfpRuntime is not started")
+
+        rfp_id = uuid.uuid4().hex
+        future = asyncio.get_running_loop().create_future()
+        self._pending[rfp_id] = future
+        if on_progress is not None:
+            self._progress[rfp_id] = on_progress
+        if usage is not None:
+            self._usage[rfp_id] = usage
+        try:
+            await self.runtime.send_message(
+                StartMessage(
+                    question_file_path=question_file_path,
+                    user_id=user_id,
+                    folder_id=folder_id,
+                    rfp_id=rfp_id,
+                ),
+                AgentId(Agents.MANAGER.value, SHARED_KEY),
+            )
+            return await asyncio.wait_for(future, timeout or self.timeout)
+        except asyncio.TimeoutError:
+            logging.error(f"Run {rfp_id} timed out")
+            raise
+        finally:
+            del self._pending[rfp_id]
+            self._progress.pop(rfp_id, None)
+            self._usage.pop(rfp_id, None)
+            self._runs.pop(rfp_id, None)
+
+    async def stop(self) -> None:
+        """
+        Stops the runtime once the messages in flight are processed.
+        """
+        if self.runtime is None:
+            return
+        await self.runtime.stop_when_idle()
+        get_global_tracker().remove_listener(self._record_usage)
+        self.runtime = None
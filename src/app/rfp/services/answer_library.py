@@ -0,0 +1,169 @@
+import asyncio
+import logging
+from typing import Optional
+from uuid import UUID
+
+from pydantic import BaseModel
+from weaviate.classes.config import (
+    Configure,
+    DataType,
+    Property,
+    VectorDistances,
+)
+from weaviate.collections.classes.filters import Filter
+from weaviate.collections.classes.grpc import MetadataQuery
+from weaviate.util import generate_uuid5
+
+from app.core.config import config
+from app.core.utils import utc_now
+from app.rfp.services.weaviate import WeaviateService, normalize_query
+
+
+class LibraryMatch(BaseModel):
+    question: str
+    answer: str
+    similarity: float
+    # near-exact match, the answer can be used as is
+    reuse: bool
+
+
+class LibraryReport(BaseModel):
+    lookups: int = 0
+    reused: int = 0
+    drafted: int = 0
+
+
+class AnswerLibrary:
+    """
+    Store of approved question/answer pairs, searched by question embedding
+    through the HNSW (approximate nearest-neighbour) index of a Weaviate
+    collection shared by all users and filtered by owner.
+
+    Matches at or above `reuse_threshold` cosine similarity are reused as they
+    are; matches at or above `draft_threshold` are handed to the LLM as a draft.
+    """
+
+    def __init__(
+        self,
+        weaviate_service: WeaviateService,
+        reuse_threshold: float = config.ANSWER_REUSE_THRESHOLD,
+        draft_threshold: float = config.ANSWER_DRAFT_THRESHOLD,
+        concurrency: int = config.RETRIEVAL_CONCURRENCY,
+    ):
+        self.weaviate_service = weaviate_service
+        self.reuse_threshold = reuse_threshold
+        self.draft_threshold = draft_threshold
+        self.concurrency = concurrency
+        self.collection_name = config.ANSWER_LIBRARY_COLLECTION
+
+    @property
+    def available(self) -> bool:
+        return not self.weaviate_service.offline
+
+    def ensure_collection(self) -> None:
+        client = self.weaviate_service.client
+        if client.collections.exists(self.collection_name):
+            return
+
+        client.collections.create(
+            self.collection_name,
+            vectorizer_config=Configure.Vectorizer.none(),
+            vector_index_config=Configure.VectorIndex.hnsw(
+                distance_metric=VectorDistances.COSINE
+            ),
+            properties=[
+                Property(name="question", data_type=DataType.TEXT),
+                Property(name="answer", data_type=DataType.TEXT),
+                Property(name="user_id", data_type=DataType.TEXT),
+                Property(name="sources", data_type=DataType.TEXT_ARRAY),
+                Property(name="approved_at", data_type=DataType.DATE),
+            ],
+        )
+        logging.info(f"Created collection {self.collection_name}")
+
+    async def add(
+        self,
+        user_id: UUID,
+        questions: list[str],
+        answers: list[str],
+        sources: Optional[list[list[str]]] = None,
+    ) -> int:
+        """
+        Adds approved answers to the user's library. Approving an answer to
+        the same question again replaces the previous one.
+        Returns the number of pairs that failed to import.
+        """
+        embeddings = await self.weaviate_service.generate_embeddings(questions)
+        approved_at = utc_now()
+
+        def import_pairs() -> int:
+            self.ensure_collection()
+            collection = self.weaviate_service.client.collections.get(
+                self.collection_name
+            )
+            with collection.batch.dynamic() as batch:
+                for i, (question, answer) in enumerate(zip(questions, answers)):
+                    batch.add_object(
+                        properties={
+                            "question": question,
+                            "answer": answer,
+                            "user_id": str(user_id),
+                            "sources": sources[i] if sources else [],
+                            "approved_at": approved_at,
+                        },
+                        uuid=generate_uuid5(f"{user_id}:{normalize_query(question)}"),
+                        vector=embeddings[i],
+                    )
+            failed = collection.batch.failed_objects
+            for obj in failed[:5]:
+                logging.error(f"Failed to add answer to library: {obj.message}")
+            return len(failed)
+
+        return await asyncio.to_thread(import_pairs)
+
+    def _nearest(self, user_id: UUID, vector: list[float]) -> Optional[LibraryMatch]:
+        collection = self.weaviate_service.client.collections.get(self.collection_name)
+        response = collection.query.near_vector(
+            near_vector=vector,
+            limit=1,
+            # cosine distance is 1 - similarity
+            distance=1 - self.draft_threshold,
+            filters=Filter.by_property("user_id").equal(str(user_id)),
+            return_metadata=MetadataQuery(distance=True),
+            return_properties=["question", "answer"],
+        )
+        if not response.objects:
+            return None
+
+        obj = response.objects[0]
+        similarity = 1 - obj.metadata.distance
+        return LibraryMatch(
+            question=obj.properties["question"],
+            answer=obj.properties["answer"],
+            similarity=similarity,
+            reuse=similarity >= self.reuse_threshold,
+        )
+
+    async def lookup(
+        self, user_id: UUID, embeddings: list[list[float]]
+    ) -> list[Optional[LibraryMatch]]:
+        """
+        Finds the closest approved answer for each question embedding, or
+        None when there is nothing above `draft_threshold`.
+        """
+        if not self.available or not embeddings:
+            return [None] * len(embeddings)
+
+        exists = await asyncio.to_thread(
+            self.weaviate_service.client.collections.exists, self.collection_name
+        )
+        if not exists:
+            return [None] * len(embeddings)
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def nearest(vector: list[float]) -> Optional[LibraryMatch]:
+            async with semaphore:
+                return await asyncio.to_thread(self._nearest, user_id, vector)
+
+        return list(await asyncio.gather(*[nearest(v) for v in embeddings]))
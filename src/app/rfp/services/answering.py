@@ -0,0 +1,288 @@
+import asyncio
+import logging
+import time
+from typing import AsyncIterator
+from uuid import UUID
+
+from autogen_core.models import SystemMessage, UserMessage
+from pydantic import BaseModel, Field
+
+from app.core.config import config
+from app.core.registry import registry
+from app.core.usage_ledger import usage_scope
+from app.rfp.agents.section_generator import SectionData
+from app.rfp.services.answer_library import AnswerLibrary, LibraryMatch, LibraryReport
+from app.rfp.services.context import ContextPacker
+from app.rfp.services.question_dedup import (
+    DedupReport,
+    cluster_questions,
+    cluster_questions_exact,
+)
+from app.rfp.services.weaviate import WeaviateService
+
+
+class AnsweredQuestion(BaseModel):
+    section_index: int
+    question_index: int
+    section_title: str
+    question: str
+    answer: str | None = Field(default=None)
+    sources: list[str] = Field(default_factory=list)
+    error: str | None = Field(default=None)
+    elapsed: float = 0.0
+    # position of the question whose answer was reused for this one
+    duplicate_of: tuple[int, int] | None = Field(default=None)
+    # "reused" or "drafted" when an approved answer from the library was used
+    library: str | None = Field(default=None)
+
+
+class AnswerEngine:
+    """
+    Answers every question of the generated sections from a knowledge-base
+    folder: retrieval through `WeaviateService.query_collection_batch`,
+    context packing through `ContextPacker` and one LLM call per question.
+
+    Questions are answered by a pool of at most `concurrency` workers, each
+    bounded by `timeout` seconds, and yielded as soon as they finish, so the
+    wall time of a full RFP depends on the concurrency rather than on the
+    number of questions.
+
+    Questions whose embeddings are at least `dedup_threshold` similar are
+    answered once and the answer is fanned out to the duplicates; pass
+    `dedup_threshold=None` to answer every question separately.
+
+    With an `answer_library`, each distinct question is first looked up among
+    the user's approved answers: near-exact matches are reused without any
+    retrieval or LLM call, close matches are given to the LLM as a draft.
+    """
+
+    def __init__(
+        self,
+        weaviate_service: WeaviateService,
+        concurrency: int = config.ANSWER_CONCURRENCY,
+        timeout: float = config.ANSWER_TIMEOUT,
+        context_packer: ContextPacker | None = None,
+        dedup_threshold: float | None = config.QUESTION_DEDUP_THRESHOLD,
+        answer_library: AnswerLibrary | None = None,
+    ):
+        self.weaviate_service = weaviate_service
+        self.llm_client = registry.get("llm")
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.context_packer = context_packer or ContextPacker()
+        self.dedup_threshold = dedup_threshold
+        self.dedup_report: DedupReport | None = None
+        self.answer_library = answer_library
+        self.library_report: LibraryReport | None = None
+
+        self.system_prompt = """
+You are an expert proposal writer answering questions from an RFP (Request for Proposal) on behalf of a company.
+
+Answer the question using ONLY the context passages from the company's knowledge base.
+- Write a clear, professional answer that can be pasted into the proposal.
+- Do not invent facts, numbers, certifications or commitments that are not in the context.
+- If the context does not contain the answer, reply with exactly: "Insufficient information in the knowledge base."
+"""
+
+        self.user_prompt = """
+CONTEXT:
+{context}
+
+QUESTION:
+{question}
+"""
+
+        self.draft_prompt = """
+A previously approved answer to a similar question is given as a DRAFT. Reuse its wording where it still applies, and correct or complete it using the context.
+
+DRAFT (answer to "{draft_question}"):
+{draft}
+"""
+
+    async def answer_question(
+        self,
+        folder_id: UUID,
+        question: str,
+        draft: LibraryMatch | None = None,
+        documents: list[dict] | None = None,
+    ) -> tuple[str, list[str]]:
+        """
+        Answers a single question, optionally starting from the `draft` of a
+        similar approved answer. The question's documents are retrieved unless
+        already given. Returns the answer and its source files.
+        """
+        if documents is None:
+            documents = await self.weaviate_service.query_collection(
+                folder_id, question
+            )
+        if not documents and draft is None:
+            return "Insufficient information in the knowledge base.", []
+
+        context, documents = self.context_packer.pack(question, documents)
+        prompt = self.user_prompt.format(context=context, question=question)
+        if draft is not None:
+            prompt += self.draft_prompt.format(
+                draft_question=draft.question, draft=draft.answer
+            )
+
+        response = await self.llm_client.create(
+            [
+                SystemMessage(content=self.system_prompt),
+                UserMessage(content=prompt, source="User"),
+            ]
+        )
+        assert isinstance(response.content, str), "LLM Output is not string"
+
+        sources = list(
+            dict.fromkeys(doc["filename"] for doc in documents if doc.get("filename"))
+        )
+        return response.content.strip(), sources
+
+    def cluster(
+        self, questions: list[str], embeddings: list[list[float]] | None
+    ) -> list[list[int]]:
+        """
+        Groups duplicate questions, see `cluster_questions`. Without
+        embeddings only questions that are identical after normalization are
+        grouped.
+        """
+        if self.dedup_threshold is None:
+            return [[i] for i in range(len(questions))]
+        if embeddings is None:
+            return cluster_questions_exact(questions)
+        return cluster_questions(embeddings, self.dedup_threshold)
+
+    async def answer_sections(
+        self,
+        folder_id: UUID,
+        sections: list[SectionData],
+        user_id: UUID | None = None,
+    ) -> AsyncIterator[AnsweredQuestion]:
+        """
+        Answers every question of `sections` concurrently and yields each
+        answer as soon as it is ready, in completion order. Duplicates are
+        yielded together with the question they were answered through.
+        A question that fails or times out is yielded with its `error` set.
+        The answer library is only consulted when `user_id` is given.
+        """
+        items = [
+            AnsweredQuestion(
+                section_index=i,
+                question_index=j,
+                section_title=section.title,
+                question=question,
+            )
+            for i, section in enumerate(sections)
+            for j, question in enumerate(section.questions)
+        ]
+        if not items:
+            return
+
+        questions = [item.question for item in items]
+        use_library = self.answer_library is not None and user_id is not None
+        embeddings = None
+        if not self.weaviate_service.offline and (
+            self.dedup_threshold is not None or use_library
+        ):
+            embeddings = await self.weaviate_service.generate_embeddings(questions)
+
+        clusters = self.cluster(questions, embeddings)
+        self.dedup_report = DedupReport(
+            questions=len(items),
+            clusters=len(clusters),
+            threshold=self.dedup_threshold or 1.0,
+        )
+
+        matches: list[LibraryMatch | None] = [None] * len(clusters)
+        if use_library and embeddings is not None:
+            matches = await self.answer_library.lookup(
+                user_id, [embeddings[cluster[0]] for cluster in clusters]
+            )
+        self.library_report = LibraryReport(
+            lookups=len(clusters) if use_library else 0,
+            reused=sum(1 for match in matches if match and match.reuse),
+            drafted=sum(1 for match in matches if match and not match.reuse),
+        )
+
+        print(
+            f"Answering {len(items)} questions with "
+            f"{len(clusters) - self.library_report.reused} calls: "
+            f"{self.dedup_report.calls_saved} saved by deduplication, "
+            f"{self.library_report.reused} answers reused and "
+            f"{self.library_report.drafted} drafted from the library"
+        )
+
+        # retrieve the documents of every question to answer in one batch,
+        # with the embeddings computed above
+        to_answer = [
+            i for i, match in enumerate(matches) if not (match and match.reuse)
+        ]
+        retrieval = asyncio.create_task(
+            self.weaviate_service.query_collection_batch(
+                folder_id,
+                [questions[clusters[i][0]] for i in to_answer],
+                vectors=(
+                    [embeddings[clusters[i][0]] for i in to_answer]
+                    if embeddings is not None
+                    else None
+                ),
+            )
+        )
+        retrieved = {i: position for position, i in enumerate(to_answer)}
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def answer(
+            cluster_index: int, match: LibraryMatch | None
+        ) -> list[AnsweredQuestion]:
+            cluster = clusters[cluster_index]
+            item = items[cluster[0]]
+            if match and match.reuse:
+                item.answer = match.answer
+                item.sources = ["Answer library"]
+                item.library = "reused"
+            else:
+                async with semaphore:
+                    start_time = time.time()
+                    try:
+                        # shielded, the batch is shared with the other workers
+                        documents = (
+                            await asyncio.wait_for(
+                                asyncio.shield(retrieval), timeout=self.timeout
+                            )
+                        )[retrieved[cluster_index]]
+                        with usage_scope(user_id=user_id):
+                            item.answer, item.sources = await asyncio.wait_for(
+                                self.answer_question(
+                                    folder_id, item.question, match, documents
+                                ),
+                                timeout=self.timeout,
+                            )
+                        item.library = "drafted" if match else None
+                    except asyncio.TimeoutError:
+                        item.error = f"Timed out after {self.timeout} seconds"
+                    except Exception as e:
+                        item.error = str(e)
+                        logging.error(f"Error answering '{item.question}': {str(e)}")
+                    item.elapsed = time.time() - start_time
+
+            for index in cluster[1:]:
+                items[index].answer = item.answer
+                items[index].sources = item.sources
+                items[index].error = item.error
+                items[index].elapsed = item.elapsed
+                items[index].library = item.library
+                items[index].duplicate_of = (item.section_index, item.question_index)
+            return [items[index] for index in cluster]
+
+        tasks = [
+            asyncio.create_task(answer(cluster_index, match))
+            for cluster_index, match in enumerate(matches)
+        ]
+        try:
+            for task in asyncio.as_completed(tasks):
+                for item in await task:
+                    yield item
+        finally:
+            # the consumer stopped early, don't leave workers running
+            for task in [retrieval, *tasks]:
+                task.cancel()
@@ -0,0 +1,180 @@
+import re
+import zlib
+from functools import lru_cache
+
+import numpy as np
+import tiktoken
+
+from app.core.config import config
+from app.rfp.services.local_index import tokenize
+
+_sentence_pattern = re.compile(r"(?<=[.!?])\s+|\n+")
+
+# words too common to tell which sentences of a passage answer the question
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from has have how in is it its "
+    "of on or our please provide that the this to we what when where which who "
+    "why will with you your".split()
+)
+
+# dimension of the hashed term vectors used to compare passages
+HASH_DIM = 2048
+
+
+@lru_cache(maxsize=1)
+def get_encoder() -> tiktoken.Encoding:
+    return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text: str) -> int:
+    return len(get_encoder().encode(text))
+
+
+def term_vectors(texts: list[str], dim: int = HASH_DIM) -> np.ndarray:
+    """
+    L2-normalized hashed term-frequency vectors, one row per text. Cheap
+    enough to build per query, and overlapping chunks share most of their
+    terms so they come out nearly parallel. Terms are hashed with CRC-32
+    rather than `hash`, which is salted per process, so every worker picks
+    the same passages.
+    """
+    matrix = np.zeros((len(texts), dim), dtype=np.float32)
+    for i, text in enumerate(texts):
+        for token in tokenize(text):
+            matrix[i, zlib.crc32(token.encode()) % dim] += 1
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+def mmr_order(
+    relevance: np.ndarray, vectors: np.ndarray, mmr_lambda: float
+) -> list[int]:
+    """
+    Orders passages by maximal marginal relevance: each step picks the
+    passage maximizing `mmr_lambda * relevance - (1 - mmr_lambda) * redundancy`,
+    where redundancy is its highest cosine similarity to an already picked
+    passage. The pairwise similarities are computed once and the redundancy
+    of every candidate is updated with a single vector maximum per step.
+    """
+    n = len(relevance)
+    if not n:
+        return []
+
+    similarities = vectors @ vectors.T
+    redundancy = np.zeros(n, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+    order = []
+    for _ in range(n):
+        scores = mmr_lambda * relevance - (1 - mmr_lambda) * redundancy
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        order.append(best)
+        available[best] = False
+        redundancy = np.maximum(redundancy, similarities[best])
+    return order
+
+
+def trim_passage(text: str, query_terms: set[str], max_tokens: int) -> str:
+    """
+    Trims a passage to the span of sentences between the first and the last
+    one mentioning a query term, then to `max_tokens`. Passages without any
+    query term are only cut to `max_tokens`.
+    """
+    sentences = [s for s in _sentence_pattern.split(text) if s.strip()]
+    hits = [
+        i
+        for i, sentence in enumerate(sentences)
+        if query_terms.intersection(tokenize(sentence))
+    ]
+    if hits:
+        text = " ".join(sentences[hits[0] : hits[-1] + 1])
+
+    tokens = get_encoder().encode(text)
+    if len(tokens) > max_tokens:
+        text = get_encoder().decode(tokens[:max_tokens])
+    return text.strip()
+
+
+class ContextPacker:
+    """
+    Builds the context of an answer prompt from reranked passages.
+
+    Passages are picked in maximal marginal relevance order, so a chunk that
+    mostly repeats an already picked one (e.g. through `CHUNK_OVERLAP`) falls
+    behind more diverse passages, and are trimmed to their relevant span.
+    Picking stops once `token_budget` is reached.
+
+    Relevance is the rerank score when present, otherwise the retrieval order.
+    """
+
+    def __init__(
+        self,
+        token_budget: int = config.CONTEXT_TOKEN_BUDGET,
+        passage_tokens: int = config.CONTEXT_PASSAGE_TOKENS,
+        mmr_lambda: float = config.CONTEXT_MMR_LAMBDA,
+        max_passages: int = config.TOP_K,
+    ):
+        self.token_budget = token_budget
+        self.passage_tokens = passage_tokens
+        self.mmr_lambda = mmr_lambda
+        self.max_passages = max_passages
+
+    def relevance(self, documents: list[dict]) -> np.ndarray:
+        if all("rank_score" in doc for doc in documents):
+            scores = np.array([doc["rank_score"] for doc in documents], np.float32)
+        else:
+            scores = np.arange(len(documents), 0, -1, dtype=np.float32)
+        high = scores.max()
+        return scores / high if high > 0 else scores
+
+    def select(self, question: str, documents: list[dict]) -> list[dict]:
+        """
+        Returns the picked passages, in the order they were picked, with
+        their text trimmed.
+        """
+        documents = [doc for doc in documents if doc.get("text")]
+        if not documents:
+            return []
+
+        query_terms = set(tokenize(question)) - STOPWORDS
+        order = mmr_order(
+            self.relevance(documents),
+            term_vectors([doc["text"] for doc in documents]),
+            self.mmr_lambda,
+        )
+
+        selected = []
+        seen = set()
+        budget = self.token_budget
+        for index in order:
+            if len(selected) == self.max_passages or budget <= 0:
+                break
+            text = trim_passage(
+                documents[index]["text"],
+                query_terms,
+                min(self.passage_tokens, budget),
+            )
+            tokens = count_tokens(text)
+            # overlapping chunks can trim down to the same span
+            if not tokens or text in seen:
+                continue
+            seen.add(text)
+            selected.append({**documents[index], "text": text})
+            budget -= tokens
+        return selected
+
+    def format(self, documents: list[dict]) -> str:
+        """
+        Joins passages into the prompt context, labelled with their source file.
+        """
+        return "\n\n".join(
+            f"[{i + 1}] ({doc.get('filename') or 'unknown'})\n{doc['text']}"
+            for i, doc in enumerate(documents)
+        )
+
+    def pack(self, question: str, documents: list[dict]) -> tuple[str, list[dict]]:
+        """
+        Returns the prompt context for `question` and the passages it uses.
+        """
+        selected = self.select(question, documents)
+        return self.format(selected), selected
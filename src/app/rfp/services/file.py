@@ -1,3 +1,4 @@
+import asyncio
 import io
 import os
 import tempfile
@@ -158,6 +159,26 @@ class FileProcessing:
                 text_content += page.extract_text()
         return text_content
 
+    def bytes_to_pages(self, file_bytes: bytes) -> List[tuple[int, str]]:
+        """
+        Extracts the text of a PDF page by page, keeping the page numbers.
+        """
+        with pdfplumber.open(io.BytesIO(file_bytes)) as pdf:
+            return [(page.page_number, page.extract_text() or "") for page in pdf.pages]
+
+    async def extract_pages(
+        self, file_bytes: bytes, extension: str
+    ) -> List[tuple[int, str]]:
+        """
+        Extracts the text of a file as (page number, text) pairs.
+        Only PDFs have real pages, every other file type is a single page.
+        """
+        if extension.lower() == "pdf":
+            return await asyncio.to_thread(self.bytes_to_pages, file_bytes)
+
+        text = await self.extract_text_from_file(file_bytes, extension)
+        return [(1, text)] if text else []
+
     def split_text_recursively(self, text: str):
         text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=800, chunk_overlap=200
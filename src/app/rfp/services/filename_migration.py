@@ -0,0 +1,283 @@
+import argparse
+import logging
+from typing import Optional
+
+from weaviate.classes.config import Tokenization
+from weaviate.classes.tenants import Tenant, TenantActivityStatus
+from weaviate.collections import Collection
+from weaviate.collections.classes.config import CollectionConfig
+from weaviate.collections.classes.grpc import QueryReference
+
+from app.core.config import config
+from app.rfp.services.weaviate import WeaviateService
+
+# holds a collection's objects while the collection is recreated
+TEMPORARY_SUFFIX = "_FilenameMigration"
+
+
+def needs_migration(collection_config: CollectionConfig) -> bool:
+    return any(
+        prop.name == "filename" and prop.tokenization != Tokenization.FIELD
+        for prop in collection_config.properties
+    )
+
+
+def pending_collections(service: WeaviateService) -> list[str]:
+    """
+    Lists the collections whose `filename` is not field tokenized, plus the
+    ones a previous run left half migrated. Collections referenced by others
+    (the metadata collections) come first, so that they exist again by the
+    time the collections referencing them are recreated.
+    """
+    configs = service.client.collections.list_all(simple=False)
+    names = set()
+    for name, collection_config in configs.items():
+        if name.endswith(TEMPORARY_SUFFIX):
+            names.add(name[: -len(TEMPORARY_SUFFIX)])
+        elif needs_migration(collection_config):
+            names.add(name)
+
+    targets = {
+        target
+        for collection_config in configs.values()
+        for reference in collection_config.references
+        for target in reference.target_collections
+    }
+    return sorted(names, key=lambda name: (name not in targets, name))
+
+
+def uncopyable_settings(collection_config: CollectionConfig) -> list[str]:
+    """
+    Lists what `copy_objects` cannot copy faithfully in a collection: a
+    reference to several collections is copied as bare uuids, which do not
+    say which collection each one is in.
+    """
+    return [
+        f"reference {reference.name} targets {len(reference.target_collections)} "
+        "collections"
+        for reference in collection_config.references
+        if len(reference.target_collections) != 1
+    ]
+
+
+def collection_schema(collection_config: CollectionConfig, name: str) -> dict:
+    """
+    The schema of a collection created like the one of `collection_config`,
+    named `name` and with a field tokenized `filename`: its vectorizers,
+    named vectors, vector and inverted index, replication, sharding and
+    multi-tenancy settings are all kept.
+    """
+    schema = collection_config.to_dict()
+    schema["class"] = name
+    for prop in schema["properties"]:
+        if prop["name"] == "filename":
+            prop["tokenization"] = Tokenization.FIELD.value
+
+    # to_dict names the distance metric after the client's field, the
+    # server only reads "distance"
+    vector_indexes = [schema.get("vectorIndexConfig")] + [
+        vector.get("vectorIndexConfig")
+        for vector in (schema.get("vectorConfig") or {}).values()
+    ]
+    for vector_index in vector_indexes:
+        if vector_index and "distanceMetric" in vector_index:
+            vector_index["distance"] = vector_index.pop("distanceMetric")
+    return schema
+
+
+def create_like(
+    service: WeaviateService, name: str, collection_config: CollectionConfig
+) -> Collection:
+    """
+    Creates a collection with the full configuration of `collection_config`,
+    `filename` being field tokenized. Refuses collections with settings
+    `copy_objects` cannot copy, and deletes the new collection again if
+    Weaviate did not create it exactly as asked.
+    """
+    uncopyable = uncopyable_settings(collection_config)
+    if uncopyable:
+        raise Exception(
+            f"Cannot copy {collection_config.name}: {', '.join(uncopyable)}"
+        )
+
+    schema = collection_schema(collection_config, name)
+    collection = service.client.collections.create_from_dict(schema)
+
+    created = collection_schema(collection.config.get(), name)
+    different = sorted(
+        key
+        for key in schema.keys() | created.keys()
+        if schema.get(key) != created.get(key)
+    )
+    if different:
+        service.client.collections.delete(name)
+        raise Exception(
+            f"{name} was not created like {collection_config.name}, "
+            f"different settings: {', '.join(different)}"
+        )
+    return collection
+
+
+def copy_objects(source: Collection, target: Collection) -> int:
+    """
+    Copies every object of `source` into `target`, with its vectors (every
+    named vector, if it has any) and references, keeping its uuid so that
+    references to it stay valid.
+    Tenants are copied one by one, activated if needed and left in
+    WEAVIATE_TENANT_IDLE_STATUS in `target`, to be reactivated on their next
+    use. Returns the number of objects copied.
+    """
+    source_config = source.config.get()
+    references = [reference.name for reference in source_config.references]
+    named_vectors = source_config.vector_config is not None
+
+    tenants: list[Optional[str]] = [None]
+    if source_config.multi_tenancy_config.enabled:
+        tenants = sorted(source.tenants.get())
+        existing = target.tenants.get()
+        missing = [Tenant(name=tenant) for tenant in tenants if tenant not in existing]
+        if missing:
+            target.tenants.create(missing)
+
+    copied = 0
+    for tenant in tenants:
+        tenant_source, tenant_target = source, target
+        if tenant is not None:
+            for collection in (source, target):
+                collection.tenants.update(
+                    Tenant(name=tenant, activity_status=TenantActivityStatus.ACTIVE)
+                )
+            tenant_source = source.with_tenant(tenant)
+            tenant_target = target.with_tenant(tenant)
+
+        with tenant_target.batch.dynamic() as batch:
+            for obj in tenant_source.iterator(
+                include_vector=True,
+                return_references=(
+                    [QueryReference(link_on=name) for name in references] or None
+                ),
+            ):
+                batch.add_object(
+                    properties=obj.properties,
+                    uuid=obj.uuid,
+                    vector=obj.vector if named_vectors else obj.vector.get("default"),
+                    references={
+                        name: [ref.uuid for ref in obj.references[name].objects]
+                        for name in references
+                        if obj.references and name in obj.references
+                    }
+                    or None,
+                )
+                copied += 1
+
+        failed = tenant_target.batch.failed_objects
+        if failed:
+            raise Exception(
+                f"{len(failed)} objects of {source.name} failed to copy, "
+                f"first error: {failed[0].message}"
+            )
+        source_count = tenant_source.aggregate.over_all(total_count=True).total_count
+        target_count = tenant_target.aggregate.over_all(total_count=True).total_count
+        if source_count != target_count:
+            raise Exception(
+                f"Object count mismatch copying {source.name} to {target.name} "
+                f"(tenant {tenant}): {source_count} in source, {target_count} "
+                "in target"
+            )
+
+        if tenant is not None:
+            target.tenants.update(
+                Tenant(
+                    name=tenant,
+                    activity_status=TenantActivityStatus(
+                        config.WEAVIATE_TENANT_IDLE_STATUS
+                    ),
+                )
+            )
+
+    return copied
+
+
+def migrate_collection(service: WeaviateService, name: str) -> int:
+    """
+    Recreates a collection with a field tokenized `filename`, which Weaviate
+    cannot change in place: its objects are copied to a temporary collection,
+    the collection is recreated and they are copied back. Each copy is
+    checked before its source is deleted, and a run that failed half way is
+    resumed from the temporary collection.
+    Returns the number of objects migrated.
+    """
+    collections = service.client.collections
+    temporary_name = f"{name}{TEMPORARY_SUFFIX}"
+
+    if collections.exists(name):
+        collection = collections.get(name)
+        collection_config = collection.config.get()
+        if needs_migration(collection_config):
+            if collections.exists(temporary_name):
+                # left by a copy that failed before the collection was deleted
+                collections.delete(temporary_name)
+            temporary = create_like(service, temporary_name, collection_config)
+            copy_objects(collection, temporary)
+            collections.delete(name)
+            logging.info(f"Copied {name} to {temporary_name}")
+
+    if not collections.exists(temporary_name):
+        return 0
+
+    temporary = collections.get(temporary_name)
+    if collections.exists(name):
+        collection = collections.get(name)
+    else:
+        collection = create_like(service, name, temporary.config.get())
+    copied = copy_objects(temporary, collection)
+    collections.delete(temporary_name)
+    logging.info(f"Recreated {name} with a field tokenized filename")
+    return copied
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Recreate the Weaviate collections whose filename property "
+        "is word tokenized, so that deleting a file's chunks only matches that "
+        "file. Run it while the app is stopped."
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Only list the collections to migrate",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    service = WeaviateService()
+    try:
+        collections = pending_collections(service)
+        print(f"{len(collections)} collections to migrate")
+
+        refused = []
+        for name in collections:
+            if not service.client.collections.exists(name):
+                name = f"{name}{TEMPORARY_SUFFIX}"
+            uncopyable = uncopyable_settings(
+                service.client.collections.get(name).config.get()
+            )
+            if uncopyable:
+                refused.append(f"  {name}: {', '.join(uncopyable)}")
+        if refused:
+            print("Cannot migrate these collections, nothing was changed:")
+            print("\n".join(refused))
+            raise SystemExit(1)
+
+        for name in collections:
+            if args.dry_run:
+                print(f"  {name}")
+                continue
+            copied = migrate_collection(service, name)
+            print(f"  {name}: {copied} objects")
+    finally:
+        service.client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,441 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Callable, Iterable, Optional
+from uuid import UUID
+
+from pydantic import BaseModel, Field
+from weaviate.util import generate_uuid5
+
+from app.core.config import config
+from app.core.registry import registry
+from app.rfp.services.file import FileProcessing
+from app.rfp.services.weaviate import WeaviateService
+
+# marks the end of a stream on the pipeline queues
+_DONE = None
+
+
+class IngestionSource(BaseModel):
+    """
+    A file to ingest, either on disk (`path`) or already in memory (`content`).
+
+    A source is identified by its name and the SHA-256 of its content
+    (`content_hash`, computed by `digest` unless the caller already knows it),
+    so that two different files uploaded under the same name are ingested
+    and checkpointed separately.
+    """
+
+    file_name: str
+    path: str | None = Field(default=None)
+    content: bytes | None = Field(default=None)
+    content_hash: str | None = Field(default=None)
+
+    @property
+    def extension(self) -> str:
+        return self.file_name.rsplit(".", 1)[-1]
+
+    @property
+    def key(self) -> str:
+        if self.content_hash is None:
+            raise ValueError(f"{self.file_name} has not been hashed yet")
+        return f"{self.file_name}:{self.content_hash}"
+
+    def digest(self) -> str:
+        if self.content_hash is None:
+            sha256 = hashlib.sha256()
+            if self.content is not None:
+                sha256.update(self.content)
+            elif self.path is not None:
+                with open(self.path, "rb") as f:
+                    while data := f.read(1024 * 1024):
+                        sha256.update(data)
+            else:
+                raise ValueError(f"No content or path for {self.file_name}")
+            self.content_hash = sha256.hexdigest()
+        return self.content_hash
+
+    def read(self) -> bytes:
+        if self.content is not None:
+            return self.content
+        if self.path is None:
+            raise ValueError(f"No content or path for {self.file_name}")
+        with open(self.path, "rb") as f:
+            return f.read()
+
+
+class IngestionProgress(BaseModel):
+    files_total: int = 0
+    files_done: int = 0
+    files_skipped: int = 0
+    files_failed: int = 0
+    chunks_parsed: int = 0
+    chunks_embedded: int = 0
+    chunks_imported: int = 0
+    chunks_failed: int = 0
+    elapsed: float = 0.0
+
+
+class _Chunk(BaseModel):
+    file_name: str
+    # `IngestionSource.key` of the file
+    source_key: str
+    uuid: str
+    text: str
+    page_number: int
+    source: str
+    metadata_uuid: str
+
+
+class _ParsedFile(BaseModel):
+    file_name: str
+    source_key: str
+    chunks: list[_Chunk]
+    metadata: list[dict]
+
+
+class _Batch(BaseModel):
+    chunks: list[_Chunk]
+    vectors: list[list[float]]
+    metadata: list[dict]
+
+
+class IngestionCheckpoint:
+    """
+    Remembers which files of a folder have been fully imported, by
+    `IngestionSource.key`, so that a failed or interrupted run can be resumed
+    without importing them again.
+    """
+
+    def __init__(self, path: str | Path, folder_id: UUID):
+        self.path = Path(path)
+        self.folder_id = str(folder_id)
+        self._state: dict[str, list[str]] = {}
+        if self.path.exists():
+            with open(self.path) as f:
+                self._state = json.load(f)
+        self.completed = set(self._state.get(self.folder_id, []))
+
+    def is_done(self, key: str) -> bool:
+        return key in self.completed
+
+    def mark_done(self, key: str) -> None:
+        self.completed.add(key)
+        self._state[self.folder_id] = sorted(self.completed)
+
+        # write atomically so a crash never leaves a truncated checkpoint
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self._state, f)
+        os.replace(tmp_path, self.path)
+
+
+class IngestionPipeline:
+    """
+    Streams files into a folder's Weaviate collection:
+
+        parse -> chunk -> batched embedding -> dynamic batch import
+
+    The stages run concurrently and are connected by bounded queues, so a slow
+    stage applies backpressure to the ones before it instead of letting parsed
+    files pile up in memory.
+    """
+
+    def __init__(
+        self,
+        weaviate_service: WeaviateService,
+        file_service: FileProcessing | None = None,
+        checkpoint_path: str | Path | None = None,
+        parse_workers: int = 4,
+        queue_size: int = 8,
+        embed_batch_size: int = config.EMBEDDING_BATCH_SIZE,
+        max_retries: int = 3,
+        on_progress: Optional[Callable[[IngestionProgress], None]] = None,
+    ):
+        self.weaviate_service = weaviate_service
+        self.file_service = file_service or registry.get("file_processing")
+        self.checkpoint_path = checkpoint_path
+        self.parse_workers = parse_workers
+        self.queue_size = queue_size
+        self.embed_batch_size = embed_batch_size
+        self.max_retries = max_retries
+        self.on_progress = on_progress
+
+    async def run(
+        self, folder_id: UUID, sources: Iterable[IngestionSource]
+    ) -> IngestionProgress:
+        """
+        Ingests all the sources into the folder and returns the final progress.
+        Files recorded in the checkpoint by a previous run are skipped, and so
+        are the repeats of a file (same name and content) in `sources`.
+        """
+        start_time = time.time()
+        progress = IngestionProgress()
+        checkpoint = (
+            IngestionCheckpoint(self.checkpoint_path, folder_id)
+            if self.checkpoint_path
+            else None
+        )
+
+        await asyncio.to_thread(self.weaviate_service.ensure_collection, folder_id)
+
+        parse_queue: asyncio.Queue[IngestionSource | None] = asyncio.Queue(
+            self.queue_size
+        )
+        embed_queue: asyncio.Queue[_ParsedFile | None] = asyncio.Queue(self.queue_size)
+        import_queue: asyncio.Queue[_Batch | None] = asyncio.Queue(self.queue_size)
+
+        # number of chunks of each file that are not imported yet, by
+        # source key like the other per-file state
+        pending: dict[str, int] = {}
+        failed_files: set[str] = set()
+        queued: set[str] = set()
+
+        def report() -> None:
+            progress.elapsed = time.time() - start_time
+            if self.on_progress:
+                self.on_progress(progress)
+
+        def file_finished(key: str) -> None:
+            pending.pop(key, None)
+            if key in failed_files:
+                progress.files_failed += 1
+                return
+            progress.files_done += 1
+            if checkpoint:
+                checkpoint.mark_done(key)
+
+        async def feed() -> None:
+            for source in sources:
+                progress.files_total += 1
+                try:
+                    await asyncio.to_thread(source.digest)
+                except Exception as e:
+                    logging.error(f"Error reading {source.file_name}: {str(e)}")
+                    progress.files_failed += 1
+                    report()
+                    continue
+
+                if source.key in queued or (
+                    checkpoint and checkpoint.is_done(source.key)
+                ):
+                    progress.files_skipped += 1
+                    report()
+                    continue
+                queued.add(source.key)
+                await parse_queue.put(source)
+            for _ in range(self.parse_workers):
+                await parse_queue.put(_DONE)
+
+        async def parse() -> None:
+            while (source := await parse_queue.get()) is not _DONE:
+                try:
+                    parsed = await self._parse(source)
+                except Exception as e:
+                    logging.error(f"Error parsing {source.file_name}: {str(e)}")
+                    progress.files_failed += 1
+                    report()
+                    continue
+
+                progress.chunks_parsed += len(parsed.chunks)
+                await embed_queue.put(parsed)
+            await embed_queue.put(_DONE)
+
+        async def embed() -> None:
+            finished_workers = 0
+            chunks: list[_Chunk] = []
+            metadata: list[dict] = []
+
+            async def flush() -> None:
+                if not chunks:
+                    return
+                try:
+                    vectors = await self._with_retries(
+                        self.weaviate_service.generate_embeddings,
+                        [chunk.text for chunk in chunks],
+                    )
+                except Exception as e:
+                    logging.error(f"Error embedding {len(chunks)} chunks: {str(e)}")
+                    self._fail(chunks, pending, failed_files, progress, file_finished)
+                    report()
+                else:
+                    progress.chunks_embedded += len(chunks)
+                    await import_queue.put(
+                        _Batch(
+                            chunks=list(chunks),
+                            vectors=vectors,
+                            metadata=list(metadata),
+                        )
+                    )
+                chunks.clear()
+                metadata.clear()
+
+            while finished_workers < self.parse_workers:
+                parsed = await embed_queue.get()
+                if parsed is _DONE:
+                    finished_workers += 1
+                    continue
+
+                if not parsed.chunks:
+                    file_finished(parsed.source_key)
+                    report()
+                    continue
+
+                pending[parsed.source_key] = len(parsed.chunks)
+                metadata.extend(parsed.metadata)
+                for chunk in parsed.chunks:
+                    chunks.append(chunk)
+                    if len(chunks) >= self.embed_batch_size:
+                        await flush()
+            await flush()
+            await import_queue.put(_DONE)
+
+        async def import_batches() -> None:
+            while (batch := await import_queue.get()) is not _DONE:
+                try:
+                    failed = await self._with_retries(
+                        asyncio.to_thread,
+                        self.weaviate_service.import_objects,
+                        folder_id,
+                        [
+                            {
+                                "uuid": chunk.uuid,
+                                "properties": {
+                                    "text": chunk.text,
+                                    "filename": chunk.file_name,
+                                    "page_number": chunk.page_number,
+                                    "source": chunk.source,
+                                },
+                                "metadata_uuid": chunk.metadata_uuid,
+                            }
+                            for chunk in batch.chunks
+                        ],
+                        batch.vectors,
+                        batch.metadata,
+                    )
+                except Exception as e:
+                    logging.error(f"Error importing {len(batch.chunks)} chunks: {e}")
+                    self._fail(
+                        batch.chunks, pending, failed_files, progress, file_finished
+                    )
+                    report()
+                    continue
+
+                if failed:
+                    # object ids are deterministic, so re-running the affected
+                    # files later simply overwrites what did get imported
+                    progress.chunks_failed += failed
+                    failed_files.update(chunk.source_key for chunk in batch.chunks)
+
+                progress.chunks_imported += len(batch.chunks) - failed
+                for chunk in batch.chunks:
+                    pending[chunk.source_key] -= 1
+                    if pending[chunk.source_key] == 0:
+                        file_finished(chunk.source_key)
+                report()
+
+        async with asyncio.TaskGroup() as group:
+            group.create_task(feed())
+            for _ in range(self.parse_workers):
+                group.create_task(parse())
+            group.create_task(embed())
+            group.create_task(import_batches())
+
+        await asyncio.to_thread(self.weaviate_service.sync_local_index, folder_id)
+
+        report()
+        logging.info(
+            f"Ingested {progress.files_done}/{progress.files_total} files "
+            f"({progress.chunks_imported} chunks) in {progress.elapsed:.2f} seconds"
+        )
+        return progress
+
+    async def _parse(self, source: IngestionSource) -> _ParsedFile:
+        """
+        Reads, parses and chunks a single file.
+        """
+        content = await asyncio.to_thread(source.read)
+        pages = await self.file_service.extract_pages(content, source.extension)
+
+        chunks: list[_Chunk] = []
+        metadata: list[dict] = []
+        for page_number, text in pages:
+            if not text:
+                continue
+
+            metadata_uuid = generate_uuid5(f"{source.key}:{page_number}")
+            metadata.append(
+                {
+                    "uuid": metadata_uuid,
+                    "properties": {
+                        "filename": source.file_name,
+                        "page_number": page_number,
+                        "unique_id": metadata_uuid,
+                        "filetype": source.extension.lower(),
+                        "file_directory": (
+                            str(Path(source.path).parent) if source.path else None
+                        ),
+                        "source": source.path or source.file_name,
+                    },
+                }
+            )
+
+            page_chunks = await asyncio.to_thread(
+                self.file_service.split_text_into_chunks, text
+            )
+            for index, chunk in enumerate(page_chunks):
+                chunks.append(
+                    _Chunk(
+                        file_name=source.file_name,
+                        source_key=source.key,
+                        uuid=generate_uuid5(f"{source.key}:{page_number}:{index}"),
+                        text=chunk,
+                        page_number=page_number,
+                        source=source.path or source.file_name,
+                        metadata_uuid=metadata_uuid,
+                    )
+                )
+
+        return _ParsedFile(
+            file_name=source.file_name,
+            source_key=source.key,
+            chunks=chunks,
+            metadata=metadata,
+        )
+
+    async def _with_retries(self, func, *args):
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                return await func(*args)
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = 2**attempt
+                logging.warning(
+                    f"Ingestion step failed (attempt {attempt}), "
+                    f"retrying in {delay} seconds: {str(e)}"
+                )
+                await asyncio.sleep(delay)
+
+    def _fail(
+        self,
+        chunks: list[_Chunk],
+        pending: dict[str, int],
+        failed_files: set[str],
+        progress: IngestionProgress,
+        file_finished: Callable[[str], None],
+    ) -> None:
+        """
+        Marks the files of chunks that could not be embedded or imported as
+        failed, so they are not checkpointed and get retried on the next run.
+        """
+        progress.chunks_failed += len(chunks)
+        for chunk in chunks:
+            failed_files.add(chunk.source_key)
+            pending[chunk.source_key] -= 1
+            if pending[chunk.source_key] == 0:
+                file_finished(chunk.source_key)
@@ -0,0 +1,283 @@
+import json
+import logging
+import math
+import re
+import shutil
+import threading
+import uuid
+from collections import Counter
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+_token_pattern = re.compile(r"\w+")
+
+# BM25 parameters, the same defaults Weaviate uses
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def tokenize(text: str) -> list[str]:
+    return _token_pattern.findall(text.lower())
+
+
+def _normalize_scores(scores: np.ndarray) -> np.ndarray:
+    """
+    Min-max normalizes scores to [0, 1], like Weaviate's relative score fusion.
+    """
+    low, high = scores.min(), scores.max()
+    if high == low:
+        return np.ones_like(scores) if high > 0 else np.zeros_like(scores)
+    return (scores - low) / (high - low)
+
+
+def _matches(document: dict, filters: dict) -> bool:
+    for name, value in filters.items():
+        values = value if isinstance(value, (list, tuple, set)) else [value]
+        if document.get(name) not in values:
+            return False
+    return True
+
+
+class LocalIndex:
+    """
+    In-process hybrid index over the chunks of one folder.
+
+    Vectors are stored L2-normalized so cosine similarity is a single
+    matrix-vector product, and BM25 postings are stored per term so a query
+    only touches the documents containing its terms. All arrays are saved as
+    .npy files and memory-mapped on load.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        with open(path / "documents.json") as f:
+            self.documents: list[dict] = json.load(f)
+        with open(path / "vocabulary.json") as f:
+            self.vocabulary: dict[str, int] = json.load(f)
+
+        self.vectors = np.load(path / "vectors.npy", mmap_mode="r")
+        self.doc_lengths = np.load(path / "doc_lengths.npy", mmap_mode="r")
+        self.term_indptr = np.load(path / "term_indptr.npy", mmap_mode="r")
+        self.term_docs = np.load(path / "term_docs.npy", mmap_mode="r")
+        self.term_freqs = np.load(path / "term_freqs.npy", mmap_mode="r")
+        self.avg_doc_length = float(self.doc_lengths.mean()) if len(self) else 0.0
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    @classmethod
+    def build(
+        cls, path: Path, documents: list[dict], vectors: list[list[float]]
+    ) -> "LocalIndex":
+        """
+        Builds and persists an index. Each document is a dict with at least
+        "text" and "filename"; any other keys are returned as properties.
+        The index is written next to `path` and moved in place at the end, so
+        readers never see a half-written index.
+        """
+        tmp_path = path.with_name(f"{path.name}.tmp-{uuid.uuid4().hex}")
+        tmp_path.mkdir(parents=True)
+
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if not len(documents):
+            matrix = matrix.reshape(0, 0)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix = matrix / np.where(norms == 0, 1, norms)
+
+        vocabulary: dict[str, int] = {}
+        postings: list[list[tuple[int, int]]] = []
+        doc_lengths = np.zeros(len(documents), dtype=np.float32)
+        for doc_id, document in enumerate(documents):
+            tokens = tokenize(document.get("text") or "")
+            doc_lengths[doc_id] = len(tokens)
+            for term, freq in Counter(tokens).items():
+                if term not in vocabulary:
+                    vocabulary[term] = len(postings)
+                    postings.append([])
+                postings[vocabulary[term]].append((doc_id, freq))
+
+        term_indptr = np.zeros(len(postings) + 1, dtype=np.int64)
+        term_indptr[1:] = np.cumsum([len(p) for p in postings])
+        term_docs = np.fromiter(
+            (doc_id for p in postings for doc_id, _ in p),
+            dtype=np.int32,
+            count=int(term_indptr[-1]),
+        )
+        term_freqs = np.fromiter(
+            (freq for p in postings for _, freq in p),
+            dtype=np.float32,
+            count=int(term_indptr[-1]),
+        )
+
+        np.save(tmp_path / "vectors.npy", matrix)
+        np.save(tmp_path / "doc_lengths.npy", doc_lengths)
+        np.save(tmp_path / "term_indptr.npy", term_indptr)
+        np.save(tmp_path / "term_docs.npy", term_docs)
+        np.save(tmp_path / "term_freqs.npy", term_freqs)
+        with open(tmp_path / "documents.json", "w") as f:
+            json.dump(documents, f)
+        with open(tmp_path / "vocabulary.json", "w") as f:
+            json.dump(vocabulary, f)
+
+        if path.exists():
+            old_path = path.with_name(f"{path.name}.old-{uuid.uuid4().hex}")
+            path.rename(old_path)
+            tmp_path.rename(path)
+            shutil.rmtree(old_path, ignore_errors=True)
+        else:
+            tmp_path.rename(path)
+
+        return cls(path)
+
+    def bm25(self, query: str) -> np.ndarray:
+        scores = np.zeros(len(self), dtype=np.float32)
+        for term in set(tokenize(query)):
+            term_id = self.vocabulary.get(term)
+            if term_id is None:
+                continue
+
+            start, end = self.term_indptr[term_id], self.term_indptr[term_id + 1]
+            docs = self.term_docs[start:end]
+            freqs = self.term_freqs[start:end]
+
+            idf = math.log(1 + (len(self) - len(docs) + 0.5) / (len(docs) + 0.5))
+            lengths = self.doc_lengths[docs] / max(self.avg_doc_length, 1.0)
+            scores[docs] += (
+                idf
+                * freqs
+                * (BM25_K1 + 1)
+                / (freqs + BM25_K1 * (1 - BM25_B + BM25_B * lengths))
+            )
+        return scores
+
+    def search(
+        self,
+        query: str,
+        vector: Optional[list[float]],
+        k: int,
+        alpha: float = 0.5,
+        properties: Optional[list[str]] = None,
+        filters: Optional[dict] = None,
+    ) -> list[dict]:
+        """
+        Hybrid search blending normalized cosine and BM25 scores with `alpha`
+        (1 is pure vector search, 0 pure keyword search). Without a query
+        vector only BM25 is used. With `filters`, only the documents whose
+        properties equal the given values (or one of a list of values) are
+        returned. Returns documents shaped like
+        `WeaviateService.query_collection` hits.
+        """
+        if not len(self):
+            return []
+
+        candidates = np.arange(len(self))
+        if filters:
+            candidates = np.array(
+                [
+                    doc_id
+                    for doc_id, document in enumerate(self.documents)
+                    if _matches(document, filters)
+                ],
+                dtype=np.int64,
+            )
+            if not len(candidates):
+                return []
+
+        bm25_scores = self.bm25(query)
+        keyword_scores = _normalize_scores(bm25_scores)
+        if vector is None:
+            scores = keyword_scores
+        else:
+            query_vector = np.asarray(vector, dtype=np.float32)
+            query_vector /= np.linalg.norm(query_vector) or 1
+            vector_scores = _normalize_scores(self.vectors @ query_vector)
+            scores = alpha * vector_scores + (1 - alpha) * keyword_scores
+
+        k = min(k, len(candidates))
+        top = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        top = top[np.argsort(-scores[top])]
+        if vector is None:
+            # pure keyword search only returns documents containing a term,
+            # the lowest of which has a normalized score of 0
+            top = top[bm25_scores[top] > 0]
+
+        results = []
+        for index in top:
+            document = self.documents[index]
+            score = float(scores[index])
+            results.append(
+                {
+                    "text": document.get("text"),
+                    "metadata": {"score": score},
+                    "certainty": score,
+                    "filename": document.get("filename"),
+                    **{name: document.get(name) for name in properties or []},
+                }
+            )
+        return results
+
+
+class LocalIndexStore:
+    """
+    Per-folder `LocalIndex`es under one directory, loaded lazily and kept open.
+
+    Indexes can be rebuilt or dropped by other processes sharing the
+    directory. Every build moves a new directory in place, so each lookup
+    checks the inode and mtime of the index on disk (one stat) and reloads
+    it when they changed.
+    """
+
+    def __init__(self, directory: str | Path):
+        self.directory = Path(directory)
+        self._indexes: dict[str, tuple[tuple[int, int], LocalIndex]] = {}
+        self._lock = threading.Lock()
+
+    def _path(self, folder_id) -> Path:
+        return self.directory / str(folder_id)
+
+    def _version(self, path: Path) -> tuple[int, int] | None:
+        try:
+            stat = (path / "documents.json").stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def get(self, folder_id) -> LocalIndex | None:
+        key = str(folder_id)
+        path = self._path(folder_id)
+        with self._lock:
+            version = self._version(path)
+            if version is None:
+                self._indexes.pop(key, None)
+                return None
+
+            cached = self._indexes.get(key)
+            if cached is None or cached[0] != version:
+                try:
+                    index = LocalIndex(path)
+                except FileNotFoundError:
+                    # dropped or replaced while loading
+                    self._indexes.pop(key, None)
+                    return None
+                self._indexes[key] = (version, index)
+            return self._indexes[key][1]
+
+    def build(
+        self, folder_id, documents: list[dict], vectors: list[list[float]]
+    ) -> LocalIndex:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self._path(folder_id)
+        index = LocalIndex.build(path, documents, vectors)
+        with self._lock:
+            version = self._version(path)
+            if version is not None:
+                self._indexes[str(folder_id)] = (version, index)
+        logging.info(f"Built local index for {folder_id} with {len(index)} chunks")
+        return index
+
+    def drop(self, folder_id) -> None:
+        with self._lock:
+            self._indexes.pop(str(folder_id), None)
+        shutil.rmtree(self._path(folder_id), ignore_errors=True)
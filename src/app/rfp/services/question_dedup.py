@@ -0,0 +1,58 @@
+import numpy as np
+from pydantic import BaseModel
+
+from app.rfp.services.weaviate import normalize_query
+
+
+class DedupReport(BaseModel):
+    questions: int
+    clusters: int
+    threshold: float
+
+    @property
+    def calls_saved(self) -> int:
+        return self.questions - self.clusters
+
+
+def cluster_questions(
+    embeddings: list[list[float]] | np.ndarray, threshold: float
+) -> list[list[int]]:
+    """
+    Groups questions whose embeddings have a cosine similarity of at least
+    `threshold` with the first question of the group.
+
+    Questions are visited in order and each unassigned one starts a new
+    cluster that takes every still unassigned question similar enough to it,
+    so the representative (first index) of a cluster is always its earliest
+    question. Returns the clusters as lists of question indexes.
+    """
+    matrix = np.asarray(embeddings, dtype=np.float32)
+    if not len(matrix):
+        return []
+
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix = matrix / np.where(norms == 0, 1, norms)
+    similarities = matrix @ matrix.T
+
+    assigned = np.zeros(len(matrix), dtype=bool)
+    clusters = []
+    for i in range(len(matrix)):
+        if assigned[i]:
+            continue
+        members = np.flatnonzero((similarities[i] >= threshold) & ~assigned)
+        # rounding can leave a question just below its own similarity of 1
+        members = np.union1d(members, [i])
+        assigned[members] = True
+        clusters.append(members.tolist())
+    return clusters
+
+
+def cluster_questions_exact(questions: list[str]) -> list[list[int]]:
+    """
+    Groups questions that are identical after normalization. Used when no
+    embeddings are available.
+    """
+    clusters: dict[str, list[int]] = {}
+    for i, question in enumerate(questions):
+        clusters.setdefault(normalize_query(question), []).append(i)
+    return list(clusters.values())
@@ -0,0 +1,200 @@
+import json
+import logging
+import uuid
+from typing import TYPE_CHECKING, Optional
+from uuid import UUID
+
+from sqlalchemy import bindparam, select, text
+from sqlalchemy.dialects.postgresql import JSONB
+
+from app.core.utils import utc_now
+from app.database import async_sessionmanager
+from app.database.models import RfpRun
+from app.database.pagination import Page, keyset, page
+
+if TYPE_CHECKING:
+    from app.rfp.agents.manager import Results
+    from app.rfp.services.answering import AnsweredQuestion
+
+
+class ResultsStore:
+    """
+    Persists pipeline results in the rfp_run, rfp_section and rfp_question
+    tables.
+
+    A run is written with a single statement: the sections and questions are
+    sent as two JSONB arrays, expanded server side with jsonb_to_recordset
+    and inserted by data-modifying CTEs. Ids are generated client side so no
+    statement has to wait for another's RETURNING, and saving a 500-question
+    RFP is one round trip.
+    """
+
+    _insert_run = text("""
+WITH run AS (
+    INSERT INTO rfp_run (
+        id, user_id, folder_id, file_name, file_hash, s3_key,
+        requirements, expectations, problem_statement, results, created_at
+    )
+    VALUES (
+        CAST(:id AS uuid), :user_id, :folder_id, :file_name, :file_hash, :s3_key,
+        :requirements, :expectations, :problem_statement, :results, :created_at
+    )
+),
+sections AS (
+    INSERT INTO rfp_section (id, run_id, position, title)
+    SELECT s.id, CAST(:id AS uuid), s.position, s.title
+    FROM jsonb_to_recordset(:sections) AS s(id uuid, position int, title text)
+)
+INSERT INTO rfp_question (id, run_id, section_id, position, question)
+SELECT q.id, CAST(:id AS uuid), q.section_id, q.position, q.question
+FROM jsonb_to_recordset(:questions)
+    AS q(id uuid, section_id uuid, position int, question text)
+""").bindparams(
+        bindparam("results", type_=JSONB),
+        bindparam("sections", type_=JSONB),
+        bindparam("questions", type_=JSONB),
+    )
+
+    _update_answers = text("""
+UPDATE rfp_question AS q
+SET answer = a.answer, sources = a.sources
+FROM rfp_section AS s,
+    jsonb_to_recordset(:answers)
+    AS a(section_position int, position int, answer text, sources jsonb)
+WHERE s.run_id = CAST(:run_id AS uuid)
+    AND s.position = a.section_position
+    AND q.section_id = s.id
+    AND q.position = a.position
+""").bindparams(bindparam("answers", type_=JSONB))
+
+    async def save_run(
+        self,
+        run_id: UUID,
+        file_name: str,
+        file_hash: str,
+        results: "Results",
+        user_id: Optional[UUID] = None,
+        folder_id: Optional[UUID] = None,
+        s3_key: Optional[str] = None,
+    ) -> None:
+        sections = []
+        questions = []
+        for i, section in enumerate(results.sections or []):
+            section_id = str(uuid.uuid4())
+            sections.append({"id": section_id, "position": i, "title": section.title})
+            questions.extend(
+                {
+                    "id": str(uuid.uuid4()),
+                    "section_id": section_id,
+                    "position": j,
+                    "question": question,
+                }
+                for j, question in enumerate(section.questions)
+            )
+
+        async with async_sessionmanager.session() as db:
+            try:
+                await db.execute(
+                    self._insert_run,
+                    {
+                        "id": str(run_id),
+                        "user_id": user_id,
+                        "folder_id": folder_id,
+                        "file_name": file_name,
+                        "file_hash": file_hash,
+                        "s3_key": s3_key,
+                        "requirements": results.requirements,
+                        "expectations": results.expectations,
+                        "problem_statement": results.problem_statement,
+                        "results": json.loads(results.model_dump_json()),
+                        "created_at": utc_now(),
+                        "sections": sections,
+                        "questions": questions,
+                    },
+                )
+                await db.commit()
+                print(
+                    f"Saved run {run_id}: {len(sections)} sections, "
+                    f"{len(questions)} questions"
+                )
+            except Exception as e:
+                logging.error(f"Error saving run {run_id}: {str(e)}")
+                raise
+
+    async def save_answers(
+        self, run_id: UUID, answers: list["AnsweredQuestion"]
+    ) -> None:
+        """
+        Stores the answers of a run's questions, in one statement.
+        """
+        rows = [
+            {
+                "section_position": answered.section_index,
+                "position": answered.question_index,
+                "answer": answered.answer,
+                "sources": answered.sources,
+            }
+            for answered in answers
+            if answered.answer is not None
+        ]
+        if not rows:
+            return
+
+        async with async_sessionmanager.session() as db:
+            try:
+                await db.execute(
+                    self._update_answers, {"run_id": str(run_id), "answers": rows}
+                )
+                await db.commit()
+            except Exception as e:
+                logging.error(f"Error saving answers of run {run_id}: {str(e)}")
+                raise
+
+    def runs_query(self, *conditions, limit: int, cursor: Optional[str] = None):
+        return keyset(
+            select(RfpRun).where(*conditions),
+            RfpRun.created_at,
+            RfpRun.id,
+            cursor,
+            limit,
+        )
+
+    async def _runs(
+        self, *conditions, limit: int, cursor: Optional[str] = None
+    ) -> Page[RfpRun]:
+        async with async_sessionmanager.session() as db:
+            result = await db.execute(
+                self.runs_query(*conditions, limit=limit, cursor=cursor)
+            )
+            return page(list(result.scalars()), limit)
+
+    async def runs_for_user(
+        self, user_id: UUID, limit: int = 50, cursor: Optional[str] = None
+    ) -> Page[RfpRun]:
+        # ix_rfp_run_user_id_created_at
+        return await self._runs(RfpRun.user_id == user_id, limit=limit, cursor=cursor)
+
+    async def runs_for_folder(
+        self, folder_id: UUID, limit: int = 50, cursor: Optional[str] = None
+    ) -> Page[RfpRun]:
+        """
+        Returns a page of the files processed in the folder, newest first.
+        """
+        # ix_rfp_run_folder_id_created_at_id
+        return await self._runs(
+            RfpRun.folder_id == folder_id, limit=limit, cursor=cursor
+        )
+
+    async def find_by_hash(
+        self, file_hash: str, user_id: Optional[UUID] = None
+    ) -> Optional[RfpRun]:
+        """
+        Returns the latest run of the same question file, so a file that was
+        already processed can be served from the database.
+        """
+        # ix_rfp_run_file_hash
+        conditions = [RfpRun.file_hash == file_hash]
+        if user_id is not None:
+            conditions.append(RfpRun.user_id == user_id)
+        runs = await self._runs(*conditions, limit=1)
+        return runs.items[0] if runs.items else None
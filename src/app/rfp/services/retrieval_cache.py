@@ -0,0 +1,120 @@
+import copy
+import json
+import threading
+import uuid
+from typing import Any, Dict, Optional
+
+from app.core.cache import LRUCache
+from app.core.config import config
+from app.database.notify import NotifyListener, notify
+
+NOTIFY_CHANNEL = "retrieval_cache"
+
+
+class RetrievalCache:
+    """
+    Caches the reranked documents of `WeaviateService` queries.
+
+    Every folder has a generation counter that is bumped whenever its chunks
+    change (ingestion, deletion). The generation is part of the cache key and
+    is read before a query runs, so results computed from data that changed
+    mid-query are stored under a stale generation and never served.
+
+    With `notify`, every invalidation is also sent to the other processes
+    through Postgres NOTIFY, and `listen` bumps the generations the others
+    invalidate, so chunks changed anywhere (another app worker, the bulk
+    loader) invalidate every process's cache. Notifications sent while the
+    listener is disconnected are lost, so it bumps every generation when it
+    (re)connects.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = config.RETRIEVAL_CACHE_SIZE,
+        notify: bool = config.RETRIEVAL_CACHE_NOTIFY,
+    ):
+        self._cache: LRUCache[list[dict]] = LRUCache(maxsize)
+        self._generations: dict[str, int] = {}
+        # added to every generation, bumped to invalidate all the folders
+        self._epoch = 0
+        self._lock = threading.Lock()
+        self.notify = notify
+        # tells this process's own notifications apart
+        self._origin = uuid.uuid4().hex
+        self._listener = NotifyListener(
+            NOTIFY_CHANNEL,
+            self._on_notify,
+            self._invalidate_all,
+            "retrieval-cache-listener",
+        )
+
+    def generation(self, folder_id) -> int:
+        with self._lock:
+            return self._epoch + self._generations.get(str(folder_id), 0)
+
+    def _invalidate(self, folder: str) -> None:
+        with self._lock:
+            self._generations[folder] = self._generations.get(folder, 0) + 1
+        self._cache.delete_where(lambda key: key[0] == folder)
+
+    def _invalidate_all(self) -> None:
+        with self._lock:
+            self._epoch += 1
+        self._cache.clear()
+
+    def _on_notify(self, payload: str) -> None:
+        origin, folder = payload.split(":", 1)
+        if origin != self._origin:
+            self._invalidate(folder)
+
+    def invalidate(self, folder_id) -> None:
+        """
+        Bumps the folder's generation and drops its cached results, in this
+        process and, with `notify`, in the others.
+        """
+        self._invalidate(str(folder_id))
+        if self.notify:
+            notify(NOTIFY_CHANNEL, f"{self._origin}:{folder_id}")
+
+    def key(
+        self,
+        folder_id,
+        generation: int,
+        query: str,
+        k: int,
+        filters: Optional[Dict[str, Any]] = None,
+        properties: Optional[list[str]] = None,
+    ) -> tuple:
+        return (
+            str(folder_id),
+            generation,
+            query,
+            k,
+            json.dumps(filters, sort_keys=True, default=str),
+            tuple(properties or ()),
+        )
+
+    def get(self, key: tuple) -> Optional[list[dict]]:
+        documents = self._cache.get(key)
+        # callers are free to modify the documents they get back
+        return copy.deepcopy(documents) if documents is not None else None
+
+    def set(self, key: tuple, documents: list[dict]) -> None:
+        self._cache.set(key, copy.deepcopy(documents))
+
+    def stats(self) -> dict[str, int]:
+        return self._cache.stats()
+
+    def listen(self) -> None:
+        """
+        Starts a background thread applying the invalidations of other
+        processes.
+        """
+        self._listener.start()
+
+    def stop(self) -> None:
+        self._listener.stop()
+
+
+# Process-wide cache shared by every WeaviateService
+retrieval_cache = RetrievalCache()
@@ -1,12 +1,43 @@
+import asyncio
+import hashlib
 import logging
+from typing import AsyncIterator, BinaryIO, Optional, Union
+from urllib.parse import quote, unquote
 
+import aioboto3
 import boto3
 from botocore.config import Config
 from botocore.exceptions import ClientError
 from fastapi import HTTPException
 
+from app.core.cache import LRUCache
 from app.core.config import config
 
+# Hashes of the content-addressed objects known to exist in the bucket, so
+# repeated uploads of the same file don't even need a HEAD request
+known_objects: LRUCache[bool] = LRUCache(config.S3_KNOWN_OBJECTS_CACHE_SIZE)
+
+
+def content_hash(file_content: bytes) -> str:
+    return hashlib.sha256(file_content).hexdigest()
+
+
+def content_key(digest: str) -> str:
+    """
+    Object key of a content-addressed file, from its SHA-256 hex digest.
+    """
+    return f"{config.S3_CONTENT_PREFIX}/{digest}"
+
+
+def content_metadata(file_name: str) -> dict[str, str]:
+    # S3 metadata values must be ASCII
+    return {"original-name": quote(file_name)}
+
+
+def original_name(metadata: dict[str, str]) -> Optional[str]:
+    name = metadata.get("original-name")
+    return unquote(name) if name else None
+
 
 class S3Service:
     def __init__(self):
@@ -118,6 +149,67 @@ class S3Service:
                 status_code=500, detail=f"Unexpected Direct Upload Error: {str(e)}"
             )
 
+    def object_exists(self, object_key: str) -> bool:
+        try:
+            self.s3_client.head_object(Bucket=self.bucket_name, Key=object_key)
+            return True
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    def content_upload(
+        self, file_content: bytes, file_name: str, content_type: str
+    ) -> str:
+        """
+        Stores the file under the SHA-256 of its content and returns the
+        object key. Content that is already stored is not uploaded again;
+        the logical file name is kept in the object metadata of the first
+        upload, callers keep track of their own names.
+        """
+        digest = content_hash(file_content)
+        key = content_key(digest)
+        if known_objects.get(digest):
+            logging.info(f"{file_name} already stored as {key}")
+            return key
+
+        try:
+            if self.object_exists(key):
+                logging.info(f"{file_name} already stored as {key}")
+            else:
+                logging.info(f"Uploading {file_name} as {key}")
+                self.s3_client.put_object(
+                    Bucket=self.bucket_name,
+                    Key=key,
+                    Body=file_content,
+                    ContentType=content_type,
+                    Metadata=content_metadata(file_name),
+                )
+        except ClientError as e:
+            error_code = e.response["Error"]["Code"]
+            error_message = e.response["Error"]["Message"]
+            logging.error(f"Content Upload Error - Code: {error_code}")
+            logging.error(f"Error Message: {error_message}")
+            raise HTTPException(
+                status_code=403,
+                detail=f"S3 Upload Error: {error_code} - {error_message}",
+            )
+        except Exception as e:
+            logging.error(f"Unexpected Content Upload Error: {str(e)}")
+            raise HTTPException(
+                status_code=500, detail=f"Unexpected Content Upload Error: {str(e)}"
+            )
+
+        known_objects.set(digest, True)
+        return key
+
+    def get_original_name(self, object_key: str) -> Optional[str]:
+        """
+        Returns the logical file name stored with a content-addressed object.
+        """
+        response = self.s3_client.head_object(Bucket=self.bucket_name, Key=object_key)
+        return original_name(response.get("Metadata", {}))
+
     def get_s3_url(self, object_key: str) -> str:
         return f"https://{self.bucket_name}.s3.amazonaws.com/{object_key}"
 
@@ -130,6 +222,8 @@ class S3Service:
             logging.info(f"Deleting file from S3: {object_key}")
             self.s3_client.delete_object(Bucket=self.bucket_name, Key=object_key)
             logging.info(f"File {object_key} deleted from S3 bucket {self.bucket_name}")
+            if object_key.startswith(f"{config.S3_CONTENT_PREFIX}/"):
+                known_objects.delete(object_key.rsplit("/", 1)[-1])
             return True
         except ClientError as e:
             error_code = e.response["Error"]["Code"]
@@ -145,3 +239,280 @@ class S3Service:
             raise HTTPException(
                 status_code=500, detail=f"Unexpected Delete Error: {str(e)}"
             )
+
+
+class MultipartUploadError(Exception):
+    """
+    A multipart upload failed. The upload is left open so that it can be
+    resumed by passing `upload_id` to `AsyncS3Service.upload_stream`.
+    """
+
+    def __init__(self, key: str, upload_id: str, message: str):
+        super().__init__(f"Multipart upload of {key} failed: {message}")
+        self.key = key
+        self.upload_id = upload_id
+
+
+class AsyncS3Service:
+    """
+    S3 access on aioboto3 for code running in the event loop.
+
+    `upload_stream` reads a file handle or an async iterator of bytes part by
+    part and uploads up to `concurrency` parts in parallel, so at most
+    `concurrency` parts of `part_size` bytes are held in memory whatever the
+    size of the file.
+    """
+
+    # S3 rejects multipart parts smaller than 5 MiB, except the last one
+    MIN_PART_SIZE = 5 * 1024 * 1024
+
+    def __init__(
+        self,
+        part_size: int = config.S3_PART_SIZE,
+        concurrency: int = config.S3_UPLOAD_CONCURRENCY,
+    ):
+        if part_size < self.MIN_PART_SIZE:
+            raise ValueError(f"part_size must be at least {self.MIN_PART_SIZE} bytes")
+        self.part_size = part_size
+        self.concurrency = concurrency
+        self.bucket_name = config.AWS_BUCKET_NAME
+        self.session = aioboto3.Session(
+            aws_access_key_id=config.AWS_ACCESS_KEY_ID,
+            aws_secret_access_key=config.AWS_SECRET_ACCESS_KEY,
+            region_name=config.AWS_DEFAULT_REGION,
+        )
+
+    def client(self):
+        return self.session.client(
+            "s3",
+            config=Config(signature_version="s3v4", connect_timeout=10),
+        )
+
+    async def _read_parts(
+        self, source: Union[BinaryIO, AsyncIterator[bytes]]
+    ) -> AsyncIterator[bytes]:
+        """
+        Yields the source in parts of exactly `part_size` bytes, the last one
+        being shorter.
+        """
+        if hasattr(source, "read"):
+            while True:
+                part = await asyncio.to_thread(source.read, self.part_size)
+                if not part:
+                    return
+                yield part
+
+        buffer = bytearray()
+        async for data in source:
+            buffer.extend(data)
+            while len(buffer) >= self.part_size:
+                yield bytes(buffer[: self.part_size])
+                del buffer[: self.part_size]
+        if buffer:
+            yield bytes(buffer)
+
+    async def upload_bytes(
+        self,
+        file_content: bytes,
+        key: str,
+        content_type: str = "",
+        metadata: Optional[dict[str, str]] = None,
+    ) -> dict:
+        async with self.client() as s3:
+            return await s3.put_object(
+                Bucket=self.bucket_name,
+                Key=key,
+                Body=file_content,
+                ContentType=content_type or "application/octet-stream",
+                Metadata=metadata or {},
+            )
+
+    async def object_exists(self, s3, key: str) -> bool:
+        try:
+            await s3.head_object(Bucket=self.bucket_name, Key=key)
+            return True
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    async def content_upload(
+        self,
+        source: Union[bytes, BinaryIO],
+        file_name: str,
+        content_type: str = "",
+    ) -> str:
+        """
+        Async version of `S3Service.content_upload`. `source` is either the
+        file content or a seekable file handle, which is hashed in a first
+        pass and then streamed with `upload_stream`.
+        """
+        if isinstance(source, bytes):
+            digest = content_hash(source)
+        else:
+
+            def hash_file() -> str:
+                sha256 = hashlib.sha256()
+                while data := source.read(self.part_size):
+                    sha256.update(data)
+                source.seek(0)
+                return sha256.hexdigest()
+
+            digest = await asyncio.to_thread(hash_file)
+
+        key = content_key(digest)
+        if known_objects.get(digest):
+            logging.info(f"{file_name} already stored as {key}")
+            return key
+
+        async with self.client() as s3:
+            exists = await self.object_exists(s3, key)
+
+        if exists:
+            logging.info(f"{file_name} already stored as {key}")
+        elif isinstance(source, bytes):
+            logging.info(f"Uploading {file_name} as {key}")
+            await self.upload_bytes(
+                source, key, content_type, metadata=content_metadata(file_name)
+            )
+        else:
+            logging.info(f"Uploading {file_name} as {key}")
+            await self.upload_stream(
+                source, key, content_type, metadata=content_metadata(file_name)
+            )
+
+        known_objects.set(digest, True)
+        return key
+
+    async def uploaded_parts(self, s3, key: str, upload_id: str) -> dict[int, str]:
+        """
+        Returns the ETag of every part already uploaded, by part number.
+        """
+        parts = {}
+        paginator = s3.get_paginator("list_parts")
+        async for page in paginator.paginate(
+            Bucket=self.bucket_name, Key=key, UploadId=upload_id
+        ):
+            for part in page.get("Parts", []):
+                parts[part["PartNumber"]] = part["ETag"].strip('"')
+        return parts
+
+    async def find_upload(self, key: str) -> Optional[str]:
+        """
+        Returns the id of the latest unfinished multipart upload of `key`.
+        """
+        async with self.client() as s3:
+            response = await s3.list_multipart_uploads(
+                Bucket=self.bucket_name, Prefix=key
+            )
+        uploads = [
+            upload for upload in response.get("Uploads", []) if upload["Key"] == key
+        ]
+        if not uploads:
+            return None
+        return max(uploads, key=lambda upload: upload["Initiated"])["UploadId"]
+
+    async def abort_upload(self, key: str, upload_id: str) -> None:
+        async with self.client() as s3:
+            await s3.abort_multipart_upload(
+                Bucket=self.bucket_name, Key=key, UploadId=upload_id
+            )
+        logging.info(f"Aborted multipart upload of {key}")
+
+    async def upload_stream(
+        self,
+        source: Union[BinaryIO, AsyncIterator[bytes]],
+        key: str,
+        content_type: str = "",
+        upload_id: Optional[str] = None,
+        metadata: Optional[dict[str, str]] = None,
+    ) -> dict:
+        """
+        Uploads `source` to `key` with a multipart upload, or a single
+        PutObject when it fits in one part.
+
+        To resume a failed upload, pass the `upload_id` of the
+        `MultipartUploadError` and the same source from its beginning: parts
+        whose MD5 matches the ETag of an already uploaded part are skipped.
+        """
+        content_type = content_type or "application/octet-stream"
+        parts = self._read_parts(source)
+        first = await anext(parts, b"")
+
+        async with self.client() as s3:
+            if upload_id is None and len(first) < self.part_size:
+                logging.info(f"Uploading {key} in a single request")
+                return await s3.put_object(
+                    Bucket=self.bucket_name,
+                    Key=key,
+                    Body=first,
+                    ContentType=content_type,
+                    Metadata=metadata or {},
+                )
+
+            uploaded: dict[int, str] = {}
+            if upload_id is None:
+                response = await s3.create_multipart_upload(
+                    Bucket=self.bucket_name,
+                    Key=key,
+                    ContentType=content_type,
+                    Metadata=metadata or {},
+                )
+                upload_id = response["UploadId"]
+            else:
+                uploaded = await self.uploaded_parts(s3, key, upload_id)
+                logging.info(f"Resuming upload of {key}: {len(uploaded)} parts done")
+
+            # held before a part is read and released once it is uploaded,
+            # which bounds both the parallel requests and the buffered parts
+            slots = asyncio.Semaphore(self.concurrency)
+            etags: dict[int, str] = {}
+
+            async def upload_part(number: int, body: bytes) -> None:
+                try:
+                    etag = hashlib.md5(body).hexdigest()
+                    if uploaded.get(number) != etag:
+                        response = await s3.upload_part(
+                            Bucket=self.bucket_name,
+                            Key=key,
+                            UploadId=upload_id,
+                            PartNumber=number,
+                            Body=body,
+                        )
+                        etag = response["ETag"].strip('"')
+                    etags[number] = etag
+                finally:
+                    slots.release()
+
+            try:
+                async with asyncio.TaskGroup() as tasks:
+                    number = 1
+                    body = first
+                    # the first part was read with nothing in flight
+                    await slots.acquire()
+                    while body:
+                        tasks.create_task(upload_part(number, body))
+                        number += 1
+                        await slots.acquire()
+                        body = await anext(parts, b"")
+                    # taken for the read that found the end of the source
+                    slots.release()
+
+                response = await s3.complete_multipart_upload(
+                    Bucket=self.bucket_name,
+                    Key=key,
+                    UploadId=upload_id,
+                    MultipartUpload={
+                        "Parts": [
+                            {"PartNumber": number, "ETag": f'"{etags[number]}"'}
+                            for number in sorted(etags)
+                        ]
+                    },
+                )
+            except Exception as e:
+                errors = e.exceptions if isinstance(e, ExceptionGroup) else [e]
+                logging.error(f"Multipart upload of {key} failed: {errors[0]}")
+                raise MultipartUploadError(key, upload_id, str(errors[0])) from e
+
+        logging.info(f"Uploaded {key} in {len(etags)} parts")
+        return response
@@ -10,10 +10,11 @@ class TavilyService:
     def __init__(self):
         self.client = AsyncTavilyClient(config.TAVILY)
 
-    async def searchAnswer(self, query: str) -> dict[str, Any] | None:
+    async def searchAnswer(self, query: str) -> dict[str, Any]:
         try:
             response = await self.client.search(query)
             return response
         except Exception as e:
             error = f"Error using web service (searchAnswer) : {str(e)}"
             logging.error(error)
+            raise
@@ -0,0 +1,237 @@
+import argparse
+import logging
+from uuid import UUID
+
+from weaviate.collections import Collection
+from weaviate.collections.classes.grpc import QueryReference
+
+from app.rfp.services.weaviate import (
+    FLAT_METADATA_PROPERTIES,
+    METADATA_PROPERTIES,
+    ChunkLayout,
+    WeaviateService,
+    metadata_collection_name,
+    sanitize_class_name,
+)
+
+FOLDER_COLLECTION_PREFIX = "Id_"
+
+
+def folder_id_from_collection(collection_name: str) -> UUID:
+    """
+    Inverse of `sanitize_class_name`.
+    """
+    return UUID(collection_name[len(FOLDER_COLLECTION_PREFIX) :].replace("_", "-"))
+
+
+def list_folder_collections(service: WeaviateService) -> list[str]:
+    """
+    Lists the per-folder chunk collections (`Id_<uuid>`), skipping the
+    metadata collections they reference.
+    """
+    names = []
+    for name in service.client.collections.list_all(simple=True):
+        if not name.startswith(FOLDER_COLLECTION_PREFIX):
+            continue
+        try:
+            folder_id_from_collection(name)
+        except ValueError:
+            continue
+        names.append(name)
+    return sorted(names)
+
+
+def referenced_metadata(source: Collection) -> dict[UUID, dict]:
+    """
+    Returns the metadata objects referenced by the chunks of a per-folder
+    collection, by uuid. Legacy folders can share one metadata collection,
+    so only what the folder's chunks point to belongs to its tenant.
+    """
+    metadata = {}
+    for obj in source.iterator(
+        return_properties=["filename"],
+        return_references=[
+            QueryReference(
+                link_on="metadata",
+                return_properties=["filename", *METADATA_PROPERTIES],
+            )
+        ],
+    ):
+        if obj.references and "metadata" in obj.references:
+            for ref in obj.references["metadata"].objects:
+                metadata[ref.uuid] = ref.properties
+    return metadata
+
+
+def migrate_folder(
+    service: WeaviateService,
+    collection_name: str,
+    delete_source: bool = False,
+    offload: bool = False,
+) -> int:
+    """
+    Copies a per-folder collection, with its vectors, into the folder's
+    tenant of the shared collections, in the service's layout (see
+    WEAVIATE_CHUNK_LAYOUT):
+
+    - reference: chunks keep their references and only the metadata objects
+      they reference are copied, which needs a source in the reference layout;
+    - flat: the metadata of each chunk is copied onto it.
+
+    The source is only deleted once the object counts match.
+    Returns the number of chunks copied.
+    """
+    folder_id = folder_id_from_collection(collection_name)
+    source = service.client.collections.get(collection_name)
+
+    # the legacy layout does not always follow the <name>_Metadata convention,
+    # so find the referenced collection from the schema
+    metadata_names = [
+        target_collection
+        for reference in source.config.get().references
+        if reference.name == "metadata"
+        for target_collection in reference.target_collections
+    ]
+    if service.layout == ChunkLayout.REFERENCE and not metadata_names:
+        raise Exception(
+            f"{collection_name} has no metadata references, it can only be "
+            "migrated to the flat layout"
+        )
+
+    service.ensure_collection(folder_id)
+    target = service.get_collection(folder_id)
+
+    if service.layout == ChunkLayout.REFERENCE:
+        target_metadata = service.get_collection(folder_id, metadata=True)
+        with target_metadata.batch.dynamic() as batch:
+            for uuid, properties in referenced_metadata(source).items():
+                batch.add_object(properties=properties, uuid=uuid)
+        failed = target_metadata.batch.failed_objects
+        if failed:
+            raise Exception(
+                f"{len(failed)} metadata objects of {collection_name} failed to "
+                f"migrate, first error: {failed[0].message}"
+            )
+
+    copied = 0
+    with target.batch.dynamic() as batch:
+        for obj in source.iterator(
+            include_vector=True,
+            return_references=(
+                [
+                    QueryReference(
+                        link_on="metadata",
+                        return_properties=["filename", *FLAT_METADATA_PROPERTIES],
+                    )
+                ]
+                if metadata_names
+                else None
+            ),
+        ):
+            metadata = []
+            if obj.references and "metadata" in obj.references:
+                metadata = obj.references["metadata"].objects
+
+            if service.layout == ChunkLayout.REFERENCE:
+                properties = {
+                    "text": obj.properties.get("text"),
+                    "filename": obj.properties.get("filename"),
+                }
+                references = {"metadata": [ref.uuid for ref in metadata]}
+            else:
+                # flat sources already hold these, reference sources resolve them
+                flat = metadata[0].properties if metadata else obj.properties
+                properties = {
+                    "text": obj.properties.get("text"),
+                    "filename": obj.properties.get("filename") or flat.get("filename"),
+                    **{name: flat.get(name) for name in FLAT_METADATA_PROPERTIES},
+                }
+                references = None
+            batch.add_object(
+                properties=properties,
+                uuid=obj.uuid,
+                vector=obj.vector.get("default"),
+                references=references,
+            )
+            copied += 1
+
+    failed = target.batch.failed_objects
+    if failed:
+        raise Exception(
+            f"{len(failed)} objects of {collection_name} failed to migrate, "
+            f"first error: {failed[0].message}"
+        )
+
+    source_count = source.aggregate.over_all(total_count=True).total_count
+    target_count = target.aggregate.over_all(total_count=True).total_count
+    if source_count != target_count:
+        raise Exception(
+            f"Object count mismatch for {collection_name}: "
+            f"{source_count} in source, {target_count} in tenant {folder_id}"
+        )
+
+    if delete_source:
+        # a metadata collection shared with other folders stays
+        own_metadata = [
+            name
+            for name in metadata_names
+            if name == metadata_collection_name(collection_name)
+        ]
+        service.client.collections.delete([collection_name, *own_metadata])
+        logging.info(f"Deleted {collection_name} and {own_metadata}")
+
+    if offload:
+        service.offload_idle_tenants(idle_seconds=-1)
+
+    return copied
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Migrate per-folder Weaviate collections to tenants of one "
+        "multi-tenant collection, in the WEAVIATE_CHUNK_LAYOUT layout"
+    )
+    parser.add_argument(
+        "--folder",
+        action="append",
+        type=UUID,
+        help="Folder id to migrate, can be repeated (default: all folders)",
+    )
+    parser.add_argument(
+        "--delete-source",
+        action="store_true",
+        help="Delete each per-folder collection once it is migrated",
+    )
+    parser.add_argument(
+        "--offload",
+        action="store_true",
+        help="Deactivate each tenant after migrating it "
+        "(see WEAVIATE_TENANT_IDLE_STATUS)",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    service = WeaviateService(multi_tenancy=True)
+    try:
+        if args.folder:
+            collections = [
+                sanitize_class_name(str(folder_id)) for folder_id in args.folder
+            ]
+        else:
+            collections = list_folder_collections(service)
+
+        print(f"Migrating {len(collections)} folders")
+        for collection_name in collections:
+            copied = migrate_folder(
+                service,
+                collection_name,
+                delete_source=args.delete_source,
+                offload=args.offload,
+            )
+            print(f"  {collection_name}: {copied} chunks")
+    finally:
+        service.client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,31 @@
+import asyncio
 import logging
+import re
+import threading
 import time
+from enum import Enum
 from typing import Any, Dict, Optional
 from uuid import UUID
 
-import aioboto3
 import weaviate
 from openai import AsyncAzureOpenAI
 from weaviate.auth import Auth
+from weaviate.classes.config import (
+    Configure,
+    DataType,
+    Property,
+    ReferenceProperty,
+    Tokenization,
+)
+from weaviate.classes.tenants import Tenant, TenantActivityStatus
+from weaviate.collections import Collection
 from weaviate.collections.classes.filters import Filter
 from weaviate.collections.classes.grpc import MetadataQuery, QueryReference
 
 from app.core.config import config
+from app.core.registry import registry
+from app.rfp.services.local_index import LocalIndexStore
+from app.rfp.services.retrieval_cache import retrieval_cache
 
 
 def sanitize_class_name(folder_id: str) -> str:
@@ -21,23 +36,122 @@ def sanitize_class_name(folder_id: str) -> str:
         raise Exception(f"Error sanitizing class name: {str(e)}")
 
 
+class ChunkLayout(Enum):
+    """
+    How the file metadata of a chunk is stored.
+    """
+
+    # chunks reference a metadata object, resolved at query time
+    REFERENCE = "reference"
+    # filename, page_number and source are stored on every chunk
+    FLAT = "flat"
+
+
+# metadata properties a query can ask for, on top of "text" and "filename"
+METADATA_PROPERTIES = [
+    "page_number",
+    "unique_id",
+    "last_modified",
+    "filetype",
+    "file_directory",
+    "source",
+    "languages",
+]
+FLAT_METADATA_PROPERTIES = ["page_number", "source"]
+
+
+def metadata_collection_name(collection_name: str) -> str:
+    return f"{collection_name}_Metadata"
+
+
+def metadata_filter(filters: Optional[Dict[str, Any]], layout: ChunkLayout):
+    """
+    Builds the Weaviate filter for the `filters` of a query, which map
+    "filename" or one of the `METADATA_PROPERTIES` to a value, or to a list of
+    values any of which matches. Every property must match.
+    """
+    if not filters:
+        return None
+
+    conditions = []
+    for name, value in filters.items():
+        if name == "filename" or (
+            layout == ChunkLayout.FLAT and name in FLAT_METADATA_PROPERTIES
+        ):
+            prop = Filter.by_property(name)
+        elif layout == ChunkLayout.REFERENCE and name in METADATA_PROPERTIES:
+            prop = Filter.by_ref("metadata").by_property(name)
+        else:
+            raise ValueError(
+                f"Cannot filter on '{name}' with the {layout.value} chunk layout"
+            )
+        if isinstance(value, (list, tuple, set)):
+            conditions.append(prop.contains_any(list(value)))
+        else:
+            conditions.append(prop.equal(value))
+    return Filter.all_of(conditions)
+
+
+_punctuation_pattern = re.compile(r"[^\w\s]")
+_whitespace_pattern = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normalizes a query so that near-identical questions (case, punctuation,
+    spacing) map to the same key.
+    """
+    query = _punctuation_pattern.sub(" ", query.lower())
+    return _whitespace_pattern.sub(" ", query).strip()
+
+
 class WeaviateService:
-    def __init__(self):
+    def __init__(
+        self,
+        multi_tenancy: bool = config.WEAVIATE_MULTI_TENANCY,
+        layout: ChunkLayout = ChunkLayout(config.WEAVIATE_CHUNK_LAYOUT),
+        offline: bool = config.WEAVIATE_OFFLINE,
+    ):
         """
         Initializes the Weaviate client and sets up embeddings and text splitter.
+
+        `layout` selects how chunk metadata is stored, see `ChunkLayout`.
+
+        Folders with at most LOCAL_INDEX_MAX_CHUNKS chunks are mirrored into an
+        in-process `LocalIndex` and queried there instead of over the network.
+        With `offline` no connection is made at all: only local indexes are
+        queried, with keyword search and without reranking.
+
+        With `multi_tenancy` all folders share one collection
+        (`WEAVIATE_TENANT_COLLECTION`) and each folder is a tenant of it,
+        instead of every folder having its own collection.
         """
         try:
+            self.multi_tenancy = multi_tenancy
+            self.layout = layout
+            self.offline = offline
+            self.local_indexes = LocalIndexStore(config.LOCAL_INDEX_DIR)
+
+            # last use of each tenant this process has activated
+            self._active_tenants: dict[str, float] = {}
+            self._tenants_lock = threading.Lock()
+            self._offloader: Optional[threading.Thread] = None
+            self._stop_offloader = threading.Event()
+            # collections whose filename is known to be field tokenized
+            self._exact_filename_collections: set[str] = set()
 
             # self.client = weaviate.WeaviateClient(
             #     url=config.WEAVIATE_URL,
             #     auth_client_secret=weaviate.AuthApiKey(config.WEAVIATE_API_KEY),
             # )
 
-            self.client = weaviate.connect_to_weaviate_cloud(
-                config.WEAVIATE_URL,
-                Auth.api_key(config.WEAVIATE_API_KEY),
-                {"X-OpenAI-Api-key": config.OPENAI_API_KEY},
-            )
+            self.client = None
+            if not offline:
+                self.client = weaviate.connect_to_weaviate_cloud(
+                    config.WEAVIATE_URL,
+                    Auth.api_key(config.WEAVIATE_API_KEY),
+                    {"X-OpenAI-Api-key": config.OPENAI_API_KEY},
+                )
 
             self.embeddings = AsyncAzureOpenAI(
                 azure_deployment=config.AZURE_OPENAI_DEPLOYMENT,
@@ -57,33 +171,59 @@ class WeaviateService:
         start_time = time.time()
 
         embedding = await self.embeddings.embeddings.create(
-            model="text-embedding-3-small", input=[text]  # or your deployed model name
+            model=config.EMBEDDING_MODEL, input=[text]
         )
         end_time = time.time()
         print(f"Embedding Generation Time: {end_time - start_time:.2f} seconds")
 
         return embedding.data[0].embedding
 
+    async def generate_embeddings(self, texts: list[str]) -> list[list[float]]:
+        """
+        Embeds many texts with as few API calls as possible.
+        Returns the embeddings in the same order as `texts`.
+        """
+        start_time = time.time()
+
+        batch_size = config.EMBEDDING_BATCH_SIZE
+        batches = [texts[i : i + batch_size] for i in range(0, len(texts), batch_size)]
+        responses = await asyncio.gather(
+            *[
+                self.embeddings.embeddings.create(
+                    model=config.EMBEDDING_MODEL, input=batch
+                )
+                for batch in batches
+            ]
+        )
+
+        embeddings: list[list[float]] = []
+        for response in responses:
+            # the API does not guarantee the order of the returned items
+            data = sorted(response.data, key=lambda item: item.index)
+            embeddings.extend(item.embedding for item in data)
+
+        end_time = time.time()
+        print(
+            f"Embedding Generation Time: {end_time - start_time:.2f} seconds "
+            f"for {len(texts)} texts in {len(batches)} requests"
+        )
+
+        return embeddings
+
     async def rerank_text(self, text_query, text_sources, num_results):
         """Calls AWS Bedrock to rerank text asynchronously."""
-        session = aioboto3.Session()
-        async with session.client(
-            "bedrock-agent-runtime",
-            aws_access_key_id=config.BEDROCK_ACCESS_KEY,
-            aws_secret_access_key=config.BEDROCK_SECRET_KEY,
-            region_name=config.BEDROCK_REGION,
-        ) as client:
-            response = await client.rerank(
-                queries=[{"type": "TEXT", "textQuery": {"text": text_query}}],
-                sources=text_sources,
-                rerankingConfiguration={
-                    "type": "BEDROCK_RERANKING_MODEL",
-                    "bedrockRerankingConfiguration": {
-                        "numberOfResults": num_results,
-                        "modelConfiguration": {"modelArn": self.model_package_arn},
-                    },
+        client = await registry.aget("bedrock")
+        response = await client.rerank(
+            queries=[{"type": "TEXT", "textQuery": {"text": text_query}}],
+            sources=text_sources,
+            rerankingConfiguration={
+                "type": "BEDROCK_RERANKING_MODEL",
+                "bedrockRerankingConfiguration": {
+                    "numberOfResults": num_results,
+                    "modelConfiguration": {"modelArn": self.model_package_arn},
                 },
-            )
+            },
+        )
         return response["results"]
 
     async def rerank(self, query: str, docs, top_n: int = config.TOP_K):
@@ -113,14 +253,11 @@ class WeaviateService:
             index = result["index"]
             score = result["relevanceScore"]
             # if score > 0.15:
-            ranked_docs.append(
-                {
-                    "text": docs[index]["text"],
-                    "filename": docs[index]["filename"],
-                    "metadata": docs[index]["metadata"],
-                    "rank_score": score,
-                }
-            )
+            ranked_doc = {
+                key: value for key, value in docs[index].items() if key != "certainty"
+            }
+            ranked_doc["rank_score"] = score
+            ranked_docs.append(ranked_doc)
         ranked_docs = sorted(ranked_docs, key=lambda x: x["rank_score"], reverse=True)
         return ranked_docs
 
@@ -130,10 +267,15 @@ class WeaviateService:
         query: str,
         k: int = 25,
         filters: Optional[Dict[str, Any]] = None,
+        properties: Optional[list[str]] = None,
     ) -> list[dict]:
         """
         Queries a Weaviate class and retrieves the top-k relevant documents.
-        Optionally, apply metadata filters.
+        Optionally, apply metadata filters (see `metadata_filter`).
+
+        Every document has its "text" and "filename", plus any of the
+        `METADATA_PROPERTIES` listed in `properties`.
+        Results are cached until the folder's chunks change.
         """
         try:
 
@@ -144,75 +286,634 @@ class WeaviateService:
             print(f"  Filters: {filters}")
             weaviate_response = []
 
-            folder_id = sanitize_class_name(str(folder_id))  # type:ignore
-            question_embedding = await self.generate_embedding(query)
-            print(f"  Question Embedding Dimensions: {len(question_embedding)}")
+            cache_key = retrieval_cache.key(
+                folder_id,
+                retrieval_cache.generation(folder_id),
+                normalize_query(query),
+                k,
+                filters,
+                properties,
+            )
+            cached = retrieval_cache.get(cache_key)
+            if cached is not None:
+                print("  Served from retrieval cache")
+                return cached
+
+            question_embedding = None
+            if not self.offline:
+                question_embedding = await self.generate_embedding(query)
+                print(f"  Question Embedding Dimensions: {len(question_embedding)}")
 
             print("\nExecuting query...")
-            collection = self.client.collections.get(str(folder_id))
+            documents = await asyncio.to_thread(
+                self._hybrid_search,
+                folder_id,
+                query,
+                question_embedding,
+                k,
+                properties,
+                filters,
+            )
+
+            response = await self._rank(query, documents)
+            for result in response:
+                weaviate_response.append(result)
+
+            retrieval_cache.set(cache_key, weaviate_response)
+            return weaviate_response
+        except Exception as e:
+            error_msg = f"Error querying folder '{folder_id}': {str(e)}"
+            print(f"\nError in query_collection:")
+            print(f"  {error_msg}")
+            logging.error(error_msg)
+            raise
+
+    def _hybrid_search(
+        self,
+        folder_id: UUID,
+        query: str,
+        vector: Optional[list[float]],
+        k: int,
+        properties: Optional[list[str]] = None,
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> list[dict]:
+        """
+        Runs a blocking hybrid query against a folder's chunks, fetching only
+        "text", "filename" and the requested metadata `properties`, and
+        keeping only the chunks matching `filters` (see `metadata_filter`).
+        Uses the folder's local index when it has one and it holds the
+        filtered properties.
+        """
+        properties = properties or []
+        where = metadata_filter(filters, self.layout)
+
+        local_index = None
+        if set(filters or ()) <= {"filename", *FLAT_METADATA_PROPERTIES}:
+            local_index = self.local_indexes.get(folder_id)
+        if local_index is not None:
+            return local_index.search(
+                query, vector, k, properties=properties, filters=filters
+            )
+        if self.offline:
+            raise Exception(f"No local index for folder '{folder_id}' in offline mode")
+        collection = self.get_collection(folder_id)
+
+        if self.layout == ChunkLayout.FLAT:
             response = collection.query.hybrid(
                 query=query,
                 alpha=0.5,
-                vector=question_embedding,
+                vector=vector,
                 return_metadata=MetadataQuery(score=True),
                 limit=k,
-                return_properties=["text"],
-                return_references=[
-                    QueryReference(
-                        link_on="metadata",
-                        return_properties=[
-                            "filename",
-                            "page_number",
-                            "unique_id",
-                            "last_modified",
-                            "filetype",
-                            "file_directory",
-                            "source",
-                            "languages",
-                        ],
-                    )
-                ],
+                filters=where,
+                return_properties=["text", "filename", *properties],
             )
+            return [
+                {
+                    "text": doc.properties.get("text"),
+                    "metadata": doc.metadata,
+                    "certainty": doc.metadata.score,
+                    "filename": doc.properties.get("filename"),
+                    **{name: doc.properties.get(name) for name in properties},
+                }
+                for doc in response.objects
+            ]
 
-            passed_response = response.objects
-            documents = [
+        response = collection.query.hybrid(
+            query=query,
+            alpha=0.5,
+            vector=vector,
+            return_metadata=MetadataQuery(score=True),
+            limit=k,
+            filters=where,
+            return_properties=["text"],
+            return_references=[
+                QueryReference(
+                    link_on="metadata",
+                    return_properties=["filename", *properties],
+                )
+            ],
+        )
+
+        documents = []
+        for doc in response.objects:
+            reference = doc.references.get("metadata") if doc.references else None
+            metadata = reference.objects[0].properties if reference else {}
+            documents.append(
                 {
                     "text": doc.properties.get("text"),
                     "metadata": doc.metadata,
                     "certainty": doc.metadata.score,
-                    "filename": doc.references.get("filename"),
+                    "filename": metadata.get("filename"),
+                    **{name: metadata.get(name) for name in properties},
                 }
-                for doc in passed_response
+            )
+        return documents
+
+    async def _rank(self, query: str, documents: list[dict]) -> list[dict]:
+        """
+        Reranks the hits of a query. Offline, the hybrid scores are used as is.
+        """
+        if not documents:
+            return []
+        if self.offline:
+            ranked_docs = []
+            for doc in documents[: config.TOP_K]:
+                ranked_doc = {
+                    key: value for key, value in doc.items() if key != "certainty"
+                }
+                ranked_doc["rank_score"] = doc["certainty"]
+                ranked_docs.append(ranked_doc)
+            return ranked_docs
+        return await self.rerank(query, documents)
+
+    async def query_collection_batch(
+        self,
+        folder_id: UUID,
+        queries: list[str],
+        k: int = 25,
+        filters: Optional[Dict[str, Any]] = None,
+        concurrency: int = config.RETRIEVAL_CONCURRENCY,
+        properties: Optional[list[str]] = None,
+        vectors: Optional[list[list[float]]] = None,
+    ) -> list[list[dict]]:
+        """
+        Retrieves the reranked documents for many queries at once.
+
+        Queries are deduplicated after normalization and looked up in the
+        retrieval cache. The rest are embedded in a single pass, unless the
+        caller already has their embeddings (`vectors`, in the same order as
+        `queries`), and searched concurrently with at most `concurrency`
+        requests in flight.
+        The results are returned in the same order as `queries`, with the
+        same document shape as `query_collection`.
+        """
+        try:
+            print("\nWeaviate Batch Query Details:")
+            print(f"  Folder Id: {folder_id}")
+            print(f"  Queries: {len(queries)}")
+            print(f"  k: {k}")
+            print(f"  Filters: {filters}")
+
+            # map every query onto the first occurrence of its normalized form
+            unique_queries: list[str] = []
+            unique_vectors: list[list[float]] = []
+            positions: dict[str, int] = {}
+            query_index: list[int] = []
+            for i, query in enumerate(queries):
+                key = normalize_query(query)
+                if key not in positions:
+                    positions[key] = len(unique_queries)
+                    unique_queries.append(query)
+                    if vectors is not None:
+                        unique_vectors.append(vectors[i])
+                query_index.append(positions[key])
+            print(f"  Unique Queries: {len(unique_queries)}")
+
+            if not unique_queries:
+                return []
+
+            generation = retrieval_cache.generation(folder_id)
+            cache_keys = [
+                retrieval_cache.key(
+                    folder_id,
+                    generation,
+                    normalize_query(query),
+                    k,
+                    filters,
+                    properties,
+                )
+                for query in unique_queries
+            ]
+            results: list[list[dict] | None] = [
+                retrieval_cache.get(cache_key) for cache_key in cache_keys
             ]
+            missing = [i for i, result in enumerate(results) if result is None]
+            print(f"  Cached Queries: {len(unique_queries) - len(missing)}")
 
-            response = await self.rerank(query, documents)
-            for result in response:
-                weaviate_response.append(result)
+            if self.offline:
+                embeddings = [None] * len(missing)
+            elif vectors is not None:
+                embeddings = [unique_vectors[i] for i in missing]
+            elif missing:
+                embeddings = await self.generate_embeddings(
+                    [unique_queries[i] for i in missing]
+                )
+            else:
+                embeddings = []
+            semaphore = asyncio.Semaphore(concurrency)
 
-            return weaviate_response
+            async def search(i: int, vector: list[float] | None) -> None:
+                async with semaphore:
+                    documents = await asyncio.to_thread(
+                        self._hybrid_search,
+                        folder_id,
+                        unique_queries[i],
+                        vector,
+                        k,
+                        properties,
+                        filters,
+                    )
+                    results[i] = await self._rank(unique_queries[i], documents)
+                    retrieval_cache.set(cache_keys[i], results[i])
+
+            start_time = time.time()
+            await asyncio.gather(
+                *[search(i, vector) for i, vector in zip(missing, embeddings)]
+            )
+            end_time = time.time()
+            print(f"Batch Retrieval Time: {end_time - start_time:.2f} seconds")
+
+            return [results[index] for index in query_index]
         except Exception as e:
-            error_msg = f"Error querying folder '{folder_id}': {str(e)}"
-            print(f"\nError in query_collection:")
+            error_msg = f"Error batch querying folder '{folder_id}': {str(e)}"
+            print(f"\nError in query_collection_batch:")
             print(f"  {error_msg}")
             logging.error(error_msg)
             raise
 
-    def delete_embeddings(self, folder_id: UUID, file_name: str):
+    def get_collection(self, folder_id: UUID, metadata: bool = False) -> Collection:
+        """
+        Returns the collection holding a folder's chunks (or, with `metadata`,
+        the metadata objects they reference). With multi-tenancy this is the
+        shared collection scoped to the folder's tenant, activated if needed.
+        """
+        if not self.multi_tenancy:
+            name = sanitize_class_name(str(folder_id))
+            if metadata:
+                name = metadata_collection_name(name)
+            return self.client.collections.get(name)
+
+        name = config.WEAVIATE_TENANT_COLLECTION
+        if metadata:
+            name = metadata_collection_name(name)
+        self.activate_tenant(folder_id)
+        return self.client.collections.get(name).with_tenant(str(folder_id))
+
+    def _tenant_collection_names(self) -> list[str]:
+        names = [config.WEAVIATE_TENANT_COLLECTION]
+        if self.layout == ChunkLayout.REFERENCE:
+            names.append(metadata_collection_name(config.WEAVIATE_TENANT_COLLECTION))
+        return names
+
+    def activate_tenant(self, folder_id: UUID) -> None:
+        """
+        Makes sure the folder's tenant exists and is active. Tenants already
+        activated by this process are only touched in memory.
+        """
+        tenant = str(folder_id)
+        with self._tenants_lock:
+            if tenant in self._active_tenants:
+                self._active_tenants[tenant] = time.time()
+                return
+
+            for name in self._tenant_collection_names():
+                tenants = self.client.collections.get(name).tenants
+                existing = tenants.get_by_name(tenant)
+                if existing is None:
+                    tenants.create(Tenant(name=tenant))
+                    logging.info(f"Created tenant {tenant} in {name}")
+                elif existing.activity_status != TenantActivityStatus.ACTIVE:
+                    tenants.update(
+                        Tenant(name=tenant, activity_status=TenantActivityStatus.ACTIVE)
+                    )
+                    logging.info(f"Activated tenant {tenant} in {name}")
+
+            self._active_tenants[tenant] = time.time()
+
+    def offload_idle_tenants(
+        self, idle_seconds: int = config.WEAVIATE_TENANT_IDLE_SECONDS
+    ) -> list[str]:
+        """
+        Deactivates (or offloads, depending on WEAVIATE_TENANT_IDLE_STATUS)
+        the tenants this process activated and has not used for `idle_seconds`,
+        freeing their memory on the cluster. They are reactivated lazily on
+        their next use. Returns the affected tenants.
+
+        The registry's service runs it periodically, see
+        `start_tenant_offloader`.
+        """
+        if not self.multi_tenancy:
+            return []
+
+        status = TenantActivityStatus(config.WEAVIATE_TENANT_IDLE_STATUS)
+        now = time.time()
+        with self._tenants_lock:
+            idle = [
+                tenant
+                for tenant, last_used in self._active_tenants.items()
+                if now - last_used > idle_seconds
+            ]
+            if not idle:
+                return []
+
+            for name in self._tenant_collection_names():
+                self.client.collections.get(name).tenants.update(
+                    [Tenant(name=tenant, activity_status=status) for tenant in idle]
+                )
+
+            for tenant in idle:
+                del self._active_tenants[tenant]
+
+        logging.info(f"Set {len(idle)} idle tenants to {status.value}")
+        return idle
+
+    def _offload_loop(self, interval: float) -> None:
+        while not self._stop_offloader.wait(interval):
+            try:
+                self.offload_idle_tenants()
+            except Exception as e:
+                logging.error(f"Error offloading idle tenants: {str(e)}")
+
+    def start_tenant_offloader(
+        self, interval: float = config.WEAVIATE_TENANT_OFFLOAD_INTERVAL
+    ) -> None:
+        """
+        Calls `offload_idle_tenants` every `interval` seconds from a
+        background thread, until `close`. Does nothing without multi-tenancy.
+        """
+        if not self.multi_tenancy or self._offloader is not None:
+            return
+        self._stop_offloader.clear()
+        self._offloader = threading.Thread(
+            target=self._offload_loop,
+            args=(interval,),
+            name="tenant-offloader",
+            daemon=True,
+        )
+        self._offloader.start()
+        logging.info(f"Offloading idle tenants every {interval}s")
+
+    def close(self) -> None:
+        if self._offloader is not None:
+            self._stop_offloader.set()
+            self._offloader.join()
+            self._offloader = None
+        if self.client is not None:
+            self.client.close()
+
+    def sync_local_index(self, folder_id: UUID) -> bool:
+        """
+        Mirrors a folder into a local index if it has at most
+        LOCAL_INDEX_MAX_CHUNKS chunks, and drops its local index otherwise.
+        Must be called whenever the folder's chunks change.
+        Returns whether the folder now has a local index.
+        """
+        if self.offline:
+            return self.local_indexes.get(folder_id) is not None
+
+        collection = self.get_collection(folder_id)
+        count = collection.aggregate.over_all(total_count=True).total_count or 0
+        if count > config.LOCAL_INDEX_MAX_CHUNKS:
+            self.local_indexes.drop(folder_id)
+            return False
+
+        documents: list[dict] = []
+        vectors: list[list[float]] = []
+        if self.layout == ChunkLayout.FLAT:
+            objects = collection.iterator(include_vector=True)
+        else:
+            objects = collection.iterator(
+                include_vector=True,
+                return_references=[
+                    QueryReference(
+                        link_on="metadata",
+                        return_properties=["filename", *FLAT_METADATA_PROPERTIES],
+                    )
+                ],
+            )
+        for obj in objects:
+            document = {"text": obj.properties.get("text")}
+            if self.layout == ChunkLayout.FLAT:
+                metadata = obj.properties
+            else:
+                reference = obj.references.get("metadata") if obj.references else None
+                metadata = reference.objects[0].properties if reference else {}
+            document["filename"] = metadata.get("filename")
+            for name in FLAT_METADATA_PROPERTIES:
+                document[name] = metadata.get(name)
+            documents.append(document)
+            vectors.append(obj.vector["default"])
+
+        self.local_indexes.build(folder_id, documents, vectors)
+        return True
+
+    def ensure_collection(self, folder_id: UUID) -> None:
+        """
+        Creates the chunk collection of a folder and, with the reference
+        layout, the metadata collection its chunks reference, if they do not
+        exist yet. With multi-tenancy the shared collections are created instead
+        and the folder's tenant is activated.
+        """
+        if self.multi_tenancy:
+            collection_name = config.WEAVIATE_TENANT_COLLECTION
+            multi_tenancy_config = Configure.multi_tenancy(
+                enabled=True, auto_tenant_creation=True, auto_tenant_activation=True
+            )
+        else:
+            collection_name = sanitize_class_name(str(folder_id))
+            multi_tenancy_config = None
+        metadata_name = metadata_collection_name(collection_name)
+
+        if self.layout == ChunkLayout.FLAT:
+            if not self.client.collections.exists(collection_name):
+                self.client.collections.create(
+                    collection_name,
+                    vectorizer_config=Configure.Vectorizer.none(),
+                    multi_tenancy_config=multi_tenancy_config,
+                    properties=[
+                        Property(name="text", data_type=DataType.TEXT),
+                        Property(
+                            name="filename",
+                            data_type=DataType.TEXT,
+                            tokenization=Tokenization.FIELD,
+                        ),
+                        Property(name="page_number", data_type=DataType.INT),
+                        Property(name="source", data_type=DataType.TEXT),
+                    ],
+                )
+                logging.info(f"Created collection {collection_name}")
+
+        elif not self.client.collections.exists(metadata_name):
+            self.client.collections.create(
+                metadata_name,
+                vectorizer_config=Configure.Vectorizer.none(),
+                multi_tenancy_config=multi_tenancy_config,
+                properties=[
+                    Property(
+                        name="filename",
+                        data_type=DataType.TEXT,
+                        tokenization=Tokenization.FIELD,
+                    ),
+                    Property(name="page_number", data_type=DataType.INT),
+                    Property(name="unique_id", data_type=DataType.TEXT),
+                    Property(name="last_modified", data_type=DataType.TEXT),
+                    Property(name="filetype", data_type=DataType.TEXT),
+                    Property(name="file_directory", data_type=DataType.TEXT),
+                    Property(name="source", data_type=DataType.TEXT),
+                    Property(name="languages", data_type=DataType.TEXT_ARRAY),
+                ],
+            )
+            logging.info(f"Created collection {metadata_name}")
+
+        if self.layout == ChunkLayout.REFERENCE and not self.client.collections.exists(
+            collection_name
+        ):
+            self.client.collections.create(
+                collection_name,
+                vectorizer_config=Configure.Vectorizer.none(),
+                multi_tenancy_config=multi_tenancy_config,
+                properties=[
+                    Property(name="text", data_type=DataType.TEXT),
+                    Property(
+                        name="filename",
+                        data_type=DataType.TEXT,
+                        tokenization=Tokenization.FIELD,
+                    ),
+                ],
+                references=[
+                    ReferenceProperty(name="metadata", target_collection=metadata_name)
+                ],
+            )
+            logging.info(f"Created collection {collection_name}")
+
+        if self.multi_tenancy:
+            self.activate_tenant(folder_id)
+
+    def import_objects(
+        self,
+        folder_id: UUID,
+        chunks: list[dict],
+        vectors: list[list[float]],
+        metadata: list[dict],
+    ) -> int:
+        """
+        Imports metadata objects and chunks (with their vectors) using Weaviate's
+        dynamic batching. Each chunk is a dict with `uuid`, `properties` (text,
+        filename, page_number and source) and `metadata_uuid`, each metadata
+        object a dict with `uuid` and `properties`.
+
+        With the flat layout the chunk properties are stored as they are and
+        the metadata objects are not needed. With the reference layout chunks
+        keep only text and filename and reference their metadata object.
+        Returns the number of objects that failed to import.
+        """
+        collection = self.get_collection(folder_id)
+
+        if self.layout == ChunkLayout.FLAT:
+            with collection.batch.dynamic() as batch:
+                for chunk, vector in zip(chunks, vectors):
+                    batch.add_object(
+                        properties=chunk["properties"],
+                        uuid=chunk["uuid"],
+                        vector=vector,
+                    )
+            retrieval_cache.invalidate(folder_id)
+            failed = collection.batch.failed_objects
+            for obj in failed[:5]:
+                logging.error(f"Failed to import object: {obj.message}")
+            return len(failed)
+
+        metadata_collection = self.get_collection(folder_id, metadata=True)
+        with metadata_collection.batch.dynamic() as batch:
+            for obj in metadata:
+                batch.add_object(properties=obj["properties"], uuid=obj["uuid"])
+
+        with collection.batch.dynamic() as batch:
+            for chunk, vector in zip(chunks, vectors):
+                batch.add_object(
+                    properties={
+                        "text": chunk["properties"]["text"],
+                        "filename": chunk["properties"]["filename"],
+                    },
+                    uuid=chunk["uuid"],
+                    vector=vector,
+                    references={"metadata": chunk["metadata_uuid"]},
+                )
+        retrieval_cache.invalidate(folder_id)
+
+        failed = (
+            metadata_collection.batch.failed_objects + collection.batch.failed_objects
+        )
+        for obj in failed[:5]:
+            logging.error(f"Failed to import object: {obj.message}")
+        return len(failed)
+
+    def _filename_is_exact(self, collection: Collection) -> bool:
+        if collection.name in self._exact_filename_collections:
+            return True
+        exact = any(
+            prop.name == "filename" and prop.tokenization == Tokenization.FIELD
+            for prop in collection.config.get().properties
+        )
+        if exact:
+            self._exact_filename_collections.add(collection.name)
+        return exact
+
+    def _delete_by_filenames(
+        self, collection: Collection, file_names: list[str]
+    ) -> dict[str, int]:
+        """
+        Deletes every object of a collection whose `filename` is one of
+        `file_names`. A single delete_many removes at most the server's
+        QUERY_MAXIMUM_RESULTS objects, so it is repeated until nothing matches.
+
+        `filename` must be field tokenized for the filter to match whole file
+        names only: with word tokenization "report.pdf" would also match the
+        chunks of "final report.pdf". Collections created before that are
+        refused until `filename_migration` has been run on them.
+        """
+        if not self._filename_is_exact(collection):
+            raise Exception(
+                f"filename of {collection.name} is not field tokenized, run "
+                "python -m app.rfp.services.filename_migration first"
+            )
+        filters = Filter.any_of(
+            [Filter.by_property("filename").equal(name) for name in file_names]
+        )
+
+        counts = {"matches": 0, "successful": 0, "failed": 0}
+        while True:
+            result = collection.data.delete_many(where=filters)
+            counts["matches"] += result.matches
+            counts["successful"] += result.successful
+            counts["failed"] += result.failed
+
+            # stop once nothing is left, or when a page made no progress
+            if result.matches == 0 or result.successful == 0:
+                break
+
+        return counts
+
+    def delete_embeddings(
+        self, folder_id: UUID, file_name: str | list[str]
+    ) -> dict[str, int]:
+        """
+        Deletes all the chunks of one or more files from a folder, along with
+        their metadata objects, using server-side filtered deletes.
+        Returns the number of matched, deleted and failed chunk objects.
+        """
         try:
             print("in delete embeddings.")
-            folder_id = sanitize_class_name(str(folder_id))  # type:ignore
+            file_names = [file_name] if isinstance(file_name, str) else file_name
 
-            collection = self.client.collections.get(str(folder_id))
-            response = collection.query.fetch_objects(
-                filters=Filter.by_property("filename").equal("file_name")
+            counts = self._delete_by_filenames(
+                self.get_collection(folder_id), file_names
             )
+            print(f"Deleted chunks: {counts}")
+
+            metadata_collection = self.get_collection(folder_id, metadata=True)
+            if self.layout == ChunkLayout.REFERENCE and self.client.collections.exists(
+                metadata_collection.name
+            ):
+                metadata_counts = self._delete_by_filenames(
+                    metadata_collection, file_names
+                )
+                print(f"Deleted metadata objects: {metadata_counts}")
 
-            object_ids = [obj.uuid for obj in response.objects]
-            print(f"Found objects: {object_ids}")
-            for _uuid in object_ids:
-                collection.data.delete_by_id(_uuid)
-                print(f"Deleted object with UUID: {_uuid}")
-            return "Deleted embeddings"
+            retrieval_cache.invalidate(folder_id)
+            self.sync_local_index(folder_id)
+            return counts
         except Exception as e:
             error_msg = f"Error deleting embeddings in folder '{folder_id}: {str(e)}"
             print(f"\nError in delete_embeddings:")
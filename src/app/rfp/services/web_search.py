@@ -0,0 +1,261 @@
+import asyncio
+import logging
+from typing import Any, Optional
+from uuid import UUID
+
+from pydantic import BaseModel, Field
+from sqlalchemy import func, select, update
+
+from app.core.cache import TTLCache
+from app.core.config import config
+from app.core.registry import registry
+from app.database import async_sessionmanager
+from app.database.models import UserWebSearchHistory
+from app.rfp.services.tavily import TavilyService
+from app.rfp.services.weaviate import normalize_query
+
+
+class WebSearchResult(BaseModel):
+    query: str
+    response: Optional[dict[str, Any]] = Field(default=None)
+    cached: bool = False
+    error: Optional[str] = Field(default=None)
+
+
+class WebSearchQuota:
+    """
+    Quota accounting against the user's latest `UserWebSearchHistory` row.
+
+    Searches are reserved before they run and unused reservations are refunded
+    afterwards, each with a single atomic UPDATE, so a batch of searches costs
+    two writes however many queries it holds, and concurrent batches of the
+    same user can never go over `max_limit`. A user's first row is created
+    under a transaction level advisory lock on the user, so concurrent first
+    searches share it instead of each inserting one.
+    """
+
+    def _lock_statement(self, user_id: UUID):
+        return select(
+            func.pg_advisory_xact_lock(func.hashtextextended(str(user_id), 0))
+        )
+
+    def _latest_row(self, user_id: UUID):
+        return (
+            select(
+                UserWebSearchHistory.id,
+                UserWebSearchHistory.current_count.label("previous_count"),
+            )
+            .where(UserWebSearchHistory.user_id == user_id)
+            .order_by(UserWebSearchHistory.created_at.desc())
+            .limit(1)
+            .with_for_update()
+            .subquery()
+        )
+
+    def _reserve_statement(self, user_id: UUID, count: int):
+        """
+        Adds up to `count` searches to the latest row, without going over its
+        limit, and returns how many were added (no row if the user has none).
+        """
+        latest = self._latest_row(user_id)
+        return (
+            update(UserWebSearchHistory)
+            .where(UserWebSearchHistory.id == latest.c.id)
+            .values(
+                current_count=func.least(
+                    UserWebSearchHistory.current_count + count,
+                    UserWebSearchHistory.max_limit,
+                )
+            )
+            .returning(UserWebSearchHistory.current_count - latest.c.previous_count)
+        )
+
+    def _refund_statement(self, user_id: UUID, count: int):
+        latest = self._latest_row(user_id)
+        return (
+            update(UserWebSearchHistory)
+            .where(UserWebSearchHistory.id == latest.c.id)
+            .values(
+                current_count=func.greatest(
+                    UserWebSearchHistory.current_count - count, 0
+                )
+            )
+        )
+
+    async def reserve(self, user_id: UUID, count: int) -> int:
+        """
+        Reserves up to `count` searches and returns how many were granted.
+        """
+        if count <= 0:
+            return 0
+
+        async with async_sessionmanager.session() as db:
+            try:
+                granted = (
+                    await db.execute(self._reserve_statement(user_id, count))
+                ).scalar()
+
+                if granted is None:
+                    # first search of the user, unless a concurrent one created
+                    # the row while we waited for the lock
+                    await db.execute(self._lock_statement(user_id))
+                    granted = (
+                        await db.execute(self._reserve_statement(user_id, count))
+                    ).scalar()
+
+                if granted is None:
+                    # start from the default limit
+                    history = UserWebSearchHistory(user_id=user_id, current_count=0)
+                    db.add(history)
+                    await db.flush()
+                    granted = min(count, history.max_limit)
+                    history.current_count = granted
+
+                await db.commit()
+                return granted
+            except Exception as e:
+                logging.error(f"Error reserving web searches: {str(e)}")
+                raise
+
+    async def refund(self, user_id: UUID, count: int) -> None:
+        """
+        Gives back reserved searches that were not used.
+        """
+        if count <= 0:
+            return
+
+        async with async_sessionmanager.session() as db:
+            try:
+                await db.execute(self._refund_statement(user_id, count))
+                await db.commit()
+            except Exception as e:
+                logging.error(f"Error refunding web searches: {str(e)}")
+                raise
+
+
+# Process-wide cache of search responses, keyed by normalized query
+search_cache: TTLCache[dict[str, Any]] = TTLCache(
+    config.WEB_SEARCH_CACHE_SIZE, config.WEB_SEARCH_CACHE_TTL
+)
+
+
+class WebSearchService:
+    """
+    Web search for answering, on top of `TavilyService`.
+
+    - responses are cached for `WEB_SEARCH_CACHE_TTL` seconds by normalized
+      query, and cache hits don't count against the quota;
+    - a query already running is awaited instead of being searched again;
+    - batches run at most `concurrency` searches at a time;
+    - searches are charged to the user's quota, see `WebSearchQuota`.
+    """
+
+    def __init__(
+        self,
+        tavily_service: Optional[TavilyService] = None,
+        quota: Optional[WebSearchQuota] = None,
+        concurrency: int = config.WEB_SEARCH_CONCURRENCY,
+        cache: TTLCache[dict[str, Any]] = search_cache,
+    ):
+        self.tavily_service = tavily_service or registry.get("tavily")
+        self.quota = quota or WebSearchQuota()
+        self.concurrency = concurrency
+        self.cache = cache
+        self._in_flight: dict[str, asyncio.Future] = {}
+
+    async def search(self, user_id: UUID, query: str) -> WebSearchResult:
+        return (await self.search_batch(user_id, [query]))[0]
+
+    async def search_batch(
+        self, user_id: UUID, queries: list[str]
+    ) -> list[WebSearchResult]:
+        """
+        Searches every query and returns the results in the same order.
+        Queries over the user's remaining quota get an error result.
+        """
+        keys = [normalize_query(query) for query in queries]
+        responses: dict[str, WebSearchResult] = {}
+        waiting: dict[str, asyncio.Future] = {}
+        to_search: list[str] = []
+        # searched as first spelled in the batch
+        originals: dict[str, str] = {}
+        for key, query in zip(keys, queries):
+            originals.setdefault(key, query)
+
+        for key, query in zip(keys, queries):
+            if key in responses or key in waiting or key in to_search:
+                continue
+            cached = self.cache.get(key)
+            if cached is not None:
+                responses[key] = WebSearchResult(
+                    query=query, response=cached, cached=True
+                )
+            elif key in self._in_flight:
+                waiting[key] = self._in_flight[key]
+            else:
+                to_search.append(key)
+
+        futures = {}
+        for key in to_search:
+            futures[key] = asyncio.get_running_loop().create_future()
+            self._in_flight[key] = futures[key]
+
+        try:
+            granted = await self.quota.reserve(user_id, len(to_search))
+            for key in to_search[granted:]:
+                self._resolve(
+                    key,
+                    futures[key],
+                    WebSearchResult(query=key, error="Web search limit reached"),
+                )
+
+            semaphore = asyncio.Semaphore(self.concurrency)
+
+            async def run(key: str) -> WebSearchResult:
+                async with semaphore:
+                    try:
+                        response = await self.tavily_service.searchAnswer(
+                            originals[key]
+                        )
+                        self.cache.set(key, response)
+                        result = WebSearchResult(query=key, response=response)
+                    except Exception as e:
+                        result = WebSearchResult(query=key, error=str(e))
+                self._resolve(key, futures[key], result)
+                return result
+
+            results = await asyncio.gather(*[run(key) for key in to_search[:granted]])
+            await self.quota.refund(
+                user_id, sum(1 for result in results if result.error)
+            )
+        except BaseException as e:
+            # don't leave concurrent batches waiting on these searches
+            for key in to_search:
+                self._resolve(
+                    key,
+                    futures[key],
+                    WebSearchResult(query=key, error=str(e) or type(e).__name__),
+                )
+            raise
+
+        for key, future in {**futures, **waiting}.items():
+            responses[key] = await future
+
+        if to_search:
+            print(
+                f"Web search: {len(queries)} queries, {len(to_search)} searched, "
+                f"{len(waiting)} shared with running searches"
+            )
+
+        return [
+            responses[key].model_copy(update={"query": query})
+            for key, query in zip(keys, queries)
+        ]
+
+    def _resolve(
+        self, key: str, future: asyncio.Future, result: WebSearchResult
+    ) -> None:
+        if not future.done():
+            future.set_result(result)
+        if self._in_flight.get(key) is future:
+            del self._in_flight[key]
@@ -16,6 +16,9 @@ class Topics(Enum):
 
     SAVE = "save_rfp"
 
+    RESULTS = "results"
+    PROGRESS = "progress"
+
 
 class Agents(Enum):
     MANAGER = "manager"
@@ -1,53 +1,49 @@
-import asyncio
 import os
+import queue
 import sys
 import tempfile
+import uuid
 from pathlib import Path
 
 import streamlit as st
-from autogen_core import (
-    AgentId,
-    ClosureAgent,
-    ClosureContext,
-    MessageContext,
-    SingleThreadedAgentRuntime,
-    TypeSubscription,
-)
 
 # Add the src directory to the Python path
 src_path = str(Path(__file__).parent / "src")
 if src_path not in sys.path:
     sys.path.insert(0, src_path)
 
-from app.core.llm_tracker import (
-    get_global_tracker,
-    reset_global_tracker,
-    setup_tracking,
-)
-from app.rfp.agents.extractor import ExtractorAgent
-from app.rfp.agents.manager import ManagerAgent, Results, StartMessage
-from app.rfp.agents.section_generator import SectionGeneratorAgent
+from app.core.background_loop import BackgroundLoop
+from app.core.config import config
+from app.core.llm_tracker import LLMUsageTracker, get_global_tracker, setup_tracking
+from app.core.registry import registry
+from app.core.usage_ledger import usage_ledger, usage_scope
+from app.core.utils import get_user_from_request
+from app.database.limits import DEFAULT_LIMITS, limits_cache
+from app.rfp.agents.section_generator import ProgressMessage, SectionData, Stage
+from app.rfp.runtime import RfpRuntime
+from app.rfp.services.answer_library import AnswerLibrary
+from app.rfp.services.answering import AnsweredQuestion, AnswerEngine
 from app.rfp.services.file import FileProcessing
-from app.rfp.utils import Agents, Topics
-
-queue = asyncio.Queue[Results]()
+from app.rfp.services.ingestion import IngestionPipeline, IngestionSource
+from app.rfp.services.weaviate import WeaviateService
 
 
 # Function to initialize the app
 def main():
     # Initialize session state variables if they don't exist
-    if "runtime" not in st.session_state:
-        st.session_state.runtime = None
-    if "manager_agent_id" not in st.session_state:
-        st.session_state.manager_agent_id = None
     if "results" not in st.session_state:
         st.session_state.results = None
     if "processing" not in st.session_state:
         st.session_state.processing = False
     if "kb_files" not in st.session_state:
         st.session_state.kb_files = []
-    if "weaviate_service" not in st.session_state:
-        st.session_state.weaviate_service = None
+    if "folder_id" not in st.session_state:
+        st.session_state.folder_id = uuid.uuid4()
+    if "answers" not in st.session_state:
+        st.session_state.answers = {}
+    if "user_id" not in st.session_state:
+        user = run_async(get_user_from_request())
+        st.session_state.user_id = uuid.UUID(user["sub"])
     if "token_usage" not in st.session_state:
         st.session_state.token_usage = {
             "prompt_tokens": 0,
@@ -57,7 +53,13 @@ def main():
         }
 
     # Initialize services
-    file_service = FileProcessing()
+    file_service: FileProcessing = registry.get("file_processing")
+
+    # Charge LLM usage to the user
+    setup_tracking()
+    usage_ledger.start(get_global_tracker())
+    if config.LIMITS_NOTIFY:
+        limits_cache.listen()
 
     # Set page config
     st.set_page_config(
@@ -74,55 +76,33 @@ def main():
     create_app_layout(file_service)
 
 
-async def initialize_runtime():
-    """Initialize the agent runtime and register agents."""
-    runtime = SingleThreadedAgentRuntime()
-
-    # Register the manager agent
-    manager_agent_type = await ManagerAgent.register(
-        runtime,
-        Agents.MANAGER.value,
-        lambda: ManagerAgent(Agents.MANAGER.value),
-    )
+@st.cache_resource
+def get_background_loop() -> BackgroundLoop:
+    """Start the event loop shared by every session and rerun."""
+    return BackgroundLoop()
 
-    # Add subscriptions for the manager agent
-    await runtime.add_subscription(
-        TypeSubscription(Topics.START.value, manager_agent_type)
-    )
-    await runtime.add_subscription(
-        TypeSubscription(Topics.PARSED.value, manager_agent_type)
-    )
-    await runtime.add_subscription(
-        TypeSubscription(Topics.EXTRACTED.value, manager_agent_type)
-    )
-    await runtime.add_subscription(
-        TypeSubscription(Topics.GENERATED.value, manager_agent_type)
-    )
 
-    # Register the extractor agent
-    extractor_agent_type = await ExtractorAgent.register(
-        runtime,
-        Agents.EXTRACTOR.value,
-        lambda: ExtractorAgent(Agents.EXTRACTOR.value),
-    )
-    await runtime.add_subscription(
-        TypeSubscription(Topics.EXTRACT.value, extractor_agent_type)
-    )
+def run_async(coro, **kwargs):
+    """Run a coroutine on the shared event loop and wait for its result."""
+    return get_background_loop().run(coro, **kwargs)
 
-    # Register the section generator agent
-    section_generator_agent_type = await SectionGeneratorAgent.register(
-        runtime,
-        Agents.SECTION_GENERATOR.value,
-        lambda: SectionGeneratorAgent(Agents.SECTION_GENERATOR.value),
-    )
-    await runtime.add_subscription(
-        TypeSubscription(Topics.GENERATE.value, section_generator_agent_type)
-    )
 
+async def start_runtime() -> RfpRuntime:
+    """Build and start the agent runtime."""
+    runtime = RfpRuntime()
+    await runtime.start()
     return runtime
 
 
-async def process_question_file(file_bytes, file_name):
+@st.cache_resource
+def get_runtime() -> RfpRuntime:
+    """Build and start the agent runtime once, on the shared event loop."""
+    return run_async(start_runtime())
+
+
+async def process_question_file(
+    runtime: RfpRuntime, file_bytes, file_name, user_id, updates: queue.Queue
+):
     """Process a question file using the agent runtime and track token usage."""
     # Create a temporary file to store the question file
     with tempfile.NamedTemporaryFile(
@@ -132,57 +112,214 @@ async def process_question_file(file_bytes, file_name):
         tmp_path = tmp_file.name
 
     try:
-        # Set up token tracking
-        reset_global_tracker()
-        setup_tracking()
-
-        # Initialize the runtime if not already initialized
-        if st.session_state.runtime is None:
-            st.session_state.runtime = await initialize_runtime()
-            st.session_state.runtime.start()
-
-            # setup closure
-            async def collect_result(
-                _agent: ClosureContext, message: Results, ctx: MessageContext
-            ) -> None:
-                await queue.put(message)
-
-            await ClosureAgent.register_closure(
-                st.session_state.runtime,
-                "closure",
-                collect_result,
-                subscriptions=lambda: [
-                    TypeSubscription(topic_type="results", agent_type="closure")
-                ],
-            )
+        # Run the agents, other sessions' runs share the runtime and the
+        # global tracker, so the run's tokens are counted on their own
+        usage = LLMUsageTracker()
+        results = await runtime.run(
+            tmp_path, user_id=user_id, on_progress=updates.put, usage=usage
+        )
 
-        # Create the manager agent ID
-        st.session_state.manager_agent_id = AgentId(Agents.MANAGER.value, "default")
+        return results, usage.get_usage_stats()
 
-        # Send the start message to the manager agent
-        await st.session_state.runtime.send_message(
-            StartMessage(question_file_path=tmp_path),
-            st.session_state.manager_agent_id,
+    finally:
+        # Clean up the temporary file
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+
+
+class ProgressView:
+    """Placeholders showing the progress of a question file while it is processed."""
+
+    def __init__(self):
+        self.status = st.empty()
+        self.overview = st.empty()
+        self.sections_view = st.empty()
+        self.output = st.empty()
+        self.text = ""
+        self.sections: list[SectionData] = []
+
+    def update(self, message: ProgressMessage):
+        """Render a progress message of the run."""
+        if message.stage == Stage.STARTED:
+            self.status.info("⏳ Extracting requirements and sections...")
+        elif message.stage == Stage.EXTRACTED:
+            self.status.info("⏳ Requirements extracted, generating sections...")
+            overview = [
+                f"**{title}**\n\n{text}"
+                for title, text in (
+                    ("Problem Statement", message.problem_statement),
+                    ("Requirements", message.requirements),
+                    ("Expectations", message.expectations),
+                )
+                if text
+            ]
+            self.overview.markdown("\n\n".join(overview))
+        elif message.stage == Stage.GENERATING:
+            self.text += message.text or ""
+            self.sections.extend(message.sections or [])
+            self.render_sections()
+            # tail of the streamed output
+            self.output.code(self.text[-600:], language="json")
+        elif message.stage == Stage.GENERATED:
+            self.sections = message.sections or []
+            self.render_sections()
+            self.output.empty()
+
+    def render_sections(self):
+        self.sections_view.markdown(
+            "\n".join(
+                f"- **{section.title}** ({len(section.questions)} questions)"
+                for section in self.sections
+            )
         )
 
-        # Wait for the runtime to complete
-        await st.session_state.runtime.stop_when_idle()
+    def clear(self):
+        for placeholder in (
+            self.status,
+            self.overview,
+            self.sections_view,
+            self.output,
+        ):
+            placeholder.empty()
 
-        # Get the results from the manager agent
-        results = await queue.get()
 
-        # Get token usage statistics
-        token_usage = get_global_tracker().get_usage_stats()
+def get_weaviate_service() -> WeaviateService:
+    """Get the process-wide Weaviate service, creating it on first use."""
+    return registry.get("weaviate")
 
-        # Update session state with token usage
-        st.session_state.token_usage = token_usage
 
-        return results
+async def get_answer_engine():
+    """Create an answer engine on the shared event loop, where its LLM client runs."""
+    weaviate_service = get_weaviate_service()
+    return AnswerEngine(
+        weaviate_service, answer_library=AnswerLibrary(weaviate_service)
+    )
+
+
+def render_progress(progress_bar, progress):
+    """Render the ingestion progress."""
+    finished = progress.files_done + progress.files_skipped + progress.files_failed
+    progress_bar.progress(
+        finished / max(progress.files_total, 1),
+        text=f"{finished}/{progress.files_total} files, "
+        f"{progress.chunks_imported} chunks imported",
+    )
 
-    finally:
-        # Clean up the temporary file
-        if os.path.exists(tmp_path):
-            os.unlink(tmp_path)
+
+async def get_max_files(user_id) -> int:
+    """The user's plan limit on knowledge base files, cached."""
+    limits = await limits_cache.aget(user_id)
+    return limits.max_file if limits is not None else DEFAULT_LIMITS["max_file"]
+
+
+async def ingest_kb_files(folder_id, sources, updates: queue.Queue):
+    """Ingest the knowledge base files into the session's folder."""
+    pipeline = IngestionPipeline(
+        get_weaviate_service(),
+        on_progress=lambda progress: updates.put(progress.model_copy()),
+    )
+    return await pipeline.run(folder_id, sources)
+
+
+def render_answer(placeholder, answered: AnsweredQuestion):
+    """Render an answered question into its placeholder."""
+    if answered.error:
+        placeholder.error(f"❌ Could not answer: {answered.error}")
+        return
+
+    sources = ", ".join(answered.sources) if answered.sources else "none"
+    text = f"{answered.answer}\n\n*Sources: {sources} ({answered.elapsed:.1f}s)*"
+    if answered.duplicate_of:
+        i, j = answered.duplicate_of
+        text += f"\n\n*Same question as Section {i + 1}, Q{j + 1}*"
+    if answered.library == "reused":
+        text += "\n\n*Reused from the answer library*"
+    elif answered.library == "drafted":
+        text += "\n\n*Drafted from a similar answer in the library*"
+    placeholder.markdown(text)
+
+
+async def stream_answers(engine, folder_id, sections, user_id, updates: queue.Queue):
+    """Answer the questions of the sections, reporting each answer as it arrives."""
+    async for answered in engine.answer_sections(folder_id, sections, user_id=user_id):
+        updates.put(answered)
+
+
+def answer_questions(sections, placeholders):
+    """Answer the questions of the sections, rendering each answer as it arrives."""
+
+    def show(answered: AnsweredQuestion):
+        key = (answered.section_index, answered.question_index)
+        st.session_state.answers[key] = answered
+        render_answer(placeholders[key], answered)
+
+    engine = run_async(get_answer_engine())
+    updates = queue.Queue()
+    run_async(
+        stream_answers(
+            engine,
+            st.session_state.folder_id,
+            sections,
+            st.session_state.user_id,
+            updates,
+        ),
+        updates=updates,
+        on_update=show,
+    )
+
+    if engine.dedup_report and engine.dedup_report.calls_saved:
+        st.info(
+            f"♻️ {engine.dedup_report.calls_saved} duplicate questions were answered "
+            f"without extra calls ({engine.dedup_report.clusters} distinct questions)"
+        )
+    if engine.library_report and (
+        engine.library_report.reused or engine.library_report.drafted
+    ):
+        st.info(
+            f"📚 {engine.library_report.reused} answers reused and "
+            f"{engine.library_report.drafted} drafted from the answer library"
+        )
+
+
+async def answer_question(engine, folder_id, question, user_id):
+    """Answer one question, charging its LLM calls to the user."""
+    # entered here, the coroutine runs in the background loop's context
+    with usage_scope(user_id=user_id):
+        return await engine.answer_question(folder_id, question)
+
+
+def answer_single_question(i, j, sections, placeholders):
+    """Answer one question and render it."""
+    engine = run_async(get_answer_engine())
+    answered = AnsweredQuestion(
+        section_index=i,
+        question_index=j,
+        section_title=sections[i].title,
+        question=sections[i].questions[j],
+    )
+    answered.answer, answered.sources = run_async(
+        answer_question(
+            engine,
+            st.session_state.folder_id,
+            answered.question,
+            st.session_state.user_id,
+        )
+    )
+    st.session_state.answers[(i, j)] = answered
+    render_answer(placeholders[(i, j)], answered)
+
+
+async def save_to_library(user_id, answered: AnsweredQuestion):
+    """Approve an answer, adding it to the user's answer library."""
+    library = AnswerLibrary(get_weaviate_service())
+    failed = await library.add(
+        user_id,
+        [answered.question],
+        [answered.answer],
+        [answered.sources],
+    )
+    if failed:
+        raise Exception("The answer could not be saved")
 
 
 def create_app_layout(file_service):
@@ -207,20 +344,50 @@ def create_app_layout(file_service):
     #     key="proposal-file",
     # )
 
-    # # Knowledge Base Files Upload
-    # st.markdown("### Knowledge Base Files (max 3)")
-    # kb_files = st.file_uploader(
-    #     "Upload knowledge base files (max 3)",
-    #     type=["pdf", "txt", "docx", "xlsx", "csv"],
-    #     accept_multiple_files=True,
-    #     key="kb",
-    # )
+    # Knowledge Base Files Upload, up to the user's plan limit
+    max_files = run_async(get_max_files(st.session_state.user_id))
+    st.markdown(f"### Knowledge Base Files (max {max_files})")
+    kb_files = st.file_uploader(
+        f"Upload knowledge base files (max {max_files})",
+        type=["pdf", "txt", "xlsx", "csv"],
+        accept_multiple_files=True,
+        key="kb",
+    )
 
-    # Display warning if more than 3 KB files are uploaded
-    # if kb_files and len(kb_files) > 3:
-    #     st.warning(
-    #         "⚠️ Maximum 3 knowledge base files allowed. Only the first 3 will be processed."
-    #     )
+    # Display warning if more KB files are uploaded than the plan allows
+    if kb_files and len(kb_files) > max_files:
+        st.warning(
+            f"⚠️ Maximum {max_files} knowledge base files allowed. "
+            f"Only the first {max_files} will be processed."
+        )
+
+    if kb_files and st.button("Upload to Knowledge Base"):
+        progress_bar = st.progress(0.0, text="Ingesting knowledge base files...")
+        try:
+            updates = queue.Queue()
+            progress = run_async(
+                ingest_kb_files(
+                    st.session_state.folder_id,
+                    [
+                        IngestionSource(
+                            file_name=kb_file.name, content=kb_file.getvalue()
+                        )
+                        for kb_file in kb_files[:max_files]
+                    ],
+                    updates,
+                ),
+                updates=updates,
+                on_update=lambda progress: render_progress(progress_bar, progress),
+            )
+            st.session_state.kb_files = [
+                kb_file.name for kb_file in kb_files[:max_files]
+            ]
+            st.success(
+                f"✅ Ingested {progress.files_done} files "
+                f"({progress.chunks_imported} chunks)"
+            )
+        except Exception as e:
+            st.error(f"❌ Error ingesting knowledge base files: {str(e)}")
 
     # Process button
     if st.button("Generate"):
@@ -229,20 +396,32 @@ def create_app_layout(file_service):
         else:
             st.session_state.processing = True
 
-            # Store KB files for later use
-            # st.session_state.kb_files = kb_files[:3] if kb_files else []
-
             # Process the question file
             with st.spinner("Processing question file..."):
+                progress_view = ProgressView()
                 try:
-                    # Process the question file using the agent runtime
-                    st.session_state.results = asyncio.run(
-                        process_question_file(question_file.read(), question_file.name)
+                    # Process the question file using the agent runtime,
+                    # showing its stages and sections as they arrive
+                    updates = queue.Queue()
+                    st.session_state.results, st.session_state.token_usage = run_async(
+                        process_question_file(
+                            get_runtime(),
+                            question_file.read(),
+                            question_file.name,
+                            st.session_state.user_id,
+                            updates,
+                        ),
+                        updates=updates,
+                        on_update=progress_view.update,
                     )
+                    st.session_state.answers = {}
                     st.success("✅ Question file processed successfully!")
                 except Exception as e:
                     st.error(f"❌ Error processing question file: {str(e)}")
                     st.session_state.results = None
+                finally:
+                    # the results are rendered below
+                    progress_view.clear()
 
             st.session_state.processing = False
 
@@ -289,19 +468,57 @@ def create_app_layout(file_service):
         # Display sections and questions if available
         if st.session_state.results.sections:
             st.markdown("### Sections and Questions")
-            for i, section in enumerate(st.session_state.results.sections):
+            sections = st.session_state.results.sections
+
+            answer_all = st.session_state.kb_files and st.button(
+                "Answer all questions using KB"
+            )
+
+            placeholders = {}
+            clicked = None
+            for i, section in enumerate(sections):
                 # Expand the first box
                 with st.expander(f"Section {i+1}: {section.title}", expanded=(i == 0)):
                     for j, question in enumerate(section.questions):
                         st.markdown(f"**Q{j+1}:** {question}")
+                        placeholders[(i, j)] = st.empty()
+                        if (i, j) in st.session_state.answers:
+                            render_answer(
+                                placeholders[(i, j)], st.session_state.answers[(i, j)]
+                            )
 
                         # Add a button to answer the question using KB if KB files are available
                         if st.session_state.kb_files and st.button(
                             f"Answer using KB", key=f"answer_btn_{i}_{j}"
                         ):
-                            st.info(
-                                "This functionality requires the KB integration to be implemented."
+                            clicked = (i, j)
+
+                        answered = st.session_state.answers.get((i, j))
+                        if (
+                            answered
+                            and answered.answer
+                            and answered.library != "reused"
+                            and st.button(
+                                "Save to answer library", key=f"save_btn_{i}_{j}"
                             )
+                        ):
+                            try:
+                                run_async(
+                                    save_to_library(st.session_state.user_id, answered)
+                                )
+                                st.success("✅ Saved to the answer library")
+                            except Exception as e:
+                                st.error(f"❌ Error saving the answer: {str(e)}")
+
+            if answer_all or clicked:
+                with st.spinner("Answering questions..."):
+                    try:
+                        if answer_all:
+                            answer_questions(sections, placeholders)
+                        else:
+                            answer_single_question(*clicked, sections, placeholders)
+                    except Exception as e:
+                        st.error(f"❌ Error answering questions: {str(e)}")
     else:
         st.info("Upload a question file and click 'Generate' to see results.")
 
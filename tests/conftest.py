@@ -0,0 +1,118 @@
+import os
+import uuid
+
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+# app.core.config needs these at import time, the tests never reach the
+# services they point to
+for name in (
+    "AWS_ACCESS_KEY_ID",
+    "AWS_SECRET_ACCESS_KEY",
+    "AWS_DEFAULT_REGION",
+    "AWS_BUCKET_NAME",
+    "BEDROCK_REGION",
+    "BEDROCK_ACCESS_KEY",
+    "BEDROCK_SECRET_KEY",
+    "WEAVIATE_URL",
+    "WEAVIATE_API_KEY",
+    "AZURE_API_KEY",
+    "AZURE_OPENAI_DEPLOYMENT",
+    "AZURE_OPENAI_ENDPOINT",
+    "AZURE_OPENAI_EMBEDDINGS_API_KEY",
+    "AZURE_OPENAI_API_VERSION",
+    "AZURE_MODEL_NAME",
+    "COHERE_MODEL_ID",
+    "HUGGINGFACE_API_KEY",
+    "HUGGINGFACE_MODEL_NAME",
+    "HUGGINGFACE_API_URL",
+    "OPENAI_API_KEY",
+    "TAVILY",
+):
+    os.environ.setdefault(name, "test")
+os.environ.setdefault("TOP_K", "5")
+os.environ.setdefault("DB_URL", "postgresql+psycopg://localhost/test")
+
+
+class WordEncoder:
+    """
+    One token per whitespace separated word, instead of tiktoken's encoding
+    which is downloaded on first use.
+    """
+
+    def encode(self, text: str) -> list[str]:
+        return text.split()
+
+    def decode(self, tokens: list[str]) -> str:
+        return " ".join(tokens)
+
+
+@pytest.fixture
+def word_tokens(monkeypatch):
+    monkeypatch.setattr("app.rfp.services.context.get_encoder", WordEncoder)
+
+
+@pytest.fixture(scope="session")
+def database():
+    """
+    Engine on the database at DB_URL, which must be migrated to head. The
+    tests using it are skipped when there is none.
+    """
+    engine = create_engine(os.environ["DB_URL"])
+    try:
+        with engine.connect() as connection:
+            tables = inspect(connection).get_table_names()
+    except Exception as e:
+        engine.dispose()
+        pytest.skip(f"No database at DB_URL: {e}")
+    if "usage_ledger" not in tables:
+        engine.dispose()
+        pytest.skip("The database at DB_URL is not migrated")
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def make_user(database):
+    """
+    Creates users with an application limit, deleted with everything
+    referencing them at the end of the test.
+    """
+    user_ids = []
+
+    def make_user(tokens_left: int = 10000) -> uuid.UUID:
+        user_id = uuid.uuid4()
+        with database.begin() as connection:
+            connection.execute(
+                text(
+                    "INSERT INTO users (id, name, premium_plan) "
+                    "VALUES (:id, 'test', 'BASIC')"
+                ),
+                {"id": user_id},
+            )
+            connection.execute(
+                text(
+                    "INSERT INTO application_limit (id, userid, max_folder, "
+                    "max_file, max_agent, max_tokens, tokens_left) "
+                    "VALUES (:id, :userid, 3, 3, 3, 10000, :tokens_left)"
+                ),
+                {"id": uuid.uuid4(), "userid": user_id, "tokens_left": tokens_left},
+            )
+        user_ids.append(user_id)
+        return user_id
+
+    yield make_user
+
+    with database.begin() as connection:
+        for table, column in (
+            ("usage_ledger", "user_id"),
+            ("rfp_run", "user_id"),
+            ("folder", "userid"),
+            ("user_web_search_history", "user_id"),
+            ("application_limit", "userid"),
+            ("users", "id"),
+        ):
+            connection.execute(
+                text(f"DELETE FROM {table} WHERE {column} = ANY(:ids)"),
+                {"ids": user_ids},
+            )
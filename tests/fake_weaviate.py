@@ -0,0 +1,340 @@
+"""
+In-memory stand-in for the parts of the Weaviate client the migrations
+use. Collection configs are real `CollectionConfig`s built from the
+stored schema, like the client builds them from the server's.
+"""
+
+import copy
+import uuid
+
+import numpy as np
+from contextlib import contextmanager
+from types import SimpleNamespace
+from typing import Optional
+
+from weaviate.classes.tenants import Tenant, TenantActivityStatus
+from weaviate.collections.classes.filters import _FilterValue, _Operator
+from weaviate.collections.classes.config_methods import _collection_config_from_json
+
+VECTOR_INDEX_CONFIG = {
+    "distance": "cosine",
+    "ef": -1,
+    "efConstruction": 128,
+    "maxConnections": 32,
+    "dynamicEfMin": 100,
+    "dynamicEfMax": 500,
+    "dynamicEfFactor": 8,
+    "vectorCacheMaxObjects": 1000000000000,
+    "flatSearchCutoff": 40000,
+    "cleanupIntervalSeconds": 300,
+    "skip": False,
+    "filterStrategy": "sweeping",
+}
+
+
+def schema(
+    name: str,
+    properties: list[dict],
+    multi_tenancy: bool = False,
+    vector_config: Optional[dict] = None,
+) -> dict:
+    """
+    A collection schema as the server returns it.
+    """
+    schema = {
+        "class": name,
+        "invertedIndexConfig": {
+            "bm25": {"b": 0.75, "k1": 1.2},
+            "cleanupIntervalSeconds": 60,
+            "stopwords": {"preset": "en", "additions": None, "removals": None},
+        },
+        "multiTenancyConfig": {
+            "enabled": multi_tenancy,
+            "autoTenantCreation": multi_tenancy,
+            "autoTenantActivation": multi_tenancy,
+        },
+        "replicationConfig": {"factor": 1, "asyncEnabled": False},
+        "shardingConfig": (
+            {}
+            if multi_tenancy
+            else {
+                "virtualPerPhysical": 128,
+                "desiredCount": 1,
+                "actualCount": 1,
+                "desiredVirtualCount": 128,
+                "actualVirtualCount": 128,
+                "key": "_id",
+                "strategy": "hash",
+                "function": "murmur3",
+            }
+        ),
+        "properties": [
+            {"indexFilterable": True, "indexSearchable": True, **prop}
+            for prop in properties
+        ],
+    }
+    if vector_config:
+        schema["vectorConfig"] = vector_config
+    else:
+        schema["vectorizer"] = "none"
+        schema["vectorIndexType"] = "hnsw"
+        schema["vectorIndexConfig"] = dict(VECTOR_INDEX_CONFIG)
+    return schema
+
+
+def text_property(name: str, tokenization: str = "word") -> dict:
+    return {"name": name, "dataType": ["text"], "tokenization": tokenization}
+
+
+def _server_schema(schema: dict) -> dict:
+    """
+    What the server stores for a schema sent by the client.
+    """
+    schema = copy.deepcopy(schema)
+    indexes = [schema.get("vectorIndexConfig")] + [
+        vector.get("vectorIndexConfig")
+        for vector in (schema.get("vectorConfig") or {}).values()
+    ]
+    for index in indexes:
+        if index is not None:
+            # the server ignores the client's distanceMetric
+            index.pop("distanceMetric", None)
+            index.setdefault("distance", "cosine")
+            for key, value in VECTOR_INDEX_CONFIG.items():
+                index.setdefault(key, value)
+    stopwords = schema["invertedIndexConfig"]["stopwords"]
+    stopwords.setdefault("additions", None)
+    stopwords.setdefault("removals", None)
+    for prop in schema["properties"]:
+        prop.pop("moduleConfig", None)
+    return schema
+
+
+class FakeCollection:
+    def __init__(self, client: "FakeClient", name: str, tenant: Optional[str] = None):
+        self.client = client
+        self.name = name
+        self.tenant = tenant
+        self.config = SimpleNamespace(get=self._config)
+        self.tenants = SimpleNamespace(
+            get=self._tenants,
+            get_by_name=self._tenant,
+            create=self._create_tenants,
+            update=self._update_tenants,
+        )
+        self.aggregate = SimpleNamespace(over_all=self._over_all)
+        self.batch = SimpleNamespace(dynamic=self._dynamic, failed_objects=[])
+        self.query = SimpleNamespace(near_vector=self._near_vector)
+
+    @property
+    def _state(self) -> dict:
+        return self.client.state[self.name]
+
+    def _config(self):
+        return _collection_config_from_json(self._state["schema"])
+
+    def _objects(self) -> dict:
+        if self._state["schema"]["multiTenancyConfig"]["enabled"]:
+            if self.tenant is None:
+                raise Exception(f"{self.name} is multi-tenant, no tenant given")
+            if self._state["tenants"][self.tenant] != TenantActivityStatus.ACTIVE:
+                raise Exception(f"Tenant {self.tenant} of {self.name} is not active")
+            return self._state["objects"].setdefault(self.tenant, {})
+        return self._state["objects"].setdefault(None, {})
+
+    def with_tenant(self, tenant: str) -> "FakeCollection":
+        return FakeCollection(self.client, self.name, tenant)
+
+    def _tenants(self) -> dict[str, Tenant]:
+        return {
+            name: Tenant(name=name, activity_status=status)
+            for name, status in self._state["tenants"].items()
+        }
+
+    def _tenant(self, name: str) -> Optional[Tenant]:
+        return self._tenants().get(name)
+
+    def _create_tenants(self, tenants) -> None:
+        for tenant in tenants if isinstance(tenants, list) else [tenants]:
+            self._state["tenants"][tenant.name] = TenantActivityStatus.ACTIVE
+
+    def _update_tenants(self, tenants) -> None:
+        for tenant in tenants if isinstance(tenants, list) else [tenants]:
+            self._state["tenants"][tenant.name] = tenant.activity_status
+
+    def _over_all(self, total_count: bool = False):
+        return SimpleNamespace(total_count=len(self._objects()))
+
+    @contextmanager
+    def _dynamic(self):
+        objects = self._objects()
+
+        def add_object(properties, uuid=None, vector=None, references=None):
+            if not isinstance(vector, dict):
+                vector = {"default": vector}
+            objects[str(uuid)] = {
+                "properties": dict(properties),
+                "vector": vector,
+                "references": {
+                    name: [str(ref) for ref in refs if ref is not None]
+                    for name, refs in (references or {}).items()
+                    for refs in [refs if isinstance(refs, list) else [refs]]
+                },
+            }
+
+        yield SimpleNamespace(add_object=add_object)
+
+    def _near_vector(
+        self,
+        near_vector,
+        limit=10,
+        distance=None,
+        filters=None,
+        return_metadata=None,
+        return_properties=None,
+    ):
+        """
+        Exact cosine search over the default vectors, with equality filters
+        on properties only.
+        """
+        if filters is not None and not (
+            isinstance(filters, _FilterValue) and filters.operator == _Operator.EQUAL
+        ):
+            raise NotImplementedError(f"Unsupported filter {filters}")
+
+        query = np.asarray(near_vector, dtype=np.float32)
+        hits = []
+        for object_id, obj in self._objects().items():
+            if filters is not None and (
+                obj["properties"].get(filters.target) != filters.value
+            ):
+                continue
+            vector = np.asarray(obj["vector"]["default"], dtype=np.float32)
+            similarity = vector @ query / np.linalg.norm(vector) / np.linalg.norm(query)
+            if distance is None or 1 - similarity <= distance:
+                hits.append((1 - float(similarity), object_id, obj))
+        hits.sort(key=lambda hit: hit[0])
+        return SimpleNamespace(
+            objects=[
+                SimpleNamespace(
+                    uuid=uuid.UUID(object_id),
+                    properties={
+                        key: value
+                        for key, value in obj["properties"].items()
+                        if return_properties is None or key in return_properties
+                    },
+                    metadata=SimpleNamespace(distance=hit_distance),
+                )
+                for hit_distance, object_id, obj in hits[:limit]
+            ]
+        )
+
+    def iterator(self, include_vector=False, return_references=None, **kwargs):
+        links = [reference.link_on for reference in return_references or []]
+        targets = {
+            reference["name"]: reference["dataType"][0]
+            for reference in self._state["schema"]["properties"]
+            if reference["dataType"][0][0].isupper()
+        }
+        for object_id, obj in list(self._objects().items()):
+            references = {}
+            for link in links:
+                target = FakeCollection(self.client, targets[link], self.tenant)
+                target_objects = target._objects()
+                references[link] = SimpleNamespace(
+                    objects=[
+                        SimpleNamespace(
+                            uuid=uuid.UUID(ref),
+                            properties=target_objects[ref]["properties"],
+                        )
+                        for ref in obj["references"].get(link, [])
+                    ]
+                )
+            yield SimpleNamespace(
+                uuid=uuid.UUID(object_id),
+                properties=obj["properties"],
+                vector=obj["vector"] if include_vector else {},
+                references=references or None,
+            )
+
+
+class FakeCollections:
+    def __init__(self, client: "FakeClient"):
+        self.client = client
+
+    def create_from_dict(self, schema: dict) -> FakeCollection:
+        name = schema["class"]
+        if name in self.client.state:
+            raise Exception(f"{name} already exists")
+        self.client.state[name] = {
+            "schema": _server_schema(schema),
+            "objects": {},
+            "tenants": {},
+        }
+        return self.get(name)
+
+    def create(
+        self,
+        name,
+        vectorizer_config=None,
+        vector_index_config=None,
+        multi_tenancy_config=None,
+        properties=(),
+        references=(),
+    ) -> FakeCollection:
+        multi_tenancy = multi_tenancy_config._to_dict() if multi_tenancy_config else {}
+        return self.create_from_dict(
+            schema(
+                name,
+                [
+                    {
+                        key: value
+                        for key, value in prop._to_dict().items()
+                        if key in ("name", "dataType", "tokenization")
+                    }
+                    for prop in [*properties, *(references or [])]
+                ],
+                multi_tenancy=multi_tenancy.get("enabled", False),
+            )
+        )
+
+    def exists(self, name: str) -> bool:
+        return name in self.client.state
+
+    def get(self, name: str) -> FakeCollection:
+        return FakeCollection(self.client, name)
+
+    def delete(self, names) -> None:
+        for name in names if isinstance(names, list) else [names]:
+            self.client.state.pop(name, None)
+
+    def list_all(self, simple: bool = True):
+        if simple:
+            return {name: None for name in self.client.state}
+        return {name: self.get(name).config.get() for name in self.client.state}
+
+
+class FakeClient:
+    def __init__(self):
+        self.state: dict[str, dict] = {}
+        self.collections = FakeCollections(self)
+
+    def add_collection(self, schema: dict, objects: dict = {}) -> FakeCollection:
+        """
+        Creates a collection as if it existed on the server, with `objects`
+        by tenant (None without multi-tenancy) and uuid.
+        """
+        collection = self.collections.create_from_dict(schema)
+        self.state[schema["class"]]["objects"] = {
+            tenant: {
+                object_id: {"vector": {}, "references": {}, **copy.deepcopy(obj)}
+                for object_id, obj in tenant_objects.items()
+            }
+            for tenant, tenant_objects in objects.items()
+        }
+        self.state[schema["class"]]["tenants"] = {
+            tenant: TenantActivityStatus.ACTIVE
+            for tenant in objects
+            if tenant is not None
+        }
+        return collection
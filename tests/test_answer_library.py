@@ -0,0 +1,64 @@
+"""
+Approved answers in an in-memory Weaviate, see `fake_weaviate`.
+"""
+
+import asyncio
+import uuid
+
+from app.rfp.services.answer_library import AnswerLibrary
+from app.rfp.services.weaviate import WeaviateService
+from tests.fake_weaviate import FakeClient
+
+EMBEDDINGS = {
+    "Do you encrypt data at rest?": [1.0, 0.0, 0.0],
+    "Where is data hosted?": [0.0, 1.0, 0.0],
+}
+# cosine similarities to "Do you encrypt data at rest?"
+IDENTICAL = [2.0, 0.0, 0.0]
+CLOSE = [0.9, 0.0, 0.3]  # ~0.95
+DISTANT = [0.5, 0.0, 0.5]  # ~0.71
+
+
+def make_library(offline: bool = False) -> AnswerLibrary:
+    service = WeaviateService.__new__(WeaviateService)
+    service.offline = offline
+    service.client = FakeClient()
+
+    async def generate_embeddings(texts):
+        return [EMBEDDINGS[text] for text in texts]
+
+    service.generate_embeddings = generate_embeddings
+    return AnswerLibrary(service, reuse_threshold=0.98, draft_threshold=0.8)
+
+
+def test_lookup():
+    library = make_library()
+    user_id, other_user_id = uuid.uuid4(), uuid.uuid4()
+    vectors = [IDENTICAL, CLOSE, DISTANT]
+
+    # nothing approved yet, the collection does not even exist
+    assert asyncio.run(library.lookup(user_id, vectors)) == [None] * 3
+
+    questions = list(EMBEDDINGS)
+    assert asyncio.run(library.add(user_id, questions, ["Yes, AES-256.", "EU"])) == 0
+    # approving an answer again replaces it
+    assert asyncio.run(library.add(user_id, questions[:1], ["Yes."])) == 0
+    collection = library.weaviate_service.client.collections.get(
+        library.collection_name
+    )
+    assert collection.aggregate.over_all(total_count=True).total_count == 2
+
+    reused, drafted, missing = asyncio.run(library.lookup(user_id, vectors))
+    assert reused.reuse and reused.answer == "Yes."
+    assert reused.similarity > 0.99
+    assert not drafted.reuse and drafted.question == questions[0]
+    assert missing is None
+
+    # answers are only shared with the user who approved them
+    assert asyncio.run(library.lookup(other_user_id, vectors)) == [None] * 3
+
+
+def test_lookup_offline():
+    library = make_library(offline=True)
+    assert not library.available
+    assert asyncio.run(library.lookup(uuid.uuid4(), [IDENTICAL])) == [None]
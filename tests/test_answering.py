@@ -0,0 +1,102 @@
+import asyncio
+import uuid
+from types import SimpleNamespace
+
+from app.rfp.agents.section_generator import SectionData
+from app.rfp.services.answer_library import LibraryMatch
+from app.rfp.services.answering import AnswerEngine
+
+EMBEDDINGS = {
+    "What is X?": [1.0, 0.0, 0.0],
+    "what is X": [1.0, 0.0, 0.0],
+    "How is Y?": [0.0, 1.0, 0.0],
+    "Already approved?": [0.0, 0.0, 1.0],
+}
+
+
+class FakeWeaviate:
+    offline = False
+
+    def __init__(self):
+        self.embedded = []
+        self.batches = []
+
+    async def generate_embeddings(self, texts):
+        self.embedded.append(texts)
+        return [EMBEDDINGS[text] for text in texts]
+
+    async def query_collection(self, folder_id, query):
+        raise AssertionError("questions are retrieved in one batch")
+
+    async def query_collection_batch(self, folder_id, queries, vectors=None):
+        self.batches.append((queries, vectors))
+        return [[{"text": f"About {query}", "filename": "kb.pdf"}] for query in queries]
+
+
+class FakeLibrary:
+    async def lookup(self, user_id, embeddings):
+        return [
+            (
+                LibraryMatch(
+                    question="Already approved?",
+                    answer="Yes.",
+                    similarity=1.0,
+                    reuse=True,
+                )
+                if vector == EMBEDDINGS["Already approved?"]
+                else None
+            )
+            for vector in embeddings
+        ]
+
+
+class FakeLLM:
+    def __init__(self):
+        self.prompts = []
+
+    async def create(self, messages):
+        self.prompts.append(messages[-1].content)
+        return SimpleNamespace(content=f"Answer {len(self.prompts)}")
+
+
+def test_answer_sections_retrieves_in_one_batch(monkeypatch, word_tokens):
+    llm = FakeLLM()
+    monkeypatch.setattr(
+        "app.rfp.services.answering.registry", SimpleNamespace(get=lambda name: llm)
+    )
+    weaviate = FakeWeaviate()
+    engine = AnswerEngine(weaviate, dedup_threshold=0.95, answer_library=FakeLibrary())
+    sections = [
+        SectionData(title="A", questions=["What is X?", "How is Y?"]),
+        SectionData(title="B", questions=["what is X", "Already approved?"]),
+    ]
+
+    async def answer_all():
+        return [
+            item
+            async for item in engine.answer_sections(
+                uuid.uuid4(), sections, user_id=uuid.uuid4()
+            )
+        ]
+
+    items = {item.question: item for item in asyncio.run(answer_all())}
+
+    # the questions are embedded once, and the embeddings reused for retrieval
+    assert weaviate.embedded == [
+        ["What is X?", "How is Y?", "what is X", "Already approved?"]
+    ]
+    assert weaviate.batches == [
+        (
+            ["What is X?", "How is Y?"],
+            [EMBEDDINGS["What is X?"], EMBEDDINGS["How is Y?"]],
+        )
+    ]
+    assert len(llm.prompts) == 2
+    assert "About How is Y?" in next(p for p in llm.prompts if "How is Y?" in p)
+
+    assert items["what is X"].answer == items["What is X?"].answer
+    assert items["what is X"].duplicate_of == (0, 0)
+    assert items["How is Y?"].sources == ["kb.pdf"]
+    assert items["Already approved?"].answer == "Yes."
+    assert items["Already approved?"].library == "reused"
+    assert not any(item.error for item in items.values())
@@ -0,0 +1,58 @@
+import numpy as np
+
+from app.rfp.services.context import ContextPacker, mmr_order, trim_passage
+
+PASSAGE = (
+    "The company was founded in 1990. "
+    "Our encryption uses AES-256 at rest. "
+    "Keys are rotated yearly. "
+    "TLS 1.3 protects encryption in transit. "
+    "The office has a cafeteria."
+)
+
+
+def test_mmr_order():
+    vectors = np.array([[1.0, 0.0], [1.0, 0.0], [0.0, 1.0]], np.float32)
+    relevance = np.array([1.0, 0.9, 0.5], np.float32)
+
+    # the duplicate of the best passage falls behind the diverse one
+    assert mmr_order(relevance, vectors, 0.5) == [0, 2, 1]
+    # relevance alone keeps the retrieval order
+    assert mmr_order(relevance, vectors, 1.0) == [0, 1, 2]
+    assert mmr_order(np.array([], np.float32), vectors[:0], 0.5) == []
+
+
+def test_trim_passage(word_tokens):
+    assert trim_passage(PASSAGE, {"encryption"}, 100) == (
+        "Our encryption uses AES-256 at rest. Keys are rotated yearly. "
+        "TLS 1.3 protects encryption in transit."
+    )
+    assert trim_passage(PASSAGE, {"payroll"}, 3) == "The company was"
+
+
+def test_pack(word_tokens):
+    documents = [
+        {"text": PASSAGE, "filename": "security.pdf", "rank_score": 0.9},
+        # an overlapping chunk, trimmed to the same span
+        {"text": PASSAGE[33:], "filename": "security.pdf", "rank_score": 0.8},
+        {"text": "Encryption keys live in an HSM.", "rank_score": 0.5},
+        {"text": "", "filename": "empty.pdf", "rank_score": 1.0},
+    ]
+    packer = ContextPacker(
+        token_budget=40, passage_tokens=100, mmr_lambda=0.5, max_passages=5
+    )
+
+    context, selected = packer.pack("How is encryption handled?", documents)
+    assert [doc["text"] for doc in selected] == [
+        "Our encryption uses AES-256 at rest. Keys are rotated yearly. "
+        "TLS 1.3 protects encryption in transit.",
+        "Encryption keys live in an HSM.",
+    ]
+    assert context.startswith("[1] (security.pdf)\nOur encryption")
+    assert context.endswith("[2] (unknown)\nEncryption keys live in an HSM.")
+
+    # the budget cuts the second passage short
+    packer.token_budget = 18
+    _, selected = packer.pack("How is encryption handled?", documents)
+    assert [doc["text"] for doc in selected][1] == "Encryption keys"
+    assert packer.pack("How is encryption handled?", documents[3:]) == ("", [])
@@ -0,0 +1,57 @@
+"""
+Runs the session managers against the database at DB_URL.
+"""
+
+import asyncio
+import os
+
+import pytest
+from sqlalchemy import select, text
+
+from app.database import AsyncDatabaseSessionManager, engine_kwargs
+from app.database.models import User
+
+
+def test_async_session(database, make_user):
+    user_id = make_user()
+
+    async def main():
+        manager = AsyncDatabaseSessionManager(os.environ["DB_URL"], engine_kwargs)
+        try:
+            async with manager.session() as session:
+                user = await session.scalar(select(User).where(User.id == user_id))
+                assert user.name == "test"
+
+            async with manager.connect() as connection:
+                assert await connection.scalar(text("SELECT 1")) == 1
+        finally:
+            await manager.close()
+
+        with pytest.raises(Exception, match="not initialized"):
+            async with manager.session():
+                pass
+
+    asyncio.run(main())
+
+
+def test_async_session_rolls_back(database, make_user):
+    user_id = make_user()
+
+    async def main():
+        manager = AsyncDatabaseSessionManager(os.environ["DB_URL"], engine_kwargs)
+        try:
+            with pytest.raises(RuntimeError):
+                async with manager.connect() as connection:
+                    await connection.execute(
+                        text("UPDATE users SET name = 'renamed' WHERE id = :id"),
+                        {"id": user_id},
+                    )
+                    raise RuntimeError
+
+            async with manager.session() as session:
+                user = await session.scalar(select(User).where(User.id == user_id))
+                assert user.name == "test"
+        finally:
+            await manager.close()
+
+    asyncio.run(main())
@@ -0,0 +1,152 @@
+"""
+Migrates collections of an in-memory Weaviate, see `fake_weaviate`.
+"""
+
+import copy
+import uuid
+
+import pytest
+from weaviate.classes.config import Tokenization
+
+from app.rfp.services.filename_migration import (
+    TEMPORARY_SUFFIX,
+    create_like,
+    migrate_collection,
+    pending_collections,
+)
+from app.rfp.services.weaviate import WeaviateService
+from tests.fake_weaviate import VECTOR_INDEX_CONFIG, FakeClient, schema, text_property
+
+CHUNK_ID = str(uuid.uuid4())
+METADATA_ID = str(uuid.uuid4())
+
+
+def make_service() -> WeaviateService:
+    service = WeaviateService.__new__(WeaviateService)
+    service.client = FakeClient()
+    return service
+
+
+def filename_tokenization(collection) -> Tokenization:
+    return next(
+        prop.tokenization
+        for prop in collection.config.get().properties
+        if prop.name == "filename"
+    )
+
+
+def test_migrate_keeps_config_vectors_and_references():
+    service = make_service()
+    client = service.client
+    client.add_collection(
+        schema("Id_a_Metadata", [text_property("filename")]),
+        {None: {METADATA_ID: {"properties": {"filename": "a b.pdf"}}}},
+    )
+    chunks = schema(
+        "Id_a",
+        [
+            text_property("text"),
+            text_property("filename"),
+            {"name": "metadata", "dataType": ["Id_a_Metadata"]},
+        ],
+        vector_config={
+            name: {
+                "vectorizer": {"none": {}},
+                "vectorIndexType": "hnsw",
+                "vectorIndexConfig": {**VECTOR_INDEX_CONFIG, "distance": "dot"},
+            }
+            for name in ("text", "title")
+        },
+    )
+    chunks["invertedIndexConfig"]["bm25"] = {"b": 0.6, "k1": 1.5}
+    client.add_collection(
+        chunks,
+        {
+            None: {
+                CHUNK_ID: {
+                    "properties": {"text": "hello", "filename": "a b.pdf"},
+                    "vector": {"text": [1.0, 0.0], "title": [0.0, 1.0]},
+                    "references": {"metadata": [METADATA_ID]},
+                }
+            }
+        },
+    )
+    before = client.collections.get("Id_a").config.get()
+
+    assert pending_collections(service) == ["Id_a_Metadata", "Id_a"]
+    for name in pending_collections(service):
+        assert migrate_collection(service, name) == 1
+    assert pending_collections(service) == []
+    assert not any(name.endswith(TEMPORARY_SUFFIX) for name in client.state)
+
+    collection = client.collections.get("Id_a")
+    after = collection.config.get()
+    assert filename_tokenization(collection) == Tokenization.FIELD
+    assert after.inverted_index_config.bm25.b == 0.6
+    assert after.vector_config.keys() == {"text", "title"}
+    assert after.vector_config["text"].vector_index_config.distance_metric.value == (
+        "dot"
+    )
+    assert after.references == before.references
+
+    obj = next(collection.iterator(include_vector=True))
+    assert obj.vector == {"text": [1.0, 0.0], "title": [0.0, 1.0]}
+    metadata = client.collections.get("Id_a_Metadata")
+    assert filename_tokenization(metadata) == Tokenization.FIELD
+    assert next(metadata.iterator()).uuid == uuid.UUID(METADATA_ID)
+
+
+def test_migrate_resumes_from_the_temporary_collection():
+    service = make_service()
+    client = service.client
+    tenant_objects = {
+        "folder": {CHUNK_ID: {"properties": {"text": "hi", "filename": "a.pdf"}}}
+    }
+    client.add_collection(
+        schema(
+            "Shared",
+            [text_property("text"), text_property("filename")],
+            multi_tenancy=True,
+        ),
+        tenant_objects,
+    )
+    # a previous run copied the collection and deleted it, then failed
+    client.state[f"Shared{TEMPORARY_SUFFIX}"] = client.state.pop("Shared")
+
+    assert pending_collections(service) == ["Shared"]
+    assert migrate_collection(service, "Shared") == 1
+    collection = client.collections.get("Shared")
+    assert filename_tokenization(collection) == Tokenization.FIELD
+    assert collection.config.get().multi_tenancy_config.enabled
+    assert client.state["Shared"]["objects"]["folder"].keys() == {CHUNK_ID}
+
+
+def test_refuses_what_cannot_be_copied():
+    service = make_service()
+    client = service.client
+    client.add_collection(
+        schema(
+            "Id_b",
+            [text_property("filename"), {"name": "links", "dataType": ["A", "B"]}],
+        )
+    )
+
+    with pytest.raises(Exception, match="reference links targets 2 collections"):
+        migrate_collection(service, "Id_b")
+    assert set(client.state) == {"Id_b"}
+
+    client.state["Id_b"]["schema"]["properties"].pop()
+    config = client.collections.get("Id_b").config.get()
+    original = client.collections.create_from_dict
+
+    def create_from_dict(schema):
+        # a setting the server does not support and silently drops
+        schema = copy.deepcopy(schema)
+        schema["invertedIndexConfig"]["bm25"]["b"] = 0.75
+        return original(schema)
+
+    config.inverted_index_config.bm25.b = 0.1
+    client.collections.create_from_dict = create_from_dict
+    with pytest.raises(Exception, match="different settings: invertedIndexConfig"):
+        create_like(service, "Id_b_copy", config)
+    assert set(client.state) == {"Id_b"}
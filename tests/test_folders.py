@@ -0,0 +1,65 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import text
+
+from app.database.folders import FolderStore
+
+EPOCH = datetime(2026, 1, 1)
+
+
+def insert_folders(database, user_id, days: list[int], is_deleted=False) -> list:
+    rows = [
+        {
+            "id": uuid.uuid4(),
+            "name": f"folder-{uuid.uuid4()}",
+            "userid": user_id,
+            "created_at": EPOCH + timedelta(days=day),
+            "is_deleted": is_deleted,
+        }
+        for day in days
+    ]
+    with database.begin() as connection:
+        connection.execute(
+            text(
+                "INSERT INTO folder (id, name, userid, created_at, is_deleted) "
+                "VALUES (:id, :name, :userid, :created_at, :is_deleted)"
+            ),
+            rows,
+        )
+    return rows
+
+
+def test_list_folders_pages_through_every_live_folder(database, make_user):
+    store = FolderStore()
+    user_id, other_user_id = make_user(), make_user()
+    # rows created at the same time are told apart by id
+    folders = insert_folders(database, user_id, [0, 1, 1, 1, 2])
+    insert_folders(database, user_id, [3], is_deleted=True)
+    insert_folders(database, other_user_id, [1])
+
+    async def list_all(limit: int):
+        pages, cursor = [], None
+        while True:
+            page = await store.list_folders(user_id, limit=limit, cursor=cursor)
+            pages.append([folder.id for folder in page.items])
+            if page.next_cursor is None:
+                return pages, await store.count_folders(user_id)
+            cursor = page.next_cursor
+
+    pages, count = asyncio.run(list_all(limit=2))
+    expected = [
+        row["id"]
+        for row in sorted(
+            folders, key=lambda row: (row["created_at"], row["id"]), reverse=True
+        )
+    ]
+    assert pages == [expected[:2], expected[2:4], expected[4:]]
+    assert count == 5
+
+
+def test_list_folders_rejects_invalid_cursors(database, make_user):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        asyncio.run(FolderStore().list_folders(make_user(), cursor="nope"))
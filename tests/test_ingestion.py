@@ -0,0 +1,107 @@
+"""
+Runs the ingestion pipeline with fake parsing, embedding and Weaviate.
+"""
+
+import asyncio
+import uuid
+
+from app.rfp.services.ingestion import (
+    IngestionCheckpoint,
+    IngestionPipeline,
+    IngestionSource,
+)
+
+
+class FakeFiles:
+    async def extract_pages(self, content: bytes, extension: str):
+        return [(1, content.decode())]
+
+    def split_text_into_chunks(self, text: str) -> list[str]:
+        return text.split("|")
+
+
+class FakeWeaviate:
+    def __init__(self, failing: set[str] = set()):
+        self.failing = failing
+        self.chunks: dict[str, dict] = {}
+
+    def ensure_collection(self, folder_id):
+        pass
+
+    def sync_local_index(self, folder_id):
+        pass
+
+    async def generate_embeddings(self, texts):
+        return [[float(len(text)), 1.0] for text in texts]
+
+    def import_objects(self, folder_id, chunks, vectors, metadata):
+        if any(chunk["properties"]["filename"] in self.failing for chunk in chunks):
+            raise Exception("import failed")
+        for chunk in chunks:
+            self.chunks[chunk["uuid"]] = chunk["properties"]
+        return 0
+
+
+def ingest(weaviate, folder_id, sources, checkpoint_path):
+    pipeline = IngestionPipeline(
+        weaviate,
+        file_service=FakeFiles(),
+        checkpoint_path=checkpoint_path,
+        parse_workers=2,
+        embed_batch_size=1,
+        max_retries=1,
+    )
+    return asyncio.run(pipeline.run(folder_id, sources))
+
+
+def test_resume_after_failure(tmp_path):
+    folder_id = uuid.uuid4()
+    checkpoint_path = tmp_path / "checkpoint.json"
+    (tmp_path / "b.txt").write_bytes(b"b1|b2|b3")
+
+    def sources():
+        return [
+            IngestionSource(file_name="a.txt", content=b"a1|a2"),
+            IngestionSource(file_name="b.txt", path=str(tmp_path / "b.txt")),
+        ]
+
+    weaviate = FakeWeaviate(failing={"b.txt"})
+    progress = ingest(weaviate, folder_id, sources(), checkpoint_path)
+    assert (progress.files_done, progress.files_failed) == (1, 1)
+    assert sorted(chunk["text"] for chunk in weaviate.chunks.values()) == [
+        "a1",
+        "a2",
+    ]
+
+    weaviate.failing = set()
+    progress = ingest(weaviate, folder_id, sources(), checkpoint_path)
+    assert (progress.files_done, progress.files_skipped) == (1, 1)
+    assert len(weaviate.chunks) == 5
+
+    completed = IngestionCheckpoint(checkpoint_path, folder_id).completed
+    assert completed == {
+        f"{source.file_name}:{source.digest()}" for source in sources()
+    }
+
+
+def test_same_name_uploads_are_kept_apart(tmp_path):
+    folder_id = uuid.uuid4()
+    checkpoint_path = tmp_path / "checkpoint.json"
+    weaviate = FakeWeaviate()
+
+    first = IngestionSource(file_name="proposal.pdf", content=b"one|two")
+    ingest(weaviate, folder_id, [first], checkpoint_path)
+
+    second = IngestionSource(file_name="proposal.pdf", content=b"three|four")
+    repeat = IngestionSource(file_name="proposal.pdf", content=b"three|four")
+    progress = ingest(weaviate, folder_id, [second, repeat], checkpoint_path)
+    assert (progress.files_done, progress.files_skipped) == (1, 1)
+
+    assert sorted(chunk["text"] for chunk in weaviate.chunks.values()) == [
+        "four",
+        "one",
+        "three",
+        "two",
+    ]
+    completed = IngestionCheckpoint(checkpoint_path, folder_id).completed
+    assert completed == {first.key, second.key}
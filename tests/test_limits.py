@@ -0,0 +1,64 @@
+import asyncio
+import time
+import uuid
+
+from sqlalchemy import text
+
+from app.database.limits import NOTIFY_CHANNEL, LimitsCache
+from app.database.notify import notify
+
+
+def wait_for(condition, timeout: float = 10) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+class NoDatabase:
+    def session(self):
+        raise AssertionError("cache hits don't query the database")
+
+
+def test_hits_avoid_the_database(database, make_user, monkeypatch):
+    cache = LimitsCache(notify=False)
+    user_id = make_user()
+
+    async def get_twice():
+        limits = await cache.aget(user_id)
+        monkeypatch.setattr("app.database.limits.async_sessionmanager", NoDatabase())
+        return limits, await cache.aget(user_id)
+
+    limits, cached = asyncio.run(get_twice())
+    assert limits.max_file == 3
+    assert cached == limits
+    assert cache.stats()["hits"] == 1
+
+
+def test_notifications_evict_entries(database, make_user):
+    cache = LimitsCache()
+    user_id, other_id = make_user(), uuid.uuid4()
+
+    # the listener drops everything once connected
+    cache._cache.set("connected?", "no")
+    cache.listen()
+    try:
+        assert wait_for(lambda: cache._cache.get("connected?") is None)
+        assert cache.get(user_id).max_file == 3
+        cache._cache.set(str(other_id), "kept")
+
+        # another process changes the limit and notifies on commit
+        with database.begin() as connection:
+            connection.execute(
+                text("UPDATE application_limit SET max_file = 10 WHERE userid = :id"),
+                {"id": user_id},
+            )
+        notify(NOTIFY_CHANNEL, str(user_id))
+
+        assert wait_for(lambda: cache._cache.get(str(user_id)) is None)
+        assert cache._cache.get(str(other_id)) == "kept"
+        assert cache.get(user_id).max_file == 10
+    finally:
+        cache.stop()
@@ -0,0 +1,60 @@
+import os
+
+from sqlalchemy import create_engine, text
+
+from app.database.metrics import (
+    DatabaseMetrics,
+    Histogram,
+    InstrumentedQueuePool,
+    redact,
+)
+
+
+def test_histogram_quantiles():
+    histogram = Histogram(buckets=(1, 10, 100))
+    assert histogram.quantile(0.5) is None
+
+    for value in [0.5] * 50 + [5] * 45 + [50] * 4 + [500]:
+        histogram.observe(value)
+    assert histogram.counts == [50, 45, 4, 1]
+    assert histogram.quantile(0.5) == 1
+    assert histogram.quantile(0.9) == 10
+    assert histogram.quantile(0.99) == 100
+    assert histogram.quantile(1) == float("inf")
+
+    snapshot = histogram.snapshot()
+    assert snapshot["count"] == 100
+    assert snapshot["mean_ms"] == (25 + 225 + 200 + 500) / 100
+    assert snapshot["buckets"] == {1: 50, 10: 45, 100: 4, "inf": 1}
+
+
+def test_redact():
+    assert redact({"id": 1, "name": "secret"}) == {"id": "int", "name": "str"}
+    assert redact(("secret", 1.5)) == ["str", "float"]
+    assert redact([{"id": 1}, {"id": 2}]) == "<2 parameter sets>"
+    assert redact(None) is None
+
+
+def test_instrumented_engine(database):
+    engine = create_engine(os.environ["DB_URL"], poolclass=InstrumentedQueuePool)
+    metrics = DatabaseMetrics("test", slow_query_ms=0, slow_query_log_size=2)
+    metrics.instrument(engine)
+    try:
+        with engine.connect() as connection:
+            connection.execute(text("SELECT :password"), {"password": "secret"})
+            connection.execute(text("SELECT 1"))
+            connection.execute(text("UPDATE users SET name = name WHERE false"))
+    finally:
+        engine.dispose()
+
+    snapshot = metrics.snapshot()
+    assert snapshot["statements"]["select"]["count"] >= 2
+    assert snapshot["statements"]["update"]["count"] == 1
+    assert snapshot["pool_wait"]["count"] >= 1
+    assert snapshot["pool"]["peak_checked_out"] == 1
+    # only the last statements are kept, without parameter values
+    assert [query["statement"] for query in snapshot["slow_queries"]] == [
+        "SELECT 1",
+        "UPDATE users SET name = name WHERE false",
+    ]
+    assert "secret" not in str(snapshot)
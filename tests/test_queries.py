@@ -0,0 +1,117 @@
+"""
+Builds the hand-written queries and compiles them for PostgreSQL, which
+configures the mappers and checks every column and relationship they use,
+without a database.
+"""
+
+import uuid
+from datetime import datetime
+
+import pytest
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import configure_mappers
+
+import app.database.models  # noqa: F401
+
+
+def compile_sql(statement) -> str:
+    return str(statement.compile(dialect=postgresql.dialect()))
+
+
+def test_mappers_configure():
+    configure_mappers()
+
+
+def test_web_search_quota():
+    from app.rfp.services.web_search import WebSearchQuota
+
+    quota = WebSearchQuota()
+    reserve = compile_sql(quota._reserve_statement(uuid.uuid4(), 3))
+    assert "least(" in reserve
+    assert "FOR UPDATE" in reserve
+    assert "RETURNING" in reserve
+
+    refund = compile_sql(quota._refund_statement(uuid.uuid4(), 3))
+    assert "greatest(" in refund
+
+
+def test_usage_ledger_batch():
+    from app.core.usage_ledger import UsageLedger
+
+    statement = UsageLedger._insert_batch.bindparams(
+        batch_id=str(uuid.uuid4()),
+        rows=[
+            {
+                "user_id": str(uuid.uuid4()),
+                "rfp_id": "",
+                "model": "gpt-4o",
+                "prompt_tokens": 1,
+                "completion_tokens": 2,
+                "calls": 1,
+            }
+        ],
+    )
+    sql = compile_sql(statement)
+    assert "ON CONFLICT ON CONSTRAINT uq_usage_ledger_batch DO NOTHING" in sql
+    assert "UPDATE application_limit" in sql
+
+
+def test_limits_cache():
+    from app.database.limits import LimitsCache
+
+    sql = compile_sql(LimitsCache(notify=False)._query(uuid.uuid4()))
+    assert "LEFT OUTER JOIN application_limit" in sql
+    assert "LIMIT" in sql
+
+
+def test_folder_store():
+    from app.database.folders import FolderStore
+    from app.database.pagination import encode_cursor
+
+    store = FolderStore()
+    user_id = uuid.uuid4()
+    first = compile_sql(store.list_query(user_id, 20))
+    assert "NOT folder.is_deleted" in first
+    assert "ORDER BY folder.created_at DESC, folder.id DESC" in first
+
+    cursor = encode_cursor(datetime.now(), uuid.uuid4())
+    assert "(folder.created_at, folder.id) <" in compile_sql(
+        store.list_query(user_id, 20, cursor)
+    )
+    assert "count(*)" in compile_sql(store.count_query(user_id))
+
+
+def test_results_store():
+    from app.database.models import RfpRun
+    from app.database.pagination import encode_cursor
+    from app.rfp.services.results_store import ResultsStore
+
+    store = ResultsStore()
+    cursor = encode_cursor(datetime.now(), uuid.uuid4())
+    runs = compile_sql(
+        store.runs_query(RfpRun.folder_id == uuid.uuid4(), limit=10, cursor=cursor)
+    )
+    assert "(rfp_run.created_at, rfp_run.id) <" in runs
+    assert "ORDER BY rfp_run.created_at DESC, rfp_run.id DESC" in runs
+
+    assert "jsonb_to_recordset" in compile_sql(ResultsStore._insert_run)
+    assert "UPDATE rfp_question" in compile_sql(ResultsStore._update_answers)
+
+
+def test_page_cursor():
+    from app.database.pagination import decode_cursor, encode_cursor, page
+
+    class Row:
+        def __init__(self, minutes: int):
+            self.created_at = datetime(2026, 1, 1, 12, minutes)
+            self.id = uuid.uuid4()
+
+    rows = [Row(3), Row(2), Row(1)]
+    last_page = page(rows, 3)
+    assert last_page.items == rows and last_page.next_cursor is None
+
+    first_page = page(rows, 2)
+    assert first_page.items == rows[:2]
+    assert decode_cursor(first_page.next_cursor) == (rows[1].created_at, rows[1].id)
+    with pytest.raises(ValueError):
+        decode_cursor("not a cursor")
@@ -0,0 +1,73 @@
+import asyncio
+import itertools
+
+from app.core.background_loop import BackgroundLoop
+from app.core.registry import ServiceRegistry
+
+
+class Client:
+    """
+    Stands for a client holding connections of the loop it was built on.
+    """
+
+    numbers = itertools.count()
+
+    def __init__(self):
+        self.number = next(self.numbers)
+        self.loop = asyncio.get_running_loop()
+        self.closed_on = None
+
+    async def close(self) -> None:
+        self.closed_on = asyncio.get_running_loop()
+
+
+def make_registry() -> tuple[ServiceRegistry, list[Client]]:
+    registry = ServiceRegistry()
+    built = []
+
+    def factory() -> Client:
+        built.append(Client())
+        return built[-1]
+
+    registry.register("client", factory, close=Client.close, loop_bound=True)
+    return registry, built
+
+
+def test_loop_bound_services_are_closed_with_their_loop():
+    registry, built = make_registry()
+    background = BackgroundLoop()
+    try:
+        shared = background.run(registry.aget("client"))
+        assert background.run(registry.aget("client")) is shared
+
+        async def use_twice():
+            client = registry.get("client")
+            assert await registry.aget("client") is client
+            return client
+
+        # another loop gets its own instance, closed when that loop shuts down
+        other = asyncio.run(use_twice())
+        assert other is not shared
+        assert other.closed_on is other.loop
+
+        # the background loop's instance was left alone
+        assert shared.closed_on is None
+        assert background.run(registry.aget("client")) is shared
+    finally:
+        background.stop()
+    assert shared.closed_on is shared.loop
+    assert len(built) == 2
+
+
+def test_shutdown_closes_the_current_loop_instance():
+    registry, built = make_registry()
+
+    async def run():
+        client = await registry.aget("client")
+        await registry.shutdown()
+        assert client.closed_on is client.loop
+        return await registry.aget("client")
+
+    rebuilt = asyncio.run(run())
+    assert rebuilt is not built[0]
+    assert rebuilt.closed_on is rebuilt.loop
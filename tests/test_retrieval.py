@@ -0,0 +1,157 @@
+"""
+Runs retrieval against local indexes and a fake Weaviate collection, so
+neither Weaviate nor the embedding and reranking APIs are needed.
+"""
+
+import asyncio
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+from app.rfp.services.local_index import LocalIndexStore
+from app.rfp.services.weaviate import ChunkLayout, WeaviateService, metadata_filter
+
+DOCUMENTS = [
+    {"text": "data is retained for 30 days", "filename": "a.pdf", "page_number": 1},
+    {"text": "backups are retained for a year", "filename": "b.pdf", "page_number": 1},
+    {"text": "support is available around the clock", "filename": "a.pdf"},
+]
+VECTORS = [[1.0, 0.0], [0.8, 0.2], [0.0, 1.0]]
+
+
+def make_service(tmp_path, offline: bool = True) -> WeaviateService:
+    service = WeaviateService.__new__(WeaviateService)
+    service.multi_tenancy = False
+    service.layout = ChunkLayout.REFERENCE
+    service.offline = offline
+    service.local_indexes = LocalIndexStore(tmp_path)
+    return service
+
+
+class FakeCollection:
+    def __init__(self):
+        self.queries: list[dict] = []
+
+    @property
+    def query(self):
+        return self
+
+    def hybrid(self, **kwargs):
+        self.queries.append(kwargs)
+        return SimpleNamespace(
+            objects=[
+                SimpleNamespace(
+                    properties={"text": "data is retained for 30 days"},
+                    metadata=SimpleNamespace(score=0.9),
+                    references=None,
+                )
+            ]
+        )
+
+
+def test_metadata_filter():
+    assert metadata_filter(None, ChunkLayout.REFERENCE) is None
+
+    where = metadata_filter(
+        {"filename": "a.pdf", "source": ["x", "y"]}, ChunkLayout.REFERENCE
+    )
+    filename, source = where.filters
+    assert (filename.target, filename.value) == ("filename", "a.pdf")
+    assert source.target.link_on == "metadata"
+    assert (source.target.target, source.value) == ("source", ["x", "y"])
+
+    flat = metadata_filter({"page_number": 2}, ChunkLayout.FLAT)
+    assert flat.target == "page_number"
+    with pytest.raises(ValueError):
+        metadata_filter({"languages": "en"}, ChunkLayout.FLAT)
+
+
+def test_local_index_filters(tmp_path):
+    index = LocalIndexStore(tmp_path).build(uuid.uuid4(), DOCUMENTS, VECTORS)
+
+    hits = index.search("retained", [1.0, 0.0], 3, filters={"filename": "a.pdf"})
+    assert [hit["text"] for hit in hits] == [DOCUMENTS[0]["text"], DOCUMENTS[2]["text"]]
+
+    hits = index.search("retained", None, 3, filters={"filename": ["b.pdf", "c.pdf"]})
+    assert [hit["filename"] for hit in hits] == ["b.pdf"]
+    assert index.search("retained", None, 3, filters={"filename": "c.pdf"}) == []
+
+
+def test_local_index_store_sees_other_processes(tmp_path):
+    folder_id = uuid.uuid4()
+    builder, reader = LocalIndexStore(tmp_path), LocalIndexStore(tmp_path)
+
+    assert reader.get(folder_id) is None
+    builder.build(folder_id, DOCUMENTS, VECTORS)
+    assert len(reader.get(folder_id)) == 3
+    assert reader.get(folder_id) is reader.get(folder_id)
+
+    builder.build(folder_id, DOCUMENTS[:1], VECTORS[:1])
+    assert len(reader.get(folder_id)) == 1
+
+    builder.drop(folder_id)
+    assert reader.get(folder_id) is None
+
+
+def test_query_collection_applies_filters(tmp_path):
+    service = make_service(tmp_path, offline=False)
+    collection = FakeCollection()
+    service.get_collection = lambda folder_id, metadata=False: collection
+
+    async def generate_embedding(text):
+        return [1.0, 0.0]
+
+    async def rerank(query, docs, top_n=5):
+        return [{**doc, "rank_score": doc.pop("certainty")} for doc in docs]
+
+    service.generate_embedding = generate_embedding
+    service.rerank = rerank
+
+    folder_id = uuid.uuid4()
+    filters = {"filename": "a.pdf"}
+    asyncio.run(service.query_collection(folder_id, "Retention?", filters=filters))
+    asyncio.run(service.query_collection(folder_id, "Retention?"))
+    # served from the cache, under the filtered key
+    asyncio.run(service.query_collection(folder_id, "retention", filters=filters))
+
+    assert len(collection.queries) == 2
+    assert collection.queries[0]["filters"].value == "a.pdf"
+    assert collection.queries[1]["filters"] is None
+
+
+def test_query_collection_batch(tmp_path):
+    service = make_service(tmp_path)
+    folder_id = uuid.uuid4()
+    service.local_indexes.build(folder_id, DOCUMENTS, VECTORS)
+
+    searches = []
+    hybrid_search = service._hybrid_search
+
+    def count_searches(folder_id, query, *args):
+        searches.append(query)
+        return hybrid_search(folder_id, query, *args)
+
+    service._hybrid_search = count_searches
+
+    queries = ["How long is data retained?", "Is support available?"]
+    results = asyncio.run(
+        service.query_collection_batch(
+            folder_id, [queries[0], queries[1], "how long is data retained"]
+        )
+    )
+    assert len(searches) == 2
+    assert results[0] == results[2]
+    assert results[0][0]["text"] == DOCUMENTS[0]["text"]
+    assert results[1][0]["text"] == DOCUMENTS[2]["text"]
+
+    # cached, and filtered queries are cached apart
+    asyncio.run(service.query_collection_batch(folder_id, queries))
+    assert len(searches) == 2
+    filtered = asyncio.run(
+        service.query_collection_batch(
+            folder_id, queries[:1], filters={"filename": "b.pdf"}
+        )
+    )
+    assert len(searches) == 3
+    assert [hit["filename"] for hit in filtered[0]] == ["b.pdf"]
@@ -0,0 +1,62 @@
+import time
+import uuid
+
+from app.rfp.services.retrieval_cache import RetrievalCache
+
+
+def wait_for(condition, timeout: float = 10) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def test_generations():
+    cache = RetrievalCache(notify=False)
+    folder, other = uuid.uuid4(), uuid.uuid4()
+
+    key = cache.key(folder, cache.generation(folder), "query", 5)
+    other_key = cache.key(other, cache.generation(other), "query", 5)
+    cache.set(key, [{"text": "a"}])
+    cache.set(other_key, [{"text": "b"}])
+    assert cache.get(key) == [{"text": "a"}]
+    assert cache.key(folder, 0, "query", 5, {"filename": "a.pdf"}) != key
+
+    cache.invalidate(folder)
+    assert cache.get(key) is None
+    assert cache.get(other_key) == [{"text": "b"}]
+    # a query started before the invalidation stores under a stale key
+    cache.set(key, [{"text": "stale"}])
+    assert cache.get(cache.key(folder, cache.generation(folder), "query", 5)) is None
+
+    generation = cache.generation(other)
+    cache._invalidate_all()
+    assert cache.generation(other) > generation
+    assert cache.get(other_key) is None
+
+
+def test_invalidations_reach_other_processes(database):
+    writer = RetrievalCache()
+    reader = RetrievalCache()
+    folder = uuid.uuid4()
+
+    reader.listen()
+    try:
+        # the listener bumps every generation once connected
+        assert wait_for(lambda: reader.generation(folder) == 1)
+        key = reader.key(folder, reader.generation(folder), "query", 5)
+        reader.set(key, [{"text": "a"}])
+
+        writer.invalidate(folder)
+        assert writer.generation(folder) == 1
+        assert wait_for(lambda: reader.generation(folder) == 2)
+        assert reader.get(key) is None
+
+        # its own notifications are not applied twice
+        reader.invalidate(folder)
+        time.sleep(0.5)
+        assert reader.generation(folder) == 3
+    finally:
+        reader.stop()
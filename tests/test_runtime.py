@@ -0,0 +1,216 @@
+"""
+Runs question files through the agents of `RfpRuntime`, with the services
+they get from the registry replaced by fakes.
+"""
+
+import asyncio
+import json
+import logging
+from types import SimpleNamespace
+
+import pytest
+from autogen_core import EVENT_LOGGER_NAME
+from autogen_core.logging import LLMCallEvent
+
+from app.core.config import config
+from app.core.llm_tracker import LLMUsageTracker
+from app.core.registry import registry
+from app.rfp.runtime import RfpRuntime
+
+DOCUMENT = "DOCUMENT:"
+
+
+class FakeFiles:
+    def read_file(self, file_path: str) -> bytes:
+        with open(file_path, "rb") as f:
+            return f.read()
+
+    def bytesToText(self, file_bytes: bytes) -> str:
+        return file_bytes.decode()
+
+    def split_text_into_chunks(self, text: str) -> list[str]:
+        return [text]
+
+
+class FakeS3:
+    async def content_upload(self, content, file_name, content_type="") -> str:
+        return f"archive/{file_name}"
+
+
+class FakeLLM:
+    """
+    Answers the extractor and the section generator from the document, a
+    JSON object with their outputs after `DOCUMENT`, and logs each call with
+    the document's `prompt_tokens`. The extraction of a document with
+    `wait_for` waits until that of the named document started.
+    """
+
+    def __init__(self):
+        self.extracting: set[str] = set()
+
+    async def create(self, messages, **kwargs):
+        prompt = "\n".join(message.content for message in messages)
+        document, _ = json.JSONDecoder().raw_decode(
+            prompt, prompt.index(DOCUMENT) + len(DOCUMENT)
+        )
+        if "classifier" in messages[0].content:
+            self.extracting.add(document["name"])
+            while document.get("wait_for") not in (None, *self.extracting):
+                await asyncio.sleep(0.01)
+            output = document["extracted"]
+        else:
+            output = {"sections": document["sections"]}
+        logging.getLogger(EVENT_LOGGER_NAME).info(
+            LLMCallEvent(
+                messages=[],
+                response={},
+                prompt_tokens=document["prompt_tokens"],
+                completion_tokens=1,
+            )
+        )
+        return SimpleNamespace(content=json.dumps(output))
+
+
+class FakeResultsStore:
+    saved: list = []
+
+    async def save_run(self, run_id, file_name, file_hash, results, **kwargs):
+        self.saved.append((file_name, results))
+
+
+@pytest.fixture
+def services(monkeypatch):
+    services = {
+        "file_processing": FakeFiles(),
+        "s3_async": FakeS3(),
+        "llm": FakeLLM(),
+    }
+    monkeypatch.setattr(registry, "get", services.__getitem__)
+    monkeypatch.setattr(config, "LLM_STREAMING", False)
+    monkeypatch.setattr(FakeResultsStore, "saved", [])
+    monkeypatch.setattr("app.rfp.agents.manager.ResultsStore", FakeResultsStore)
+    return services
+
+
+def question_file(
+    tmp_path,
+    name: str,
+    extracted: dict,
+    sections: list,
+    prompt_tokens: int = 10,
+    wait_for: str | None = None,
+) -> str:
+    path = tmp_path / f"{name}.txt"
+    document = {
+        "name": name,
+        "wait_for": wait_for,
+        "extracted": extracted,
+        "sections": sections,
+        "prompt_tokens": prompt_tokens,
+    }
+    path.write_text(DOCUMENT + json.dumps(document))
+    return str(path)
+
+
+async def wait_until(condition, timeout: float = 5) -> None:
+    async with asyncio.timeout(timeout):
+        while not condition():
+            await asyncio.sleep(0.01)
+
+
+def test_run_without_requirements(tmp_path, services):
+    path = question_file(
+        tmp_path,
+        "rfp",
+        {"problem_statement": "Slow builds", "expectations": "Faster builds"},
+        [{"title": "CI", "questions": ["Which runners?"]}],
+    )
+
+    async def run():
+        runtime = RfpRuntime(timeout=10)
+        await runtime.start()
+        try:
+            results = await runtime.run(path)
+            await wait_until(lambda: FakeResultsStore.saved)
+            return results
+        finally:
+            await runtime.stop()
+
+    results = asyncio.run(run())
+    assert results.requirements is None
+    assert results.problem_statement == "Slow builds"
+    assert [section.title for section in results.sections] == ["CI"]
+    assert FakeResultsStore.saved == [("rfp.txt", results)]
+
+
+def test_concurrent_runs_count_their_own_usage(tmp_path, services):
+    paths = [
+        question_file(
+            tmp_path,
+            f"rfp{i}",
+            {"requirements": f"Requirement {i}"},
+            [{"title": f"Section {i}", "questions": ["Why?"]}],
+            prompt_tokens=10**i,
+        )
+        for i in range(1, 3)
+    ]
+    usages = [LLMUsageTracker() for _ in paths]
+
+    async def run():
+        runtime = RfpRuntime(timeout=10)
+        await runtime.start()
+        try:
+            return await asyncio.gather(
+                *[runtime.run(path, usage=usage) for path, usage in zip(paths, usages)]
+            )
+        finally:
+            await runtime.stop()
+
+    results = asyncio.run(run())
+    assert [r.requirements for r in results] == ["Requirement 1", "Requirement 2"]
+    assert [usage.get_usage_stats() for usage in usages] == [
+        {
+            "prompt_tokens": 2 * 10**i,
+            "completion_tokens": 2,
+            "total_tokens": 2 * 10**i + 2,
+            "model_calls": 2,
+            "models_used": [],
+        }
+        for i in range(1, 3)
+    ]
+
+
+def test_overlapping_runs_release_their_state(tmp_path, services):
+    # the first run can only finish once the second one started
+    first = question_file(
+        tmp_path, "first", {"requirements": "A"}, [], wait_for="second"
+    )
+    second = question_file(tmp_path, "second", {"requirements": "B"}, [])
+    abandoned = question_file(
+        tmp_path, "abandoned", {"requirements": "C"}, [], wait_for="late"
+    )
+
+    async def run():
+        runtime = RfpRuntime(timeout=10)
+        await runtime.start()
+        try:
+            first_run = asyncio.create_task(runtime.run(first))
+            await wait_until(lambda: "first" in services["llm"].extracting)
+            assert runtime.pending == 1 and runtime.runs == 1
+
+            results = await asyncio.gather(first_run, runtime.run(second))
+            assert runtime.pending == 0 and runtime.runs == 0
+
+            with pytest.raises(asyncio.TimeoutError):
+                await runtime.run(abandoned, timeout=0.5)
+            assert runtime.pending == 0 and runtime.runs == 0
+            # its extraction finishes after all, and is dropped
+            services["llm"].extracting.add("late")
+            await runtime.stop()
+            assert runtime.runs == 0
+            return results
+        finally:
+            await runtime.stop()
+
+    results = asyncio.run(run())
+    assert [r.requirements for r in results] == ["A", "B"]
@@ -0,0 +1,130 @@
+"""
+Multipart uploads of `AsyncS3Service` against an in-memory S3 client, with
+parts of a few bytes.
+"""
+
+import asyncio
+import hashlib
+import io
+
+import pytest
+
+from app.rfp.services.s3 import AsyncS3Service, MultipartUploadError
+
+
+class FakeS3:
+    """
+    Stands for the aioboto3 client of a bucket. Part numbers in `failing`
+    fail once.
+    """
+
+    def __init__(self):
+        self.objects: dict[str, bytes] = {}
+        self.uploads: dict[str, dict[int, bytes]] = {}
+        self.requests: list[tuple] = []
+        self.failing: set[int] = set()
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    async def put_object(self, Bucket, Key, Body, **kwargs):
+        self.requests.append(("put_object",))
+        self.objects[Key] = Body
+        return {}
+
+    async def create_multipart_upload(self, Bucket, Key, **kwargs):
+        upload_id = f"upload-{len(self.uploads)}"
+        self.uploads[upload_id] = {}
+        return {"UploadId": upload_id}
+
+    async def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        self.requests.append(("upload_part", PartNumber))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0.01)
+            if PartNumber in self.failing:
+                self.failing.remove(PartNumber)
+                raise ConnectionError(f"part {PartNumber} lost")
+            self.uploads[UploadId][PartNumber] = Body
+        finally:
+            self.in_flight -= 1
+        return {"ETag": f'"{hashlib.md5(Body).hexdigest()}"'}
+
+    def get_paginator(self, operation):
+        assert operation == "list_parts"
+        return self
+
+    async def paginate(self, Bucket, Key, UploadId):
+        yield {
+            "Parts": [
+                {"PartNumber": number, "ETag": f'"{hashlib.md5(body).hexdigest()}"'}
+                for number, body in self.uploads[UploadId].items()
+            ]
+        }
+
+    async def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        parts = self.uploads.pop(UploadId)
+        for part in MultipartUpload["Parts"]:
+            body = parts[part["PartNumber"]]
+            assert part["ETag"] == f'"{hashlib.md5(body).hexdigest()}"'
+        self.objects[Key] = b"".join(
+            parts[part["PartNumber"]] for part in MultipartUpload["Parts"]
+        )
+        return {"Key": Key}
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    monkeypatch.setattr(AsyncS3Service, "MIN_PART_SIZE", 1)
+    return FakeS3()
+
+
+def make_service(s3: FakeS3, part_size: int = 4, concurrency: int = 2):
+    service = AsyncS3Service(part_size=part_size, concurrency=concurrency)
+    service.client = lambda: s3
+    return service
+
+
+async def chunks(data: bytes, size: int):
+    for start in range(0, len(data), size):
+        yield data[start : start + size]
+
+
+def test_upload_stream_in_parts(s3):
+    service = make_service(s3)
+    data = bytes(range(26))
+
+    asyncio.run(service.upload_stream(chunks(data, 3), "big"))
+    assert s3.objects["big"] == data
+    assert s3.requests == [("upload_part", number) for number in range(1, 8)]
+    assert s3.max_in_flight == 2
+
+    # a file handle, which fits in a single part
+    asyncio.run(service.upload_stream(io.BytesIO(b"abc"), "small"))
+    assert s3.objects["small"] == b"abc"
+    assert s3.requests[-1] == ("put_object",)
+
+
+def test_resume_failed_upload(s3):
+    service = make_service(s3)
+    data = bytes(range(20))
+    s3.failing = {3}
+
+    with pytest.raises(MultipartUploadError) as error:
+        asyncio.run(service.upload_stream(io.BytesIO(data), "big"))
+    assert "big" not in s3.objects
+
+    s3.requests.clear()
+    asyncio.run(
+        service.upload_stream(io.BytesIO(data), "big", upload_id=error.value.upload_id)
+    )
+    assert s3.objects["big"] == data
+    # only the parts missing from the failed attempt are uploaded again
+    uploaded = {number for _, number in s3.requests}
+    assert 3 in uploaded and not uploaded & {1, 2}
@@ -0,0 +1,125 @@
+"""
+Migrates per-folder collections of an in-memory Weaviate to tenants, see
+`fake_weaviate`.
+"""
+
+import threading
+import uuid
+
+from weaviate.classes.tenants import TenantActivityStatus
+
+from app.core.config import config
+from app.rfp.services.tenant_migration import migrate_folder
+from app.rfp.services.weaviate import (
+    ChunkLayout,
+    WeaviateService,
+    metadata_collection_name,
+    sanitize_class_name,
+)
+from tests.fake_weaviate import FakeClient, schema, text_property
+
+FOLDER_ID = uuid.uuid4()
+COLLECTION = sanitize_class_name(str(FOLDER_ID))
+METADATA = metadata_collection_name(COLLECTION)
+CHUNK_ID = str(uuid.uuid4())
+REFERENCED_ID = str(uuid.uuid4())
+UNREFERENCED_ID = str(uuid.uuid4())
+
+
+def make_service(layout: ChunkLayout) -> WeaviateService:
+    service = WeaviateService.__new__(WeaviateService)
+    service.multi_tenancy = True
+    service.layout = layout
+    service._active_tenants = {}
+    service._tenants_lock = threading.Lock()
+    service.client = FakeClient()
+
+    service.client.add_collection(
+        schema(
+            METADATA,
+            [
+                text_property("filename"),
+                {"name": "page_number", "dataType": ["int"]},
+                text_property("source"),
+            ],
+        ),
+        {
+            None: {
+                REFERENCED_ID: {
+                    "properties": {
+                        "filename": "a.pdf",
+                        "page_number": 2,
+                        "source": "kb/a.pdf",
+                    }
+                },
+                # left by another folder sharing the metadata collection
+                UNREFERENCED_ID: {"properties": {"filename": "b.pdf"}},
+            }
+        },
+    )
+    service.client.add_collection(
+        schema(
+            COLLECTION,
+            [
+                text_property("text"),
+                text_property("filename"),
+                {"name": "metadata", "dataType": [METADATA]},
+            ],
+        ),
+        {
+            None: {
+                CHUNK_ID: {
+                    "properties": {"text": "hello", "filename": "a.pdf"},
+                    "vector": {"default": [1.0, 0.0]},
+                    "references": {"metadata": [REFERENCED_ID]},
+                }
+            }
+        },
+    )
+    return service
+
+
+def tenant_objects(service: WeaviateService, name: str) -> dict:
+    return service.client.state[name]["objects"][str(FOLDER_ID)]
+
+
+def test_migrate_to_reference_layout():
+    service = make_service(ChunkLayout.REFERENCE)
+
+    copied = migrate_folder(service, COLLECTION, delete_source=True, offload=True)
+    assert copied == 1
+
+    chunks = tenant_objects(service, config.WEAVIATE_TENANT_COLLECTION)
+    assert chunks[CHUNK_ID]["vector"] == {"default": [1.0, 0.0]}
+    assert chunks[CHUNK_ID]["references"] == {"metadata": [REFERENCED_ID]}
+    metadata = tenant_objects(
+        service, metadata_collection_name(config.WEAVIATE_TENANT_COLLECTION)
+    )
+    assert metadata.keys() == {REFERENCED_ID}
+
+    assert COLLECTION not in service.client.state
+    assert METADATA not in service.client.state
+    tenants = service.client.state[config.WEAVIATE_TENANT_COLLECTION]["tenants"]
+    assert tenants[str(FOLDER_ID)] == TenantActivityStatus(
+        config.WEAVIATE_TENANT_IDLE_STATUS
+    )
+
+
+def test_migrate_to_flat_layout():
+    service = make_service(ChunkLayout.FLAT)
+
+    assert migrate_folder(service, COLLECTION) == 1
+
+    chunks = tenant_objects(service, config.WEAVIATE_TENANT_COLLECTION)
+    assert chunks[CHUNK_ID]["properties"] == {
+        "text": "hello",
+        "filename": "a.pdf",
+        "page_number": 2,
+        "source": "kb/a.pdf",
+    }
+    assert chunks[CHUNK_ID]["references"] == {}
+    assert not service.client.collections.exists(
+        metadata_collection_name(config.WEAVIATE_TENANT_COLLECTION)
+    )
+    # without delete_source the legacy collections stay
+    assert COLLECTION in service.client.state
@@ -0,0 +1,79 @@
+import os
+import socket
+import subprocess
+import threading
+import time
+import uuid
+from types import SimpleNamespace
+
+from sqlalchemy import text
+
+from app.core.usage_ledger import UsageLedger, usage_scope
+
+
+def test_recover_only_takes_spools_of_dead_processes(tmp_path):
+    ledger = UsageLedger(spool_dir=str(tmp_path))
+    host = socket.gethostname()
+
+    finished = subprocess.Popen(["true"])
+    finished.wait()
+    dead = tmp_path / f"usage-{host}-{finished.pid}.jsonl"
+    live = tmp_path / f"usage-{host}-{os.getppid()}.jsonl"
+    other_host = tmp_path / "usage-elsewhere-1.jsonl"
+    for path in (dead, live, other_host):
+        path.write_text("{}\n")
+
+    ledger._recover()
+
+    assert not dead.exists()
+    assert live.exists()
+    assert other_host.exists()
+    assert len(list(tmp_path.glob("*.batch"))) == 1
+
+
+def test_flush_errors_do_not_stop_the_thread(tmp_path):
+    ledger = UsageLedger(spool_dir=str(tmp_path), flush_interval=0.01)
+    calls = []
+
+    def flush():
+        calls.append(1)
+        raise OSError("disk full")
+
+    ledger.flush = flush
+    thread = threading.Thread(target=ledger._run, daemon=True)
+    thread.start()
+    time.sleep(0.1)
+    ledger._stop.set()
+    ledger._wake.set()
+    thread.join(1)
+
+    assert len(calls) > 1
+    assert not thread.is_alive()
+
+
+def test_flush_drops_unknown_users(tmp_path, database, make_user):
+    ledger = UsageLedger(spool_dir=str(tmp_path))
+    user_id, unknown_id = make_user(tokens_left=1000), uuid.uuid4()
+
+    for owner in (user_id, unknown_id, user_id):
+        with usage_scope(user_id=owner, rfp_id="rfp"):
+            ledger.record(
+                SimpleNamespace(model="gpt", prompt_tokens=100, completion_tokens=20)
+            )
+    ledger.flush()
+
+    assert not list(tmp_path.glob("*.batch"))
+    with database.connect() as connection:
+        rows = connection.execute(
+            text(
+                "SELECT user_id, prompt_tokens, completion_tokens, calls "
+                "FROM usage_ledger WHERE user_id = ANY(:ids)"
+            ),
+            {"ids": [user_id, unknown_id]},
+        ).all()
+        tokens_left = connection.execute(
+            text("SELECT tokens_left FROM application_limit WHERE userid = :id"),
+            {"id": user_id},
+        ).scalar_one()
+    assert rows == [(user_id, 200, 40, 2)]
+    assert tokens_left == 1000 - 240
@@ -0,0 +1,86 @@
+import asyncio
+
+from sqlalchemy import text
+
+from app.core.cache import TTLCache
+from app.rfp.services.web_search import WebSearchQuota, WebSearchService
+
+
+def test_first_searches_share_one_row(database, make_user):
+    quota = WebSearchQuota()
+    user_id = make_user()
+
+    async def reserve():
+        # every batch finds no row, only one may create it
+        return await asyncio.gather(*[quota.reserve(user_id, 20) for _ in range(4)])
+
+    granted = asyncio.run(reserve())
+    assert sorted(granted) == [0, 10, 20, 20]
+
+    asyncio.run(quota.refund(user_id, 5))
+    with database.connect() as connection:
+        rows = connection.execute(
+            text(
+                "SELECT current_count FROM user_web_search_history "
+                "WHERE user_id = :id"
+            ),
+            {"id": user_id},
+        ).all()
+    assert rows == [(45,)]
+
+
+class FakeQuota:
+    def __init__(self, left: int):
+        self.left = left
+
+    async def reserve(self, user_id, count: int) -> int:
+        granted = min(count, self.left)
+        self.left -= granted
+        return granted
+
+    async def refund(self, user_id, count: int) -> None:
+        self.left += count
+
+
+class FakeTavily:
+    def __init__(self):
+        self.queries: list[str] = []
+
+    async def searchAnswer(self, query: str) -> dict:
+        self.queries.append(query)
+        await asyncio.sleep(0.01)
+        if "fail" in query:
+            raise Exception("Search failed")
+        return {"answer": query}
+
+
+def test_search_batch():
+    tavily, quota = FakeTavily(), FakeQuota(left=3)
+    service = WebSearchService(tavily, quota, cache=TTLCache(10, 60))
+
+    async def search():
+        # the second batch waits on the searches of the first one
+        return await asyncio.gather(
+            service.search_batch(None, ["Rust", "rust ", "fail", "Go", "Zig"]),
+            service.search_batch(None, ["rust"]),
+        )
+
+    batch, shared = asyncio.run(search())
+    assert tavily.queries == ["Rust", "fail", "Go"]
+    assert [result.query for result in batch] == ["Rust", "rust ", "fail", "Go", "Zig"]
+    assert [result.response for result in batch] == [
+        {"answer": "Rust"},
+        {"answer": "Rust"},
+        None,
+        {"answer": "Go"},
+        None,
+    ]
+    assert batch[2].error == "Search failed"
+    assert batch[4].error == "Web search limit reached"
+    assert shared[0].response == {"answer": "Rust"} and not shared[0].cached
+    # the failed search was refunded
+    assert quota.left == 1
+
+    cached = asyncio.run(service.search(None, "RUST"))
+    assert cached.cached and cached.response == {"answer": "Rust"}
+    assert len(tavily.queries) == 3